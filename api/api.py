@@ -1,14 +1,55 @@
-from collections import OrderedDict
-
+import collections
 import contextlib
+import datetime
+import functools
+import inspect
 import logging.config
 import sqlite3
-import datetime
+import time
+from typing import Literal
 
-from fastapi import FastAPI, Depends, Request, HTTPException, status
-from pydantic import BaseModel
+from fastapi import FastAPI, Depends, Header, Query, Request, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings
 
+import archive
+import bulk
+import enrollment
+import etags
+import events
+import idempotency
+import lottery
+import paging
+import promotion
+import queries
+import schedule
+import search
+import sections
+import serialize
+from catalog import CatalogCache, default_invalidation_file
+from enrollment import EnrollOutcome
+from events import EventHub, EventKind
+from idempotency import IdempotencyStore
+from logqueue import BoundedQueueHandler
+from metrics import Metrics, MetricsMiddleware, TimedConnection
+from pool import ConnectionPool
+from replica import Replica
+from sharding import ShardRouter
+from writer import WriteQueue
+
+class Meeting(BaseModel):
+    day: Literal["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    start: datetime.time
+    end: datetime.time
+
+    @model_validator(mode="after")
+    def check_times(self):
+        if self.end <= self.start:
+            raise ValueError("meeting must end after it starts")
+        return self
+
 class Class(BaseModel):
     class_code: str
     section_number: str
@@ -18,46 +59,302 @@ class Class(BaseModel):
     max_enrollment: int
     max_waitlist: int
     c_instructor_username: str
+    term: str | None = None
+    meetings: list[Meeting] = []
+
+class Choice(BaseModel):
+    class_code: str
+    section_number: str
+
+class Registration(BaseModel):
+    student_username: str
+    class_code: str
+    section_number: str
 
 class Settings(BaseSettings, env_file=".env", extra="ignore"):
     database: str
     logging_config: str
+    pool_size: int = 10
+    pool_timeout: float = 30.0
+    pool_overflow: int = 40
+    db_mmap_size: int = 268435456
+    db_cache_size: int = -16000
+    db_busy_timeout: int = 5000
+    db_cached_statements: int = 256
+    db_warm_up: bool = True
+    catalog_cache: bool = True
+    bulk_chunk_size: int = bulk.DEFAULT_CHUNK_SIZE
+    async_mode: bool = False
+    writer_max_batch: int = 64
+    catalog_invalidation_file: str | None = None
+    metrics: bool = True
+    slow_query_ms: float | None = None
+    current_term: str = "FA2023"
+    archive_database: str | None = None
+    idempotency_ttl: int = 86400
+    idempotency_wait: float = 10.0
+    events_poll_interval: float = 0.2
+    events_heartbeat: float = 15.0
+    replica_database: str | None = None
+    replica_interval: float = 1.0
+    replica_max_lag: float = 30.0
+    shard_databases: list[str] = []
+
+@contextlib.contextmanager
+def connect(replica=False, class_code=None):
+    start = time.perf_counter()
+    with _connection(replica, class_code) as db:
+        if metrics is not None:
+            metrics.connections.observe(time.perf_counter() - start)
+            db = TimedConnection(db, metrics)
+        yield db
+
+@contextlib.contextmanager
+def _connection(replica=False, class_code=None):
+    # A pool_size of 0 falls back to opening a fresh connection per request.
+    # FastAPI may close the dependency on a different threadpool thread than
+    # the one that opened it, so the connection must not be pinned to a thread.
+    if replica:
+        with replica_pool.connection() as db:
+            yield db
+    elif router is not None:
+        with router.connection(class_code) as db:
+            yield db
+    elif pool is None:
+        with contextlib.closing(sqlite3.connect(settings.database, check_same_thread=False, cached_statements=settings.db_cached_statements)) as db:
+            db.row_factory = sqlite3.Row
+            archive.attach(db, settings.archive_database)
+            yield db
+    else:
+        with pool.connection() as db:
+            yield db
+
+def get_db(request: Request):
+    # On a sharded layout, section-scoped endpoints get the shard of their
+    # class_code and the others a connection reading every shard
+    with connect(class_code=request.path_params.get("class_code")) as db:
+        yield db
+
+def get_read_connect(request: Request, fresh: bool = False):
+    """connect() for the read-mostly endpoints: to the replica snapshot, if there is one recent enough.
+
+    ?fresh=true reads the live database instead, e.g. right after a write
+    the client needs to see.
+    """
+    use_replica = replica is not None and not fresh and replica.lag() <= settings.replica_max_lag
+    return functools.partial(connect, replica=use_replica, class_code=request.path_params.get("class_code"))
 
-def get_db():
-    with contextlib.closing(sqlite3.connect(settings.database)) as db:
-        db.row_factory = sqlite3.Row
+def get_read_db(read_connect=Depends(get_read_connect)):
+    with read_connect() as db:
         yield db
 
+def single_database():
+    """Refuses the endpoints that work across many sections at once on a sharded layout."""
+    if router is not None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not available with sharded storage."
+        )
+
 def get_logger():
     return logging.getLogger(__name__)
 
 settings = Settings()
 app = FastAPI()
 
+# Request, connection and statement timings, served on /metrics
+metrics = None
+if settings.metrics:
+    metrics = Metrics(slow_query_ms=settings.slow_query_ms)
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+connect_args = {
+    "mmap_size": settings.db_mmap_size,
+    "cache_size": settings.db_cache_size,
+    "busy_timeout": settings.db_busy_timeout,
+    "cached_statements": settings.db_cached_statements,
+    # Prepare every read statement in the registry when a connection opens
+    "prepare": queries.reads() if settings.db_warm_up else (),
+    "archive_database": settings.archive_database,
+}
+
+# Closed terms moved out by bin/archive_terms.py, read through the history views
+if settings.archive_database is not None:
+    archive.create(settings.archive_database)
+
+# Sections split over several database files by a hash of class_code, with
+# DATABASE holding what is not split (see bin/shard_database.py)
+router = None
+if settings.shard_databases:
+    if settings.async_mode or settings.replica_database is not None:
+        raise ValueError("SHARD_DATABASES cannot be combined with ASYNC_MODE or REPLICA_DATABASE")
+    router = ShardRouter(
+        settings.database,
+        settings.shard_databases,
+        size=max(settings.pool_size, 1),
+        timeout=settings.pool_timeout,
+        overflow=settings.pool_overflow,
+        **connect_args,
+    )
+
+# In async mode get_db only serves reads; every mutation goes through the writer
+pool = None
+if router is None and (settings.pool_size > 0 or settings.async_mode):
+    pool = ConnectionPool(
+        settings.database,
+        size=max(settings.pool_size, 1),
+        timeout=settings.pool_timeout,
+        overflow=settings.pool_overflow,
+        read_only=settings.async_mode,
+        **connect_args,
+    )
+
+# Read-mostly endpoints read a snapshot published every replica_interval
+# seconds, off the pages and locks the writers use; one worker publishes it
+# and the others only read it
+replica = None
+replica_pool = None
+if settings.replica_database is not None:
+    replica = Replica(settings.database, settings.replica_database, interval=settings.replica_interval, busy_timeout=settings.db_busy_timeout)
+    replica.start()
+    replica_pool = ConnectionPool(
+        settings.replica_database,
+        size=max(settings.pool_size, 1),
+        timeout=settings.pool_timeout,
+        overflow=settings.pool_overflow,
+        read_only=True,
+        **connect_args,
+    )
+
+writer = None
+if settings.async_mode:
+    writer = WriteQueue(settings.database, max_batch=settings.writer_max_batch, metrics=metrics, **connect_args)
+
+def writes(handler=None, *, catalog_change=False):
+    """Mark an endpoint as a mutation.
+
+    In async mode the endpoint becomes a coroutine that hands the original
+    handler to the writer queue, which supplies the `db` argument. Otherwise
+    the handler is returned unchanged and keeps using get_db.
+    """
+    def decorate(handler):
+        if writer is None:
+            return handler
+
+        async def run_on_writer(**kwargs):
+            result = await writer.submit(handler, **kwargs)
+            if catalog_change:
+                # The handler invalidated before the group committed; clear
+                # anything a concurrent reader cached in between
+                catalog.invalidate()
+            return result
+
+        signature = inspect.signature(handler)
+        run_on_writer.__name__ = handler.__name__
+        run_on_writer.__doc__ = handler.__doc__
+        run_on_writer.__signature__ = signature.replace(
+            parameters=[p for name, p in signature.parameters.items() if name != "db"]
+        )
+        return run_on_writer
+
+    return decorate if handler is None else decorate(handler)
+
+async def run_on_pool(fn, *args):
+    def run():
+        with connect() as db:
+            return fn(*args, db=db)
+    return await run_in_threadpool(run)
+
+# Mutations sent with an Idempotency-Key run once; retries replay the stored response
+idempotency_store = IdempotencyStore(
+    read=run_on_pool,
+    write=run_on_pool if writer is None else writer.submit,
+    ttl=settings.idempotency_ttl,
+    wait=settings.idempotency_wait,
+)
+app.router.route_class = idempotency.route_class(idempotency_store)
+
+# One tail of the Event table per worker, fanned out to every /events subscriber
+event_hub = EventHub(read=run_on_pool, poll_interval=settings.events_poll_interval)
+
+# Shared by every request thread of this worker; the registrar endpoints invalidate it
+catalog = CatalogCache(
+    enabled=settings.catalog_cache,
+    invalidation_file=settings.catalog_invalidation_file or default_invalidation_file(settings.database),
+)
+
 logging.config.fileConfig(settings.logging_config, disable_existing_loggers=False)
 
 
 # ---------------------- Additional -----------------------------
 
-# Example: GET http://localhost:5000/all_classes
+# Example: GET http://localhost:5000/health
+@app.get("/health")
+def get_health():
+    health = {
+        "pool": None if pool is None else pool.health(),
+        "writer": None if writer is None else writer.stats(),
+        "idempotency": idempotency_store.stats(),
+        "events": event_hub.stats(),
+        "replica": None if replica is None else dict(replica.stats(), pool=replica_pool.health()),
+        "shards": None if router is None else router.health(),
+        "logging": [
+            handler.stats()
+            for handler in logging.getLogger().handlers
+            if isinstance(handler, BoundedQueueHandler)
+        ],
+    }
+    if any(health[name] is not None and not health[name]["healthy"] for name in ("pool", "shards")):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=health
+        )
+    return health
+
+# Example: GET http://localhost:5000/metrics
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    if metrics is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled"
+        )
+    return metrics.render({
+        "pool": None if pool is None else pool.health(),
+        "writer": None if writer is None else writer.stats(),
+        "catalog_cache": catalog.stats(),
+        "idempotency": idempotency_store.stats(),
+        "events": event_hub.stats(),
+        "replica": None if replica is None else replica.stats(),
+        "replica_pool": None if replica_pool is None else replica_pool.health(),
+        "shards": None if router is None else router.health(),
+    })
+
+# Example: GET http://localhost:5000/catalog_cache
+@app.get("/catalog_cache")
+def get_catalog_cache_stats():
+    return {"catalog_cache": catalog.stats()}
+
+# List endpoints take ?limit=N&after=<cursor> for keyset pagination on the
+# primary key, and ?stream=true to stream every row as NDJSON instead.
+# They, search and the instructor endpoints read the replica snapshot when
+# REPLICA_DATABASE is set; ?fresh=true reads the live database
+
+# Example: GET http://localhost:5000/all_classes?limit=100
 @app.get("/all_classes")
-def get_available_classes(db: sqlite3.Connection = Depends(get_db)):
-    classes = db.execute("""
-                SELECT *
-                FROM Class
-            """)    
-    return {"classes": classes.fetchall()}
+def get_available_classes(limit: int | None = Query(None, ge=1), after: str | None = None, stream: bool = False, read_connect=Depends(get_read_connect)):
+    params = (*paging.decode_cursor(after, 2), paging.sql_limit(limit))
+
+    if stream:
+        return paging.stream_ndjson(read_connect, queries.ALL_CLASSES, params)
+
+    with read_connect() as db:
+        classes = serialize.fetch(db, queries.ALL_CLASSES, params)
+    return serialize.RowsResponse({"classes": classes, "next": paging.next_cursor(classes, limit, ("class_code", "section_number"))})
 
 # Example: GET http://localhost:5000/student_details/SamDoe123
 @app.get("/student_details/{student_username}")
 def get_student_details(student_username: str, db: sqlite3.Connection = Depends(get_db)):
 
     # Get student details
-    student_details = db.execute("""
-        SELECT *
-        FROM Student
-        WHERE student_username=?
-    """, (student_username,)).fetchall()[0]
+    student_details = db.execute(queries.STUDENT_DETAILS, (student_username,)).fetchall()[0]
 
     return {"student": student_details}
 
@@ -66,24 +363,21 @@ def get_student_details(student_username: str, db: sqlite3.Connection = Depends(
 def get_student_enrollment(student_username: str, db: sqlite3.Connection = Depends(get_db)):
 
     # Get student details
-    student_enrollment = db.execute("""
-        SELECT *
-        FROM Enroll
-        WHERE e_student_username=?
-    """, (student_username,)).fetchall()
+    student_enrollment = serialize.fetch(db, queries.STUDENT_ENROLLMENT, (student_username,))
 
-    return {"enrollment": student_enrollment}
+    return serialize.RowsResponse({"enrollment": student_enrollment})
 
+# Example: GET http://localhost:5000/waitlist?stream=true
 @app.get("/waitlist")
-def get_waitlist(db: sqlite3.Connection = Depends(get_db)):
+def get_waitlist(limit: int | None = Query(None, ge=1), after: str | None = None, stream: bool = False, read_connect=Depends(get_read_connect)):
+    params = (*paging.decode_cursor(after, 3), paging.sql_limit(limit))
 
-    # Check to see if student on waitlist
-    waitlist = db.execute("""
-                SELECT *
-                FROM Waitlist
-            """).fetchall()
-    
-    return {"waitlist": waitlist}
+    if stream:
+        return paging.stream_ndjson(read_connect, queries.ALL_WAITLIST, params)
+
+    with read_connect() as db:
+        waitlist = serialize.fetch(db, queries.ALL_WAITLIST, params)
+    return serialize.RowsResponse({"waitlist": waitlist, "next": paging.next_cursor(waitlist, limit, ("w_student_username", "w_class_code", "w_section_number"))})
 
 
 # ---------------------- Tasks -----------------------------
@@ -91,306 +385,172 @@ def get_waitlist(db: sqlite3.Connection = Depends(get_db)):
 # Task 1: Student can list all available classes
 # Example: GET http://localhost:5000/student/available_classes
 @app.get("/student/available_classes")
-def student_get_available_classes(db: sqlite3.Connection = Depends(get_db)):    
-    classes = db.execute("""
-                SELECT class_code, section_number, class_name, i_first_name, i_last_name
-                FROM Class, Instructor
-                WHERE (
-                    SELECT Count(*)
-                    FROM Enroll
-                    WHERE class_code = e_class_code
-                    AND section_number = e_section_number
-                ) < max_enrollment
-                AND c_instructor_username = instructor_username
-            """)    
-    return {"classes": classes.fetchall()}
+def student_get_available_classes(limit: int | None = Query(None, ge=1), after: str | None = None, stream: bool = False, read_connect=Depends(get_read_connect)):
+    params = (*paging.decode_cursor(after, 2), paging.sql_limit(limit))
+
+    if stream:
+        return paging.stream_ndjson(read_connect, queries.AVAILABLE_CLASSES, params)
+
+    with read_connect() as db:
+        classes = serialize.fetch(db, queries.AVAILABLE_CLASSES, params)
+    return serialize.RowsResponse({"classes": classes, "next": paging.next_cursor(classes, limit, ("class_code", "section_number"))})
+
+# Search the catalog by class code, name, department or instructor; every word
+# matches as a prefix, so it also serves type-ahead
+# Example: GET http://localhost:5000/search?q=data%20sys&open_only=true
+@app.get("/search", dependencies=[Depends(single_database)])
+def search_classes(q: str, open_only: bool = False, limit: int = Query(20, ge=1, le=100), db: sqlite3.Connection = Depends(get_read_db)):
+    classes = search.search(db, q, open_only, limit)
+    return serialize.RowsResponse({"classes": classes})
+
+ENROLL_CONFLICTS = {
+    EnrollOutcome.ALREADY_ENROLLED: "Student already enrolled",
+    EnrollOutcome.ALREADY_WAITLISTED: "Student already on waitlist",
+    EnrollOutcome.FULL: "Class enrollment full and waitlist full",
+    EnrollOutcome.OVER_LIMIT: "Class enrollment full and student has exceeded their max number of waitlisted classes",
+    EnrollOutcome.CONFLICT: "Section meets at the same time as a class the student is enrolled in",
+}
 
 # Task 2: Student can attempt to enroll in a class
 # Example: POST http://localhost:5000/student/enroll_in_class/student/SamDoe123/class/CHEM101/section/01
+# Send an Idempotency-Key header to make retries safe: they get the first response back
 @app.post("/student/enroll_in_class/student/{student_username}/class/{class_code}/section/{section_number}")
+@writes
 def student_enroll_self_in_class(student_username: str, class_code:str, section_number:str, db: sqlite3.Connection = Depends(get_db)):
-    # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
-    
-    if not section_exists:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Section does not exist."
-        )   
-        
-    # Check to see if student already enrolled
-    student_is_enrolled = db.execute("""
-        SELECT *
-        FROM Enroll
-        WHERE e_student_username=? 
-        AND e_class_code=? 
-        AND e_section_number=?
-    """, (student_username, class_code, section_number)).fetchall()
-
-    if student_is_enrolled:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Student already enrolled"
-        )
-    
-    # Check to see if student already on waitlist
-    student_on_waitlist = db.execute("""
-        SELECT *
-        FROM Waitlist
-        Where w_student_username=?
-        AND w_class_code=?
-        AND w_section_number=?
-    """, (student_username, class_code, section_number)).fetchall()
-
-    if student_on_waitlist:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Student already on waitlist"
-        )
-
-    # Get number of students enrolled in the class
-    num_enrollments = db.execute("""
-        SELECT COUNT(*) as num_enrollments
-        FROM Enroll
-        WHERE e_class_code=?
-        AND e_section_number=?
-    """, (class_code, section_number)).fetchall()[0]
-
-    # Get class max information
-    class_details = db.execute("""
-        SELECT max_enrollment, max_waitlist
-        FROM Class
-        WHERE class_code=?
-        AND section_number=?
-    """, (class_code, section_number)).fetchall()[0]
-    
-    # If the classes is not full then enroll the student into the class
-    if num_enrollments["num_enrollments"] < class_details['max_enrollment']:
-        # Enroll the student into the class
-        db.execute("""
-            INSERT INTO Enroll (e_student_username, e_class_code, e_section_number)
-            VALUES (?, ?, ?)
-        """, (student_username, class_code, section_number))
-
-        # Remove them from the drop list if they previously dropped the class
-        db.execute("""
-            DELETE 
-            FROM Dropped
-            Where d_student_username=?
-            AND d_class_code=?
-            AND d_section_number=?
-        """, (student_username, class_code, section_number))
-
-        # Commit the changes
-        db.commit()
+    outcome = enrollment.enroll(db, student_username, class_code, section_number, shards=router)
 
-        return {"detail": "Student successfully enrolled in class"}
+    if outcome == EnrollOutcome.ENROLLED:
+        return {"detail": "Student successfully enrolled in class", "outcome": outcome}
 
-    else:
+    if outcome == EnrollOutcome.WAITLISTED:
+        return {"detail": "Class enrollment full, Student added to waitlist", "outcome": outcome}
 
-        # Get number of students on waitlist for the class
-        num_waitlist = db.execute("""
-            SELECT COUNT(*) as num_waitlist
-            FROM Waitlist
-            WHERE w_class_code=?
-            AND w_section_number=?
-        """, (class_code, section_number)).fetchall()[0]
-
-        # If the waitlist is also full
-        if num_waitlist["num_waitlist"] >= class_details['max_waitlist']:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT, detail="Class enrollment full and waitlist full"
-            )
-
-
-        # Enroll the student into the class
-        db.execute("""
-            INSERT INTO Enroll (e_student_username, e_class_code, e_section_number)
-            VALUES (?, ?, ?)
-        """, (student_username, class_code, section_number))
-
-        # Get number of classes a student is waitlisted for
-        num_student_waitlists = db.execute("""
-            SELECT COUNT(*) as num_waitlist
-            FROM Waitlist
-            WHERE w_student_username=?
-        """, (student_username,)).fetchall()[0]
-    
-        # Student reached the max number of classes they can be waitlisted for
-        if num_student_waitlists['num_waitlist'] >= 3:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT, detail="Class enrollment full and student has exceeded their max number of waitlisted classes"
-            )   
-        
-        # Add student to the waitlist
-        currentDateTime = datetime.datetime.now()
-        db.execute("""
-            INSERT INTO Waitlist (w_student_username, w_class_code, w_section_number, timestamp)
-            VALUES (?, ?, ?, ?);
-        """, (student_username, class_code, section_number, currentDateTime))
-
-        # Remove them from the drop list if they previously dropped the class
-        db.execute("""
-            DELETE 
-            FROM Dropped
-            Where d_student_username=?
-            AND d_class_code=?
-            AND d_section_number=?
-        """, (student_username, class_code, section_number))
+    if outcome == EnrollOutcome.REQUESTED:
+        return {"detail": "Registration window is open, enrollment request recorded for the lottery", "outcome": outcome}
 
-        # Commit the changes
-        db.commit()
+    if outcome == EnrollOutcome.NO_SECTION:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Section does not exist."
+        )
 
-        return {"detail": "Class enrollment full, Student added to waitlist"}
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT, detail=ENROLL_CONFLICTS[outcome]
+    )
 
 # Task 3: Student can drop a class
 # Example: DELETE http://localhost:5000/student/drop_class/student/SamDoe123/class/MATH101/section/01
 @app.delete("/student/drop_class/student/{student_username}/class/{class_code}/section/{section_number}")
+@writes
 def student_drop_self_from_class(student_username: str, class_code:str, section_number:str, db: sqlite3.Connection = Depends(get_db)):
 
-    # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
+    # The section and whether the student is enrolled in it, in one statement
+    section = sections.load(db, class_code, section_number, student_username)
     
-    if not section_exists:
+    if section is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Section does not exist."
         )   
 
-    # Check to see if student already enrolled
-    student_is_enrolled = db.execute("""
-        SELECT *
-        FROM Enroll
-        WHERE e_student_username=? 
-        AND e_class_code=? 
-        AND e_section_number=?
-    """, (student_username, class_code, section_number)).fetchall()
-
-    # If they are enrolled, unroll them
-    if student_is_enrolled:
-        db.execute("""
-        DELETE 
-        FROM Enroll 
-        Where e_student_username=?
-        AND e_class_code=?
-        AND e_section_number=?
-        """, (student_username, class_code, section_number))
-
-        # Add them to drop list
-        db.execute("""
-        INSERT INTO Dropped (d_student_username, d_class_code, d_section_number)
-        VALUES(?, ?, ?);
-        """, (student_username, class_code, section_number))
+    # If they are enrolled, unroll them; a concurrent drop may have got
+    # there first, so only the drop that deleted the row goes on
+    if section["is_enrolled"] and db.execute(queries.DELETE_ENROLLMENT, (student_username, class_code, section_number)).rowcount:
+
+        # Add them to drop list, unless they are already on it
+        if not section["has_dropped"]:
+            db.execute(queries.INSERT_DROPPED, (student_username, class_code, section_number))
+
+        events.record(db, EventKind.DROPPED, class_code, section_number, student_username)
+
+        # Hand the open seat to the waitlist in the same transaction
+        promoted = promotion.promote(db, class_code, section_number, shards=router)
 
         # Commit the changes
         db.commit()
 
-        return {"detail": "Class successfully dropped."}
+        return {"detail": "Class successfully dropped.", "promoted": promoted}
     else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Student is not enrolled."
         )   
 
     
+# The instructor endpoints (tasks 4, 5 and 13) send an ETag built from the
+# section versions; a dashboard that sends it back in If-None-Match gets 304
+# without the roster being read again
+
 # Task 4: Instructor can view current enrollment for their classes
 # Example: GET http://localhost:5000/instructor/enrollment/instructor/100
 @app.get("/instructor/enrollment/instructor/{instructor_username}")
-def instructor_get_enrollment_for_classes(instructor_username: str, db: sqlite3.Connection = Depends(get_db)):
-    enrollment = db.execute("""
-        SELECT student_username, s_first_name, s_last_name, class_code, section_number, class_name
-        FROM Instructor, Class, Enroll, Student
-        WHERE Instructor.instructor_username=?
-        AND Instructor.instructor_username=Class.c_instructor_username
-        AND  Class.class_code=Enroll.e_class_code
-        AND Class.section_number=Enroll.e_section_number
-        AND Enroll.e_student_username=student_username
-        """, (instructor_username,)).fetchall()
-    
-    return {"enrollment": enrollment}
+def instructor_get_enrollment_for_classes(instructor_username: str, limit: int | None = Query(None, ge=1), after: str | None = None, stream: bool = False, if_none_match: str | None = Header(None), read_connect=Depends(get_read_connect)):
+    params = (instructor_username, *paging.decode_cursor(after, 3), paging.sql_limit(limit))
+
+    with read_connect() as db:
+        # One ETag over every section of the instructor, for this page and format
+        etag = etags.instructor(db, instructor_username, limit, after, "ndjson" if stream else "json")
+        if etags.matches(if_none_match, etag):
+            return etags.not_modified(etag)
+
+        if not stream:
+            enrollment = serialize.fetch(db, queries.INSTRUCTOR_ENROLLMENT, params)
+            return serialize.RowsResponse({"enrollment": enrollment, "next": paging.next_cursor(enrollment, limit, ("class_code", "section_number", "student_username"))}, headers={"ETag": etag})
+
+    # The ETag's connection is back in the pool before the stream takes one;
+    # rows newer than the ETag only make the next request miss it
+    response = paging.stream_ndjson(read_connect, queries.INSTRUCTOR_ENROLLMENT, params)
+    response.headers["ETag"] = etag
+    return response
 
 # Task 5: Instructor can view students who have dropped the class
 # Example: GET http://localhost:5000/instructor/dropped/instructor/100/class/CPSC449/section/01
 @app.get("/instructor/dropped/instructor/{instructor_username}/class/{class_code}/section/{section_number}")
-def instructor_get_students_that_dropped_class(instructor_username: str,  class_code:str, section_number:str, db: sqlite3.Connection = Depends(get_db)):
-    # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
+def instructor_get_students_that_dropped_class(instructor_username: str,  class_code:str, section_number:str, if_none_match: str | None = Header(None), db: sqlite3.Connection = Depends(get_read_db)):
+    # Check to see if section exists, in this term or an archived one; archived
+    # sections no longer change and get no ETag
+    etag = etags.section(db, class_code, section_number)
+    section_exists = etag or db.execute(queries.SECTION_HISTORY, (class_code, section_number)).fetchone()
     
     if not section_exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Section does not exist."
         )   
+
+    if etags.matches(if_none_match, etag):
+        return etags.not_modified(etag)
     
-    dropped = db.execute("""
-        SELECT student_username, s_first_name, s_last_name, class_code, section_number
-        FROM Instructor, Class, Dropped, Student
-        WHERE Instructor.instructor_username=?
-        AND Class.class_code=?
-        AND Class.section_number=?
-        AND Instructor.instructor_username=Class.c_instructor_username
-        AND  Class.class_code=Dropped.d_class_code
-        AND Class.section_number=Dropped.d_section_number
-        AND Dropped.d_student_username=student_username
-        """, (instructor_username, class_code, section_number)).fetchall()
+    dropped = serialize.fetch(db, queries.INSTRUCTOR_DROPPED, (instructor_username, class_code, section_number))
     
-    return {"dropped": dropped}
+    return serialize.RowsResponse({"dropped": dropped}, headers={"ETag": etag} if etag else None)
 
 # Task 6: Instructor can drop students administratively (e.g. if they do not show up to class)
 # Example: DELETE http://localhost:5000/instructor/drop_student/student/11111111/class/CPSC449/section/01
 @app.delete("/instructor/drop_student/student/{student_username}/class/{class_code}/section/{section_number}")
+@writes
 def instructor_drop_student_from_class(student_username: str, class_code:str, section_number:str, db: sqlite3.Connection = Depends(get_db)):
-    # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
+    # The section and whether the student is enrolled in it, in one statement
+    section = sections.load(db, class_code, section_number, student_username)
     
-    if not section_exists:
+    if section is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Section does not exist."
         )   
 
-    # Check to see if student already enrolled
-    student_is_enrolled = db.execute("""
-        SELECT *
-        FROM Enroll
-        WHERE e_student_username=? 
-        AND e_class_code=? 
-        AND e_section_number=?
-    """, (student_username, class_code, section_number)).fetchall()
-
-    # If they are enrolled, unroll them
-    if student_is_enrolled:
-        db.execute("""
-        DELETE 
-        FROM Enroll 
-        Where e_student_username=?
-        AND e_class_code=?
-        AND e_section_number=?
-        """, (student_username, class_code, section_number))
-
-        # Add them to drop list
-        db.execute("""
-        INSERT INTO Dropped (d_student_username, d_class_code, d_section_number)
-        VALUES(?, ?, ?);
-        """, (student_username, class_code, section_number))
+    # If they are enrolled, unroll them; a concurrent drop may have got
+    # there first, so only the drop that deleted the row goes on
+    if section["is_enrolled"] and db.execute(queries.DELETE_ENROLLMENT, (student_username, class_code, section_number)).rowcount:
+
+        # Add them to drop list, unless they are already on it
+        if not section["has_dropped"]:
+            db.execute(queries.INSERT_DROPPED, (student_username, class_code, section_number))
+
+        events.record(db, EventKind.DROPPED, class_code, section_number, student_username, detail="instructor")
+
+        # Hand the open seat to the waitlist in the same transaction
+        promoted = promotion.promote(db, class_code, section_number, shards=router)
 
         # Commit the changes
         db.commit()
 
-        return {"detail": "Student successfully dropped."}
+        return {"detail": "Student successfully dropped.", "promoted": promoted}
     else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Student is not enrolled."
@@ -406,32 +566,47 @@ def instructor_drop_student_from_class(student_username: str, class_code:str, se
 #     "auto_enrollment": true,
 #     "max_enrollment": 30,
 #     "max_waitlist": 15,
-#     "c_instructor_username": "100"
+#     "c_instructor_username": "100",
+#     "term": "FA2023",
+#     "meetings": [{"day": "Tue", "start": "16:00", "end": "17:15"}, {"day": "Thu", "start": "16:00", "end": "17:15"}]
 # }
 @app.post("/registrar/new_class")
+@writes(catalog_change=True)
 def registrar_create_new_class(new_class: Class, request: Request, db: sqlite3.Connection = Depends(get_db)):
+    # The class code comes in the body, so get_db could not pick the shard
+    if router is not None:
+        with connect(class_code=new_class.class_code) as db:
+            return _create_class(new_class, db)
+    return _create_class(new_class, db)
 
+def _create_class(new_class, db):
     c = dict(new_class)
+    c["term"] = c["term"] or settings.current_term
     
-    class_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=:class_code
-                AND section_number=:section_number
-            """, c).fetchall()
+    class_exists = catalog.section(db, c["class_code"], c["section_number"])
     
+    # Live sections are keyed by class code and section number alone, so a
+    # term can only reuse them once the term holding them is archived
+    if class_exists and class_exists["term"] != c["term"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Section {c['class_code']} {c['section_number']} already exists in term {class_exists['term']}; archive that term first.",
+        )
     if class_exists:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="Class already exists."
         )   
 
-    db.execute("""
-        INSERT INTO Class (class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username)
-        VALUES (:class_code, :section_number, :class_name, :department, :auto_enrollment, :max_enrollment, :max_waitlist, :c_instructor_username)
-        """, c)
+    if not db.execute(queries.INSERT_CLASS, c).rowcount:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Term does not exist or is closed."
+        )
+    schedule.add_meetings(db, c["class_code"], c["section_number"], [(m.day, m.start, m.end) for m in new_class.meetings])
+    events.record(db, EventKind.SECTION_ADDED, c["class_code"], c["section_number"])
     
     # Commit the changes
     db.commit()
+    catalog.invalidate()
     
     return {"detail": "New class successfully added."}
 
@@ -439,45 +614,31 @@ def registrar_create_new_class(new_class: Class, request: Request, db: sqlite3.C
 # Task 8: Registrar can remove existing sections
 # Example: DELETE http://localhost:5000/registrar/remove_class/code/CPSC449/section/04
 @app.delete("/registrar/remove_class/code/{class_code}/section/{section_number}")
+@writes(catalog_change=True)
 def registrar_remove_section(class_code: str, section_number: str, db: sqlite3.Connection = Depends(get_db)):
     # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
+    section_exists = catalog.section(db, class_code, section_number)
     
     if section_exists:
         # Delete section
-        db.execute(""" 
-        DELETE FROM Class 
-        WHERE class_code=?
-        AND section_number=?
-        """, (class_code, section_number))
+        db.execute(queries.DELETE_CLASS, (class_code, section_number))
 
         # Unenroll every student who was in that section
-        db.execute(""" 
-        DELETE FROM Enroll 
-        WHERE e_class_code=?
-        AND e_section_number=?
-        """, (class_code, section_number))
+        db.execute(queries.DELETE_SECTION_ENROLLMENT, (class_code, section_number))
 
         # Remove every student who was in that section from the waitlist
-        db.execute(""" 
-        DELETE FROM Waitlist
-        WHERE w_class_code=?
-        AND w_section_number=?
-        """, (class_code, section_number))
+        db.execute(queries.DELETE_SECTION_WAITLIST, (class_code, section_number))
 
         # Remove every student who was in that section from the droplist
-        db.execute(""" 
-        DELETE FROM Dropped
-        WHERE d_class_code=?
-        AND d_section_number=?
-        """, (class_code, section_number))
+        db.execute(queries.DELETE_SECTION_DROPPED, (class_code, section_number))
+
+        # Remove the section's meeting times
+        db.execute(queries.DELETE_SECTION_MEETINGS, (class_code, section_number))
+
+        events.record(db, EventKind.SECTION_REMOVED, class_code, section_number)
 
         db.commit()
+        catalog.invalidate()
         return {"detail": "Section successfully removed."}
     else:
         raise HTTPException(
@@ -487,68 +648,47 @@ def registrar_remove_section(class_code: str, section_number: str, db: sqlite3.C
 # Task 9: Registrar can change instructor for a section
 # Example: PATCH http://localhost:5000/registrar/change_instructor/class/CPSC449/section/01/new_instructor/101
 @app.patch("/registrar/change_instructor/class/{class_code}/section/{section_number}/new_instructor/{instructor_username}")
+@writes(catalog_change=True)
 def registrar_change_instructor_for_class(class_code: str, section_number: str, instructor_username: str, db: sqlite3.Connection = Depends(get_db)):
 
-    # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
+    # The section and whether the instructor exists, in one statement
+    section = sections.load(db, class_code, section_number, instructor_username=instructor_username)
     
-    if not section_exists:
+    if section is None:
         raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST, detail="Section does not exist."
                 )   
     
-    # Check to see if instructor exists 
-    instructor_exists = db.execute("""
-                SELECT *
-                FROM Instructor
-                WHERE instructor_username=?
-            """, (instructor_username,)).fetchall()
-    
-    if not instructor_exists:
+    if not section["instructor_exists"]:
         raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="Instructor does not exist."
                 )   
 
     # Change instructor for section
-    db.execute("""
-            UPDATE Class
-            SET c_instructor_username=?
-            WHERE class_code=?
-            AND section_number=?
-        """, (instructor_username, class_code, section_number))
+    db.execute(queries.CHANGE_INSTRUCTOR, (instructor_username, class_code, section_number))
+    events.record(db, EventKind.INSTRUCTOR_CHANGED, class_code, section_number, detail=instructor_username)
 
     db.commit()
+    catalog.invalidate()
     return {"detail": "Instructor successfully changed"}
         
 
 # Task 10: Freeze automatic enrollment from waiting lists (e.g. during the second week of classes)
 # Example: PATCH http://localhost:5000/registrar/freeze_enrollment/class/CPSC449/section/01
 @app.patch("/registrar/freeze_enrollment/class/{class_code}/section/{section_number}")
+@writes(catalog_change=True)
 def registrar_freeze_enrollment_for_class(class_code: str, section_number: str, db: sqlite3.Connection = Depends(get_db)):
 
     # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
+    section_exists = catalog.section(db, class_code, section_number)
 
     if section_exists:
         # Change class auto_enrollment to false
-        db.execute("""
-                UPDATE Class
-                SET auto_enrollment = FALSE
-                Where class_code=?
-                AND section_number=?
-            """, (class_code, section_number))
+        db.execute(queries.FREEZE_ENROLLMENT, (class_code, section_number))
+        events.record(db, EventKind.ENROLLMENT_FROZEN, class_code, section_number)
     
         db.commit()
+        catalog.invalidate()
         return {"detail": "auto enrollment successfully frozen."}
     
     else:
@@ -557,84 +697,70 @@ def registrar_freeze_enrollment_for_class(class_code: str, section_number: str,
                 )   
     
     
+# Example: POST http://localhost:5000/registrar/rebalance
+@app.post("/registrar/rebalance", dependencies=[Depends(single_database)])
+@writes
+def registrar_rebalance_all_sections(db: sqlite3.Connection = Depends(get_db)):
+    # Promote waitlisted students into every open seat, e.g. after capacities were raised
+    return promotion.rebalance(db)
+
 # Task 11: Student can view their current position on the waiting list
 # Example: GET http://localhost:5000/student/waitlist_position/student/ScottDavis123/class/ENGL205/section/01
 @app.get("/student/waitlist_position/student/{student_username}/class/{class_code}/section/{section_number}")
 def student_get_waitlist_position_for_class(student_username: str, class_code: str, section_number: str, db: sqlite3.Connection = Depends(get_db)):
 
-    # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
-    
-    if not section_exists:
+    position = db.execute(queries.WAITLIST_POSITION, {"student_username": student_username, "class_code": class_code, "section_number": section_number}).fetchone()
+
+    if position is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Section does not exist."
-        )   
+        )
 
-    # Check to see if student on waitlist
-    student_on_waitlist = db.execute("""
-                SELECT *
-                FROM Waitlist
-                WHERE w_student_username=?
-                AND w_class_code=?
-                AND w_section_number=?
-            """, (student_username, class_code, section_number)).fetchall()
-    
-    
-    if student_on_waitlist:
-        # For all students on the wait list for the specified class, get their id and the time they joined the waitlist
-        class_waitlist = db.execute("""
-                SELECT w_student_username, timestamp
-                FROM Waitlist
-                WHERE w_class_code=?
-                AND w_section_number=?
-            """, (class_code, section_number)).fetchall()
-        
-        # Transform data so we can check the students position on the waitlist
-        waitlist = {}
-        for wait_list_item in class_waitlist:
-            waitlist_student_username = wait_list_item["w_student_username"]
-            waitlist_timestamp = wait_list_item["timestamp"]
-            waitlist[waitlist_student_username] = waitlist_timestamp
-        
-        # Return position on waitlist
-        return f'You are number {get_position_on_waitlist(waitlist, student_username)} on the waitlist'
-    
-    else:
+    if not position["on_waitlist"]:
         raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="Student not on waitlist."
-                )   
+                )
+
+    return {"position": position["ahead"] + 1, "total": position["total"], "ahead": position["ahead"]}
+
+# Example: GET http://localhost:5000/student/waitlist_positions/student/SamathaSmith123
+@app.get("/student/waitlist_positions/student/{student_username}")
+def student_get_waitlist_positions(student_username: str, db: sqlite3.Connection = Depends(get_db)):
+
+    # Position on every waitlist the student is on, in one statement
+    positions = db.execute(queries.WAITLIST_POSITIONS, (student_username,)).fetchall()
+
+    return {"waitlists": [
+        {
+            "class_code": row["class_code"],
+            "section_number": row["section_number"],
+            "position": row["ahead"] + 1,
+            "total": row["total"],
+            "ahead": row["ahead"],
+        }
+        for row in positions
+    ]}
 
-def get_position_on_waitlist(dict, student_username):
-    ordered_dict = OrderedDict({k: v for k, v in sorted(dict.items(), key=lambda item: item[1])})
-    return list(ordered_dict.keys()).index(student_username) + 1
+# Example: GET http://localhost:5000/student/schedule/student/SamDoe123
+@app.get("/student/schedule/student/{student_username}")
+def student_get_schedule(student_username: str, db: sqlite3.Connection = Depends(get_db)):
+
+    # Weekly meeting blocks of every enrolled section, in one statement
+    return {"schedule": schedule.student_schedule(db, student_username)}
 
 # Task 12: Student can remove themselves from a waiting list
 # Example: DELETE http://localhost:5000/student/remove_from_waitlist/student/11111111/class/ENGL205/section/01
 @app.delete("/student/remove_from_waitlist/student/{student_username}/class/{class_code}/section/{section_number}")
+@writes
 def student_remove_self_from_class_waitlist(student_username: str, class_code: str, section_number: str, db: sqlite3.Connection = Depends(get_db)):
 
     # Check to see if student on waitlist
-    student_on_waitlist = db.execute("""
-                SELECT *
-                FROM Waitlist
-                WHERE w_student_username=?
-                AND w_class_code=?
-                AND w_section_number=?
-            """, (student_username, class_code, section_number)).fetchall()
-
-    if student_on_waitlist:
+    section = sections.load(db, class_code, section_number, student_username)
+
+    if section is not None and section["is_waitlisted"]:
         # Remove student from waitlist
-        db.execute("""
-                DELETE FROM Waitlist
-                WHERE w_student_username=?
-                AND w_class_code=?
-                AND w_section_number=?
-            """, (student_username, class_code, section_number))
+        db.execute(queries.DELETE_WAITLIST_ENTRY, (student_username, class_code, section_number))
+        events.record(db, EventKind.LEFT_WAITLIST, class_code, section_number, student_username)
     
         db.commit()
         return {"detail": "Successfully removed from waitlist"}
@@ -648,44 +774,165 @@ def student_remove_self_from_class_waitlist(student_username: str, class_code: s
 # Task 13: Instructor can view the current waiting list for their course
 # Example: GET http://localhost:5000/instructor/waitlist_for_class/instructor/102/class/CHEM101/section/02
 @app.get("/instructor/waitlist_for_class/instructor/{instructor_username}/class/{class_code}/section/{section_number}")
-def instructor_get_waitlist_for_class(instructor_username: str, class_code: str, section_number: str, db: sqlite3.Connection = Depends(get_db)):
+def instructor_get_waitlist_for_class(instructor_username: str, class_code: str, section_number: str, if_none_match: str | None = Header(None), db: sqlite3.Connection = Depends(get_read_db)):
 
-    # Check to see if section exists 
-    section_exists = db.execute("""
-                SELECT *
-                FROM Class
-                WHERE class_code=?
-                AND section_number=?
-            """, (class_code, section_number)).fetchall()
+    # The section, its version and whether the instructor exists, in one statement
+    section = sections.load(db, class_code, section_number, instructor_username=instructor_username)
     
-    if not section_exists:
+    if section is None:
         raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="Section does not exist."
                 )   
     
-    # Check to see if section exists 
-    instructor_exists = db.execute("""
-                SELECT *
-                FROM Instructor
-                WHERE instructor_username=?
-            """, (instructor_username,)).fetchall()
-    
-    if not instructor_exists:
+    if not section["instructor_exists"]:
         raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="Instructor does not exist."
                 )   
 
+    etag = etags.section_tag(class_code, section_number, section["version"])
+
+    if etags.matches(if_none_match, etag):
+        return etags.not_modified(etag)
+
     # Get all students on the waitlist
-    waitlist = db.execute("""
-                SELECT student_username, s_first_name, s_last_name, class_code, section_number, timestamp
-                FROM Instructor, Class, Waitlist, Student
-                WHERE Instructor.instructor_username=?
-                AND Class.class_code=?
-                AND Class.section_number=?
-                AND Instructor.instructor_username=Class.c_instructor_username
-                AND  Class.class_code=Waitlist.w_class_code
-                AND Class.section_number=Waitlist.w_section_number
-                AND Waitlist.w_student_username=student_username
-            """, (instructor_username, class_code, section_number)).fetchall()
+    waitlist = serialize.fetch(db, queries.INSTRUCTOR_WAITLIST, (instructor_username, class_code, section_number))
     
-    return {"waitlist": waitlist}
+    return serialize.RowsResponse({"waitlist": waitlist}, headers={"ETag": etag})
+
+
+# ---------------------- Lottery -----------------------------
+
+# While a term's registration window is open, enrolling only records a
+# request; the registrar then allocates every request of the term in one
+# seeded pass (see lottery.allocate)
+
+# Example: POST http://localhost:5000/student/request_enrollment/student/SamDoe123
+# body: [{"class_code": "CPSC449", "section_number": "01"}, {"class_code": "CPSC449", "section_number": "02"}]
+@app.post("/student/request_enrollment/student/{student_username}", dependencies=[Depends(single_database)])
+@writes
+def student_request_enrollment(student_username: str, choices: list[Choice], db: sqlite3.Connection = Depends(get_db)):
+    wanted = [(c.class_code, c.section_number) for c in choices]
+
+    if not 1 <= len(wanted) <= lottery.MAX_CHOICES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Rank between 1 and {lottery.MAX_CHOICES} sections."
+        )
+
+    found = lottery.request_sections(db, wanted)
+    if len(found) < len(set(wanted)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Section does not exist."
+        )
+    if not all(window for _, window in found.values()):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Registration window is not open for this section."
+        )
+    if len({term for term, _ in found.values()}) > 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Ranked sections must be in the same term."
+        )
+
+    number = lottery.record_request(db, student_username, wanted)
+    db.commit()
+
+    return {"detail": "Enrollment request recorded for the lottery", "request_number": number}
+
+# Example: GET http://localhost:5000/student/requests/student/SamDoe123
+@app.get("/student/requests/student/{student_username}")
+def student_get_requests(student_username: str, db: sqlite3.Connection = Depends(get_db)):
+    requests = serialize.fetch(db, queries.STUDENT_REQUESTS, (student_username,))
+    return serialize.RowsResponse({"requests": requests})
+
+# Example: PATCH http://localhost:5000/registrar/lottery/open/term/FA2023
+@app.patch("/registrar/lottery/open/term/{term}", dependencies=[Depends(single_database)])
+@writes
+def registrar_open_lottery(term: str, db: sqlite3.Connection = Depends(get_db)):
+    if not lottery.open_window(db, term):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Term does not exist or is closed."
+        )
+    return {"detail": "Registration window open, enrollment requests are recorded for the lottery"}
+
+# Example: POST http://localhost:5000/registrar/lottery/allocate/term/FA2023?seed=449
+@app.post("/registrar/lottery/allocate/term/{term}", dependencies=[Depends(single_database)])
+@writes
+def registrar_allocate_lottery(term: str, seed: int | None = None, db: sqlite3.Connection = Depends(get_db)):
+    # Same requests and seed, same allocation; the seed used is returned
+    return lottery.allocate(db, term, seed)
+
+
+# ---------------------- Events -----------------------------
+
+# Server-sent events of one section or one student, instead of polling tasks
+# 4, 11 and 13: each event carries its sequence number as the SSE id, and a
+# client resumes after ?after=N or the Last-Event-ID header it reconnects
+# with. Without either, only events from now on are sent.
+
+def event_stream(key, after, last_event_id):
+    if after is None:
+        after = last_event_id
+    return StreamingResponse(
+        event_hub.stream(key, after, heartbeat=settings.events_heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Example: GET http://localhost:5000/events/class/CPSC449/section/01?after=0
+@app.get("/events/class/{class_code}/section/{section_number}", dependencies=[Depends(single_database)])
+async def get_section_events(class_code: str, section_number: str, after: int | None = Query(None, ge=0), last_event_id: int | None = Header(None)):
+    return event_stream(("section", class_code, section_number), after, last_event_id)
+
+# Example: GET http://localhost:5000/events/student/SamDoe123?after=0
+@app.get("/events/student/{student_username}", dependencies=[Depends(single_database)])
+async def get_student_events(student_username: str, after: int | None = Query(None, ge=0), last_event_id: int | None = Header(None)):
+    return event_stream(("student", student_username), after, last_event_id)
+
+
+# ---------------------- Bulk -----------------------------
+
+def bulk_results(rows, outcomes):
+    return {
+        "results": [
+            {"student_username": student, "class_code": class_code, "section_number": section_number, "outcome": outcome}
+            for (student, class_code, section_number), outcome in zip(rows, outcomes)
+        ],
+        "summary": dict(collections.Counter(outcome.value for outcome in outcomes)),
+    }
+
+async def read_csv_upload(file: UploadFile):
+    try:
+        return bulk.parse_csv((await file.read()).decode("utf-8-sig"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        )
+
+# Example: POST http://localhost:5000/registrar/bulk/enroll
+# body: [{"student_username": "SamDoe123", "class_code": "CPSC449", "section_number": "02"}, ...]
+@app.post("/registrar/bulk/enroll", dependencies=[Depends(single_database)])
+@writes
+def registrar_bulk_enroll(registrations: list[Registration], db: sqlite3.Connection = Depends(get_db)):
+    rows = [(r.student_username, r.class_code, r.section_number) for r in registrations]
+    return bulk_results(rows, bulk.enroll_many(db, rows, settings.bulk_chunk_size))
+
+# Example: POST http://localhost:5000/registrar/bulk/enroll/csv (multipart upload, field "file")
+@app.post("/registrar/bulk/enroll/csv", dependencies=[Depends(single_database)])
+@writes
+def registrar_bulk_enroll_csv(rows: list = Depends(read_csv_upload), db: sqlite3.Connection = Depends(get_db)):
+    return bulk_results(rows, bulk.enroll_many(db, rows, settings.bulk_chunk_size))
+
+# Example: POST http://localhost:5000/registrar/bulk/drop
+# body: [{"student_username": "SamDoe123", "class_code": "CPSC449", "section_number": "01"}, ...]
+@app.post("/registrar/bulk/drop", dependencies=[Depends(single_database)])
+@writes
+def registrar_bulk_drop(registrations: list[Registration], db: sqlite3.Connection = Depends(get_db)):
+    rows = [(r.student_username, r.class_code, r.section_number) for r in registrations]
+    outcomes, promoted = bulk.drop_many(db, rows, settings.bulk_chunk_size)
+    return dict(bulk_results(rows, outcomes), promoted=promoted)
+
+# Example: POST http://localhost:5000/registrar/bulk/drop/csv (multipart upload, field "file")
+@app.post("/registrar/bulk/drop/csv", dependencies=[Depends(single_database)])
+@writes
+def registrar_bulk_drop_csv(rows: list = Depends(read_csv_upload), db: sqlite3.Connection = Depends(get_db)):
+    outcomes, promoted = bulk.drop_many(db, rows, settings.bulk_chunk_size)
+    return dict(bulk_results(rows, outcomes), promoted=promoted)
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import time
+
+import queries
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "share", "archive.sql")) as f:
+    SCHEMA = f.read()
+
+# (copy, delete) per table of a section, the Class row last since the copies join on it.
+# The section's events are not kept: the change feed only follows live sections
+MOVES = (
+    (queries.ARCHIVE_DROPPED, queries.DELETE_SECTION_DROPPED),
+    (queries.ARCHIVE_WAITLIST, queries.DELETE_SECTION_WAITLIST),
+    (queries.ARCHIVE_ENROLLMENT, queries.DELETE_SECTION_ENROLLMENT),
+    (queries.ARCHIVE_MEETINGS, queries.DELETE_SECTION_MEETINGS),
+    (queries.ARCHIVE_REQUESTS, queries.DELETE_SECTION_REQUESTS),
+    (None, queries.DELETE_SECTION_EVENTS),
+    (queries.ARCHIVE_CLASS, queries.DELETE_CLASS),
+)
+
+
+def create(path):
+    """Create the archive database at `path`, or add whatever tables it is missing."""
+    db = sqlite3.connect(":memory:")
+    try:
+        db.execute("ATTACH DATABASE ? AS archive", (path,))
+        db.executescript(SCHEMA)
+    finally:
+        db.close()
+
+
+def attach(db, path=None, read_only=False):
+    """Attach the archive as `archive` and create the history views on `db`.
+
+    Without a path an empty in-memory archive is attached instead, so the
+    statements reading ClassHistory and DroppedHistory work either way. The
+    archive at `path` must already exist (see create()).
+    """
+    if path is None:
+        db.execute("ATTACH DATABASE ':memory:' AS archive")
+        db.executescript(SCHEMA)
+    elif read_only:
+        # Read-only connections are opened with uri=True
+        db.execute("ATTACH DATABASE ? AS archive", (f"file:{path}?mode=ro",))
+    else:
+        db.execute("ATTACH DATABASE ? AS archive", (path,))
+
+    db.execute(queries.CLASS_HISTORY)
+    db.execute(queries.DROPPED_HISTORY)
+
+
+def close_term(db, term):
+    """Mark a term closed so archive_closed_terms() picks it up. Returns False if there is no such term."""
+    closed = db.execute(queries.CLOSE_TERM, (term,)).rowcount
+    db.commit()
+    return bool(closed)
+
+
+def archive_term(db, term, batch_size=50, pause=0.01):
+    """Move every section of `term` and its enrollment, waitlist, drops, meetings and lottery requests to the archive.
+
+    Sections move `batch_size` at a time, each batch in its own BEGIN
+    IMMEDIATE transaction followed by `pause` seconds without the write lock,
+    so the api's writers wait for one short batch at most and readers (WAL)
+    not at all. A section is copied and deleted in the same transaction, so
+    the history views never show it twice or not at all.
+
+    Returns the number of sections moved.
+    """
+    moved = 0
+    while True:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            batch = [tuple(row) for row in db.execute(queries.TERM_SECTIONS, (term, batch_size))]
+            for copy, delete in MOVES:
+                if copy is not None:
+                    db.executemany(copy, batch)
+                db.executemany(delete, batch)
+        except BaseException:
+            db.rollback()
+            raise
+        db.commit()
+
+        moved += len(batch)
+        if len(batch) < batch_size:
+            return moved
+        time.sleep(pause)
+
+
+def archive_closed_terms(db, batch_size=50, pause=0.01):
+    """archive_term() every closed term; returns the sections moved per term."""
+    terms = [row[0] for row in db.execute(queries.CLOSED_TERMS)]
+    return {term: archive_term(db, term, batch_size, pause) for term in terms}
+
+
+def compact(db, pages=256, pause=0.01):
+    """Hand free pages back to the filesystem `pages` at a time, then refresh the planner statistics.
+
+    Needs auto_vacuum=INCREMENTAL, which the schema sets when the database is
+    created; older databases have to be converted once with
+    `PRAGMA auto_vacuum=INCREMENTAL; VACUUM;` (which does block). Returns the
+    number of pages released, or None if incremental vacuum is not enabled.
+    """
+    released = None
+    if db.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2:
+        released = 0
+        while True:
+            free = db.execute("PRAGMA main.freelist_count").fetchone()[0]
+            if not free:
+                break
+            # Each call is its own short write transaction
+            db.execute(f"PRAGMA main.incremental_vacuum({int(pages)})").fetchall()
+            released += min(free, pages)
+            time.sleep(pause)
+
+    db.execute("PRAGMA optimize").fetchall()
+    return released
@@ -0,0 +1,107 @@
+"""Live write latency while a closed term is being archived, by archive batch size.
+
+A closed term of --sections sections (each with --enrolled students, some
+drops, a waitlist and two meeting blocks) is added to the sample data. A
+background thread then enrolls and drops a student in a current-term section
+in a loop while archive.archive_term moves the closed term, and the latency
+of those writes is reported per batch size. "all" moves the whole term in a
+single transaction, which is what a naive INSERT ... SELECT / DELETE would do.
+
+Usage (from within the api folder):
+    python bench/bench_archive.py [--sections 2000] [--enrolled 30] [--batch-sizes all,200,50,10]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import add_students, make_database, percentile, remove_database, summarize
+
+import archive
+import enrollment
+import pool
+import queries
+
+
+def add_closed_term(database, sections, enrolled, students):
+    with sqlite3.connect(database) as db:
+        db.execute("INSERT INTO Term (term, closed) VALUES ('SP2023', TRUE)")
+        db.executemany(
+            "INSERT INTO Class (class_code, section_number, term, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username) VALUES (?, '01', 'SP2023', 'Archived', 'Bench', TRUE, ?, 5, 'IreneDoe100')",
+            [(f"A{i:06d}", enrolled) for i in range(sections)],
+        )
+        enroll_rows, dropped_rows, waitlist_rows, meeting_rows = [], [], [], []
+        for i in range(sections):
+            code = f"A{i:06d}"
+            for k in range(enrolled + 5):
+                student = students[(i * 7 + k) % len(students)]
+                if k < enrolled:
+                    enroll_rows.append((student, code, "01"))
+                elif k < enrolled + 3:
+                    dropped_rows.append((student, code, "01"))
+                else:
+                    waitlist_rows.append((student, code, "01", "2023-01-15 10:00:00"))
+            meeting_rows += [(code, "01", 0, 540, 615), (code, "01", 2, 540, 615)]
+        db.executemany("INSERT INTO Enroll VALUES (?, ?, ?)", enroll_rows)
+        db.executemany("INSERT INTO Dropped VALUES (?, ?, ?)", dropped_rows)
+        db.executemany("INSERT INTO Waitlist VALUES (?, ?, ?, ?)", waitlist_rows)
+        db.executemany("INSERT INTO Meeting VALUES (?, ?, ?, ?, ?)", meeting_rows)
+    db.close()
+
+
+def live_writes(database, stop, latencies):
+    """Enroll a student into a current-term section and drop them again, until stopped."""
+    db = pool.connect(database)
+    while not stop.is_set():
+        start = time.perf_counter()
+        enrollment.enroll(db, "SamDoe123", "CPSC449", "02")
+        db.execute(queries.DELETE_ENROLLMENT, ("SamDoe123", "CPSC449", "02"))
+        db.commit()
+        latencies.append(time.perf_counter() - start)
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--enrolled", type=int, default=30)
+    parser.add_argument("--batch-sizes", default="all,200,50,10")
+    args = parser.parse_args()
+
+    print(f"{'batch':>6}{'archive s':>11}{'writes':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for batch_size in args.batch_sizes.split(","):
+        database = make_database()
+        students = add_students(database, 3000)
+        add_closed_term(database, args.sections, args.enrolled, students)
+        archive_path = os.path.join(tempfile.mkdtemp(), "archive.db")
+        archive.create(archive_path)
+
+        db = pool.connect(database, archive_database=archive_path)
+        stop = threading.Event()
+        latencies = []
+        writer = threading.Thread(target=live_writes, args=(database, stop, latencies))
+        writer.start()
+        time.sleep(0.2)
+
+        start = time.perf_counter()
+        archive.archive_term(db, "SP2023", args.sections + 1 if batch_size == "all" else int(batch_size))
+        elapsed = time.perf_counter() - start
+        time.sleep(0.2)
+        stop.set()
+        writer.join()
+        db.close()
+
+        stats = summarize(latencies)
+        print(
+            f"{batch_size:>6}{elapsed:>11.2f}{stats['count']:>8}"
+            f"{stats['p50_ms']:>9.2f}{stats['p99_ms']:>9.2f}{percentile(latencies, 100) * 1000:>9.2f}"
+        )
+        remove_database(database)
+        remove_database(archive_path)
+        os.rmdir(os.path.dirname(archive_path))
+
+
+if __name__ == "__main__":
+    main()
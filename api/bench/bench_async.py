@@ -0,0 +1,78 @@
+"""Write throughput of the sync handlers vs async mode with the writer queue.
+
+Each client repeatedly enrolls a fresh student and drops them again, so every
+request is a write contending for the database. Runs at 1, 8 and 64
+concurrent clients through an in-process ASGI transport.
+
+Usage (from within the api folder):
+    python bench/bench_async.py [--requests 2000] [--clients 1 8 64]
+"""
+import argparse
+import asyncio
+import collections
+import sqlite3
+import time
+
+from common import add_students, load_app, make_database, remove_database
+
+import httpx
+
+
+async def drive(app, students, clients):
+    statuses = collections.Counter()
+    work = iter(students)
+
+    async def client_loop(client):
+        for student in work:
+            enroll = await client.post(f"/student/enroll_in_class/student/{student}/class/CPSC449/section/01")
+            drop = await client.delete(f"/student/drop_class/student/{student}/class/CPSC449/section/01")
+            statuses[enroll.status_code] += 1
+            statuses[drop.status_code] += 1
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return sum(statuses.values()) / elapsed, statuses
+
+
+def bench(async_mode, requests, clients):
+    database = make_database()
+    students = add_students(database, requests // 2)
+    with sqlite3.connect(database) as db:
+        db.execute("UPDATE Class SET max_enrollment=? WHERE class_code='CPSC449' AND section_number='01'", (requests,))
+    db.close()
+
+    api = load_app(database, async_mode=async_mode)
+    throughput, statuses = asyncio.run(drive(api.app, students, clients))
+    if api.writer is not None:
+        batches = api.writer.stats()["mean_batch"]
+        api.writer.close()
+    else:
+        batches = None
+    if api.pool is not None:
+        api.pool.close()
+    remove_database(database)
+    return throughput, statuses, batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 64])
+    args = parser.parse_args()
+
+    print(f"{'clients':>8}{'mode':>7}{'writes/s':>10}{'errors':>8}{'batch':>7}")
+    for clients in args.clients:
+        for async_mode in (False, True):
+            throughput, statuses, batch = bench(async_mode, args.requests, clients)
+            errors = sum(n for code, n in statuses.items() if code >= 500)
+            mode = "async" if async_mode else "sync"
+            batch = f"{batch:.1f}" if batch is not None else "-"
+            print(f"{clients:>8}{mode:>7}{throughput:>10.1f}{errors:>8}{batch:>7}")
+
+
+if __name__ == "__main__":
+    main()
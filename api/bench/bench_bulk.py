@@ -0,0 +1,81 @@
+"""Bulk enroll/drop endpoints vs looping the single-row endpoints.
+
+Usage (from within the api folder):
+    python bench/bench_bulk.py [--rows 10000]
+"""
+import argparse
+import sqlite3
+import time
+
+from common import add_students, load_app, make_database, remove_database
+
+from fastapi.testclient import TestClient
+
+SECTIONS = [("CPSC449", "01"), ("CPSC449", "02"), ("MATH101", "01"), ("PHYS202", "01")]
+
+
+def setup(rows):
+    database = make_database()
+    students = add_students(database, rows)
+    with sqlite3.connect(database) as db:
+        db.execute("UPDATE Class SET max_enrollment=?", (rows,))
+    db.close()
+    # Every student into one of the sections, spread round-robin
+    return database, [(student, *SECTIONS[i % len(SECTIONS)]) for i, student in enumerate(students)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_single(rows):
+    database, registrations = setup(rows)
+    api = load_app(database)
+    with TestClient(api.app) as client:
+        def enroll():
+            for student, class_code, section_number in registrations:
+                client.post(f"/student/enroll_in_class/student/{student}/class/{class_code}/section/{section_number}")
+
+        def drop():
+            for student, class_code, section_number in registrations:
+                client.delete(f"/instructor/drop_student/student/{student}/class/{class_code}/section/{section_number}")
+
+        results = {"enroll": timed(enroll), "drop": timed(drop)}
+    remove_database(database)
+    return results
+
+
+def bench_bulk(rows):
+    database, registrations = setup(rows)
+    api = load_app(database)
+    body = [
+        {"student_username": student, "class_code": class_code, "section_number": section_number}
+        for student, class_code, section_number in registrations
+    ]
+    with TestClient(api.app) as client:
+        results = {
+            "enroll": timed(lambda: client.post("/registrar/bulk/enroll", json=body).raise_for_status()),
+            "drop": timed(lambda: client.post("/registrar/bulk/drop", json=body).raise_for_status()),
+        }
+    remove_database(database)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    single = bench_single(args.rows)
+    batched = bench_bulk(args.rows)
+
+    print(f"{args.rows} rows")
+    print(f"{'operation':<10}{'single (s)':>12}{'bulk (s)':>12}{'speedup':>10}")
+    for operation in single:
+        print(f"{operation:<10}{single[operation]:>12.2f}{batched[operation]:>12.2f}{single[operation] / batched[operation]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
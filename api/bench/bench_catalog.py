@@ -0,0 +1,76 @@
+"""p50/p99 of the section-exists check with and without the catalog cache.
+
+Usage (from within the api folder):
+    python bench/bench_catalog.py [--sections 20000] [--lookups 50000]
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+from common import make_database, remove_database, summarize
+
+from catalog import CatalogCache
+
+
+def add_sections(database, count):
+    with sqlite3.connect(database) as db:
+        db.executemany(
+            "INSERT INTO Class (class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username, term) VALUES (?, ?, ?, ?, TRUE, 30, 15, 'IreneDoe100', 'FA2023')",
+            [(f"B{i:06d}", "01", f"Bench Class {i}", "Bench") for i in range(count)],
+        )
+    db.close()
+    return [(f"B{i:06d}", "01") for i in range(count)]
+
+
+def time_lookups(check, keys):
+    latencies = []
+    for class_code, section_number in keys:
+        start = time.perf_counter()
+        check(class_code, section_number)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=449)
+    args = parser.parse_args()
+
+    database = make_database()
+    sections = add_sections(database, args.sections)
+    # Skewed towards popular sections, like registration traffic
+    rng = random.Random(args.seed)
+    keys = rng.choices(sections, weights=[1 / (i + 1) for i in range(len(sections))], k=args.lookups)
+
+    db = sqlite3.connect(database)
+    db.row_factory = sqlite3.Row
+
+    def uncached(class_code, section_number):
+        return db.execute("""
+            SELECT *
+            FROM Class
+            WHERE class_code=?
+            AND section_number=?
+        """, (class_code, section_number)).fetchall()
+
+    cache = CatalogCache()
+
+    results = {
+        "no cache": time_lookups(uncached, keys),
+        "cache": time_lookups(lambda code, section: cache.section(db, code, section), keys),
+    }
+
+    db.close()
+    remove_database(database)
+
+    print(f"{'mode':<10}{'p50 (us)':>12}{'p99 (us)':>12}")
+    for mode, summary in results.items():
+        print(f"{mode:<10}{summary['p50_ms'] * 1000:>12.1f}{summary['p99_ms'] * 1000:>12.1f}")
+    print(f"cache stats: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
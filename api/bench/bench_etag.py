@@ -0,0 +1,84 @@
+"""Cost of a dashboard refresh answered in full against one answered 304 Not Modified.
+
+An instructor teaching --sections sections of --enrolled students, with
+--waitlisted students on the waitlist of the first one, refreshes each of
+the three instructor endpoints --repeat times: once without and once with
+the ETag of the previous response in If-None-Match. Requests go through the
+whole app in-process (routing, metrics, serialization); the SQL statements
+per request come from the app's metrics.
+
+Usage (from within the api folder):
+    python bench/bench_etag.py [--sections 10] [--enrolled 200] [--waitlisted 15] [--repeat 500]
+"""
+import argparse
+import sqlite3
+import time
+
+from common import add_students, load_app, make_database, remove_database
+
+from fastapi.testclient import TestClient
+
+
+def add_roster(database, sections, enrolled, waitlisted):
+    students = add_students(database, enrolled + waitlisted)
+    codes = [f"R{i:06d}" for i in range(sections)]
+    with sqlite3.connect(database) as db:
+        db.executemany(
+            "INSERT INTO Class (class_code, section_number, term, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username) VALUES (?, '01', 'FA2023', 'Roster', 'Bench', TRUE, ?, ?, 'BenchInstructor')",
+            [(code, enrolled, waitlisted) for code in codes],
+        )
+        db.execute("INSERT INTO Instructor VALUES ('BenchInstructor', 'Bench', 'Instructor')")
+        db.executemany("INSERT INTO Enroll VALUES (?, ?, '01')", [(student, code) for code in codes for student in students[:enrolled]])
+        db.executemany("INSERT INTO Waitlist VALUES (?, ?, '01', '2023-09-15 10:00:00')", [(student, codes[0]) for student in students[enrolled:]])
+        db.executemany("INSERT INTO Dropped VALUES (?, ?, '01')", [(student, codes[0]) for student in students[enrolled:]])
+    db.close()
+    return codes[0]
+
+
+def refresh(client, statements, url, repeat, conditional):
+    etag = client.get(url).headers["etag"]
+    headers = {"If-None-Match": etag} if conditional else {}
+    before = statements.total()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url, headers=headers)
+    elapsed = time.perf_counter() - start
+    return {
+        "status": response.status_code,
+        "ms": elapsed / repeat * 1000,
+        "bytes": len(response.content),
+        "statements": (statements.total() - before) / repeat,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--enrolled", type=int, default=200)
+    parser.add_argument("--waitlisted", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    database = make_database()
+    code = add_roster(database, args.sections, args.enrolled, args.waitlisted)
+    api = load_app(database, metrics=True)
+    statements = api.metrics.request_statements
+
+    endpoints = {
+        "enrollment (task 4)": "/instructor/enrollment/instructor/BenchInstructor",
+        "dropped (task 5)": f"/instructor/dropped/instructor/BenchInstructor/class/{code}/section/01",
+        "waitlist (task 13)": f"/instructor/waitlist_for_class/instructor/BenchInstructor/class/{code}/section/01",
+    }
+    print(f"{'endpoint':<22}{'status':>7}{'ms':>8}{'bytes':>9}{'statements':>12}")
+    with TestClient(api.app) as client:
+        for name, url in endpoints.items():
+            for conditional in (False, True):
+                result = refresh(client, statements, url, args.repeat, conditional)
+                print(f"{name:<22}{result['status']:>7}{result['ms']:>8.3f}{result['bytes']:>9}{result['statements']:>12.1f}")
+
+    api.pool.close()
+    remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Cost of following enrollment changes: one shared event tail against per-client polling.
+
+--subscribers clients follow --sections sections: half are instructor
+dashboards subscribed to a section, half are students subscribed to
+themselves. A writer thread enrolls a new student every 1/--rate seconds for
+--seconds, spread over the sections, while an events.EventHub tails the
+Event table and fans the changes out to the subscribers' queues. Reported
+are the hub's tail reads, the deliveries and the delay from commit to a
+subscriber's queue.
+
+For comparison, polling is measured rather than run: the time of the
+statements behind tasks 4 and 11 is taken on the same data, and multiplied
+by the number of polls the same clients would make at --poll-interval.
+
+Usage (from within the api folder):
+    python bench/bench_events.py [--subscribers 5000] [--sections 50] [--rate 500] [--seconds 5] [--poll-interval 1]
+"""
+import argparse
+import asyncio
+import sqlite3
+import threading
+import time
+
+from common import add_students, make_database, remove_database, summarize
+
+import enrollment
+import pool
+import queries
+from events import EventHub
+
+
+def add_sections(database, count):
+    sections = [(f"E{i:06d}", "01") for i in range(count)]
+    with sqlite3.connect(database) as db:
+        db.executemany(
+            "INSERT INTO Class (class_code, section_number, term, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username) VALUES (?, ?, 'FA2023', 'Events', 'Bench', TRUE, 100000, 15, 'IreneDoe100')",
+            sections,
+        )
+    db.close()
+    return sections
+
+
+def write_loop(database, students, sections, rate, committed):
+    """Enroll each student in turn, paced at `rate` per second; records the commit time per student."""
+    db = pool.connect(database)
+    start = time.perf_counter()
+    for i, student in enumerate(students):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        class_code, section_number = sections[i % len(sections)]
+        enrollment.enroll(db, student, class_code, section_number)
+        committed[student] = time.perf_counter()
+    db.close()
+
+
+async def follow(database, students, sections, subscribers, rate, poll_interval):
+    db = pool.connect(database, read_only=True)
+    read_lock = threading.Lock()
+    read_seconds = [0.0]
+
+    def run(fn, *args):
+        with read_lock:
+            start = time.perf_counter()
+            try:
+                return fn(*args, db=db)
+            finally:
+                read_seconds[0] += time.perf_counter() - start
+
+    async def read(fn, *args):
+        return await asyncio.to_thread(run, fn, *args)
+
+    hub = EventHub(read, poll_interval=poll_interval)
+    subscriptions = []
+    for i in range(subscribers):
+        if i % 2:
+            key = ("section", *sections[i % len(sections)])
+        else:
+            key = ("student", students[i % len(students)])
+        subscriptions.append(await hub.subscribe(key))
+
+    committed = {}
+    received = []
+
+    async def consume(subscription):
+        while True:
+            message = await subscription.queue.get()
+            now = time.perf_counter()
+            student = message.split('"student_username":"', 1)[1].split('"', 1)[0]
+            received.append(now - committed.get(student, now))
+
+    consumers = [asyncio.create_task(consume(subscription)) for subscription in subscriptions]
+    writer = threading.Thread(target=write_loop, args=(database, students, sections, rate, committed))
+    start = time.perf_counter()
+    writer.start()
+    while writer.is_alive():
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    # Let the tail catch up with the last writes
+    await asyncio.sleep(poll_interval * 3)
+
+    for consumer in consumers:
+        consumer.cancel()
+    for subscription in subscriptions:
+        hub.unsubscribe(subscription)
+    await asyncio.sleep(poll_interval * 2)
+    db.close()
+    return elapsed, hub.stats(), read_seconds[0], received
+
+
+def time_polls(database, students, sections, samples=2000):
+    """Mean seconds of one dashboard poll (task 4) and one student poll (task 11)."""
+    db = pool.connect(database)
+    start = time.perf_counter()
+    for i in range(samples):
+        db.execute(queries.INSTRUCTOR_ENROLLMENT, ("IreneDoe100", "", "", "", 100)).fetchall()
+    dashboard = (time.perf_counter() - start) / samples
+
+    start = time.perf_counter()
+    for i in range(samples):
+        class_code, section_number = sections[i % len(sections)]
+        db.execute(queries.WAITLIST_POSITION, {"student_username": students[i % len(students)], "class_code": class_code, "section_number": section_number}).fetchone()
+    student = (time.perf_counter() - start) / samples
+    db.close()
+    return dashboard, student
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--sections", type=int, default=50)
+    parser.add_argument("--rate", type=int, default=500, help="enrollments per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between polls, and between tail reads")
+    args = parser.parse_args()
+
+    database = make_database()
+    students = add_students(database, int(args.rate * args.seconds))
+    sections = add_sections(database, args.sections)
+
+    elapsed, stats, tail_seconds, received = asyncio.run(follow(database, students, sections, args.subscribers, args.rate, args.poll_interval))
+    latency = summarize(received)
+
+    dashboard, student = time_polls(database, students, sections)
+    # Over the time the tail ran, i.e. including the catch-up after the last write
+    polls = args.subscribers * (elapsed + args.poll_interval * 3) / args.poll_interval
+    poll_seconds = polls / 2 * (dashboard + student)
+
+    print(f"{len(students)} enrollments over {elapsed:.1f} s, {args.subscribers} subscribers on {args.sections} sections")
+    print(f"{'':>8}{'statements':>12}{'db seconds':>12}{'deliveries':>12}{'p50 ms':>9}{'p99 ms':>9}")
+    print(f"{'tail':>8}{stats['reads']:>12}{tail_seconds:>12.2f}{stats['delivered']:>12}{latency['p50_ms']:>9.1f}{latency['p99_ms']:>9.1f}")
+    print(f"{'polling':>8}{polls:>12.0f}{poll_seconds:>12.2f}{'':>12}{args.poll_interval * 500:>9.1f}{args.poll_interval * 990:>9.1f}")
+    print("(polling delays are those of a uniformly timed change against the interval)")
+    remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
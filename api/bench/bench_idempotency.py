@@ -0,0 +1,99 @@
+"""Write load of a retry storm on enroll, with and without Idempotency-Key.
+
+Every student enrolls once, but the client "times out" and retries: a burst
+of --burst identical requests go out at the same time, followed by --late
+retries after the burst has been answered. Without a key every copy runs the
+whole check-and-insert sequence and the retries get 409 "already enrolled";
+with one the burst is coalesced onto a single execution and the late
+retries replay the stored 200.
+
+Statements and transactions (COMMIT plus ROLLBACK, i.e. write lock
+acquisitions in sync mode) are counted by the app's metrics and include the
+idempotency table's own claim and store. In async mode COMMIT counts the
+writer's groups and ROLLBACK the operations rolled back to their savepoint.
+
+Usage (from within the api folder):
+    python bench/bench_idempotency.py [--students 500] [--burst 4] [--late 4] [--async]
+"""
+import argparse
+import asyncio
+import collections
+import sqlite3
+import time
+
+from common import add_students, load_app, make_database, remove_database
+
+import httpx
+
+
+async def storm(app, students, burst, late, keyed):
+    statuses = collections.Counter()
+
+    async def student_loop(client, student):
+        url = f"/student/enroll_in_class/student/{student}/class/CPSC449/section/01"
+        headers = {"Idempotency-Key": f"enroll-{student}"} if keyed else {}
+        responses = await asyncio.gather(*(client.post(url, headers=headers) for _ in range(burst)))
+        for _ in range(late):
+            responses.append(await client.post(url, headers=headers))
+        for response in responses:
+            statuses[response.status_code] += 1
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        # 16 students at a time, each with its own burst
+        for i in range(0, len(students), 16):
+            await asyncio.gather(*(student_loop(client, student) for student in students[i:i + 16]))
+        elapsed = time.perf_counter() - start
+
+    return elapsed, statuses
+
+
+def bench(students, burst, late, keyed, async_mode):
+    database = make_database()
+    usernames = add_students(database, students)
+    with sqlite3.connect(database) as db:
+        db.execute("UPDATE Class SET max_enrollment=? WHERE class_code='CPSC449' AND section_number='01'", (students * 2,))
+    db.close()
+
+    api = load_app(database, async_mode=async_mode, metrics=True)
+    elapsed, statuses = asyncio.run(storm(api.app, usernames, burst, late, keyed))
+    statements = api.metrics.statements
+    result = {
+        "elapsed": elapsed,
+        "statuses": statuses,
+        "statements": statements.count(),
+        "transactions": statements.count("COMMIT") + statements.count("ROLLBACK"),
+        "executed": api.idempotency_store.executed if keyed else sum(statuses.values()),
+    }
+
+    if api.writer is not None:
+        api.writer.close()
+    if api.pool is not None:
+        api.pool.close()
+    remove_database(database)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--burst", type=int, default=4)
+    parser.add_argument("--late", type=int, default=4)
+    parser.add_argument("--async", dest="async_mode", action="store_true", help="run the api in async mode")
+    args = parser.parse_args()
+
+    requests = args.students * (args.burst + args.late)
+    print(f"{requests} enroll requests for {args.students} students")
+    print(f"{'key':>5}{'seconds':>9}{'200':>7}{'409':>7}{'handler runs':>14}{'statements':>12}{'transactions':>14}")
+    for keyed in (False, True):
+        result = bench(args.students, args.burst, args.late, keyed, args.async_mode)
+        print(
+            f"{'yes' if keyed else 'no':>5}{result['elapsed']:>9.2f}"
+            f"{result['statuses'][200]:>7}{result['statuses'][409]:>7}"
+            f"{result['executed']:>14}{result['statements']:>12}{result['transactions']:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
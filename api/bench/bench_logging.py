@@ -0,0 +1,96 @@
+"""Request latency with the default synchronous logging vs the queue-based preset.
+
+Loads the app once per logging config, adds an access-log line per request
+(as a reverse proxy or uvicorn's access log would produce) and times a
+high-rate read endpoint. Log files go to a temporary folder and the console
+handler's output is discarded, so only the cost on the request thread is
+measured.
+
+Usage (from within the api folder):
+    python bench/bench_logging.py [--requests 5000] [--concurrency 8]
+"""
+import argparse
+import contextlib
+import logging
+import os
+import re
+import tempfile
+
+from common import API_DIR, load_app, make_database, remove_database, run_concurrent, summarize
+
+from fastapi.testclient import TestClient
+
+CONFIGS = {
+    "sync": os.path.join(API_DIR, "etc", "logging.ini"),
+    "queue": os.path.join(API_DIR, "etc", "logging.production.ini"),
+}
+
+ENDPOINT = "/student/available_classes?limit=50"
+
+
+@contextlib.contextmanager
+def discard_stderr():
+    """Point file descriptor 2 at /dev/null; StreamHandler(sys.stderr) still writes to it."""
+    saved = os.dup(2)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 2)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 2)
+        os.close(saved)
+
+
+def relocate_log(config, log_dir):
+    """A copy of `config` that writes its log file into `log_dir`."""
+    with open(config) as f:
+        text = f.read()
+    text = re.sub(r"^filename = .*$", f"filename = {os.path.join(log_dir, 'api.log')!r}", text, flags=re.M)
+    path = os.path.join(log_dir, os.path.basename(config))
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+
+def measure(database, config, requests, concurrency):
+    api = load_app(database, log_level=None, logging_config=config)
+    logger = api.get_logger()
+
+    @api.app.middleware("http")
+    async def access_log(request, call_next):
+        response = await call_next(request)
+        logger.info('"%s %s" %s', request.method, request.url.path, response.status_code)
+        return response
+
+    with TestClient(api.app) as client:
+        # Warm up the pool and the query plans
+        for _ in range(100):
+            client.get(ENDPOINT)
+        throughput, latencies = run_concurrent(lambda _: client.get(ENDPOINT), range(requests), concurrency)
+
+    queued = [h.stats() for h in logging.getLogger().handlers if hasattr(h, "stats")]
+    return throughput, summarize(latencies), sum(s["dropped"] for s in queued)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    database = make_database()
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir, discard_stderr():
+        for mode, config in CONFIGS.items():
+            results[mode] = measure(database, relocate_log(config, log_dir), args.requests, args.concurrency)
+        # Stop the listener thread before its log folder disappears
+        logging.shutdown()
+    remove_database(database)
+
+    print(f"{'logging':<8}{'req/s':>9}{'mean ms':>9}{'p50 ms':>9}{'p99 ms':>9}{'dropped':>9}")
+    for mode, (throughput, summary, dropped) in results.items():
+        print(f"{mode:<8}{throughput:>9.1f}{summary['mean_ms']:>9.2f}{summary['p50_ms']:>9.2f}{summary['p99_ms']:>9.2f}{dropped:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Lottery allocation of a registration window's requests, against enrolling them one by one.
+
+--sections sections (20-60 seats, waitlists of 15) in a term in its lottery
+window receive --requests requests from --requests / 4 students, four each,
+ranking 1-3 alternative sections drawn with a skew so that popular sections
+are oversubscribed. lottery.allocate then assigns all of them in one
+transaction, twice per seed on fresh copies to check that the result is
+deterministic. "one by one" runs enrollment.enroll for the first choice of
+every request in the same (shuffled) order, one transaction each, as the
+live endpoint would outside a window.
+
+Usage (from within the api folder):
+    python bench/bench_lottery.py [--sections 5000] [--requests 100000] [--seeds 449,450]
+"""
+import argparse
+import hashlib
+import random
+import shutil
+import sqlite3
+import time
+
+from common import add_students, make_database, remove_database
+
+import enrollment
+import lottery
+import pool
+
+
+def make_window(sections, requests, seed=0):
+    rng = random.Random(seed)
+    database = make_database()
+    students = add_students(database, requests // 4)
+    codes = [f"L{i:06d}" for i in range(sections)]
+    with sqlite3.connect(database) as db:
+        db.executemany(
+            "INSERT INTO Class (class_code, section_number, term, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username) VALUES (?, '01', 'FA2023', 'Lottery', 'Bench', TRUE, ?, 15, 'IreneDoe100')",
+            [(code, rng.randint(20, 60)) for code in codes],
+        )
+        rows = []
+        for student in students:
+            for number in range(1, 5):
+                # Popular sections (low indexes) are drawn far more often
+                picks = {codes[min(int(rng.paretovariate(1.2)) - 1, sections - 1) if rng.random() < 0.5 else rng.randrange(sections)] for _ in range(rng.randint(1, 3))}
+                rows += [(student, number, choice, code, "01") for choice, code in enumerate(sorted(picks), 1)]
+        db.executemany("INSERT INTO EnrollmentRequest (r_student_username, request_number, choice, r_class_code, r_section_number) VALUES (?, ?, ?, ?, ?)", rows)
+        db.execute("UPDATE Term SET lottery=TRUE WHERE term='FA2023'")
+    db.close()
+    return database, len(rows)
+
+
+def copy_database(database):
+    copy = make_database()
+    remove_database(copy)
+    shutil.copy(database, copy)
+    return copy
+
+
+def digest(database):
+    """A hash of every request outcome and enrollment, to compare runs."""
+    db = sqlite3.connect(database)
+    sha = hashlib.sha256()
+    for row in db.execute("SELECT * FROM EnrollmentRequest ORDER BY 1, 2, 3"):
+        sha.update(repr(row).encode())
+    for row in db.execute("SELECT w_student_username, w_class_code FROM Waitlist ORDER BY timestamp, w_student_username"):
+        sha.update(repr(row).encode())
+    db.close()
+    return sha.hexdigest()[:12]
+
+
+def one_by_one(database, seed):
+    db = pool.connect(database)
+    rows = db.execute("SELECT r_student_username, r_class_code, r_section_number FROM EnrollmentRequest WHERE choice=1").fetchall()
+    db.execute("UPDATE Term SET lottery=FALSE")
+    db.commit()
+    rows = [tuple(row) for row in rows]
+    random.Random(seed).shuffle(rows)
+    start = time.perf_counter()
+    for row in rows:
+        enrollment.enroll(db, *row)
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--seeds", default="449,450")
+    args = parser.parse_args()
+
+    database, alternatives = make_window(args.sections, args.requests)
+    print(f"{args.requests} requests ({alternatives} ranked alternatives) over {args.sections} sections")
+    print(f"{'seed':>6}{'run':>5}{'seconds':>9}{'enrolled':>10}{'waitlisted':>12}{'full':>8}{'over_limit':>12}  digest")
+    for seed in map(int, args.seeds.split(",")):
+        for run in (1, 2):
+            copy = copy_database(database)
+            db = pool.connect(copy)
+            summary = lottery.allocate(db, "FA2023", seed)
+            db.close()
+            outcomes = summary["outcomes"]
+            print(
+                f"{seed:>6}{run:>5}{summary['elapsed_seconds']:>9.2f}{outcomes.get('enrolled', 0):>10}"
+                f"{outcomes.get('waitlisted', 0):>12}{outcomes.get('full', 0):>8}{outcomes.get('over_limit', 0):>12}  {digest(copy)}"
+            )
+            remove_database(copy)
+
+    copy = copy_database(database)
+    elapsed = one_by_one(copy, 449)
+    print(f"one by one (first choices only): {elapsed:.2f} s, {args.requests / elapsed:.0f} requests/s")
+    remove_database(copy)
+    remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare requests/sec with and without the connection pool.
+
+Usage (from within the api folder):
+    python bench/bench_pool.py [--requests 2000] [--concurrency 8]
+"""
+import argparse
+
+from common import add_students, load_app, make_database, remove_database, run_concurrent
+
+from fastapi.testclient import TestClient
+
+
+def bench(pool_size, requests, concurrency):
+    database = make_database()
+    students = add_students(database, requests)
+    api = load_app(database, pool_size=pool_size)
+
+    # Make room for every enrollment so each request takes the insert path
+    with __import__("sqlite3").connect(database) as db:
+        db.execute("UPDATE Class SET max_enrollment=? WHERE class_code='CPSC449' AND section_number='01'", (requests + 100,))
+
+    results = {}
+    with TestClient(api.app) as client:
+        def available(_):
+            assert client.get("/student/available_classes").status_code == 200
+
+        def enroll(student):
+            response = client.post(f"/student/enroll_in_class/student/{student}/class/CPSC449/section/01")
+            assert response.status_code == 200, response.text
+
+        results["available_classes"], _ = run_concurrent(available, range(requests), concurrency)
+        results["enroll"], _ = run_concurrent(enroll, students, concurrency)
+
+    if api.pool is not None:
+        api.pool.close()
+    remove_database(database)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    without_pool = bench(0, args.requests, args.concurrency)
+    with_pool = bench(args.concurrency, args.requests, args.concurrency)
+
+    print(f"{'endpoint':<20}{'no pool (req/s)':>18}{'pool (req/s)':>16}{'speedup':>10}")
+    for endpoint in without_pool:
+        before, after = without_pool[endpoint], with_pool[endpoint]
+        print(f"{endpoint:<20}{before:>18.1f}{after:>16.1f}{after / before:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Write latency under a mixed read/write load, with and without the read replica.
+
+Generates a catalog of --sections sections with datagen.py. --writers
+threads then enroll fresh students in a section and drop them again, while
+--readers threads keep reading the heavy endpoints (the whole waitlist and
+class list streamed, and instructor rosters). Writes are timed in three
+runs: without readers, with the readers on the live database, and with them
+on a replica published every --interval seconds. Requests go through the
+whole app in-process.
+
+Usage (from within the api folder):
+    python bench/bench_replica.py [--sections 5000] [--writes 2000] [--writers 4] [--readers 8] [--interval 1.0]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+
+from common import add_students, load_app, remove_database, run_concurrent, summarize
+
+import datagen
+
+from fastapi.testclient import TestClient
+
+READS = [
+    "/waitlist?stream=true",
+    "/all_classes?stream=true",
+    "/student/available_classes?limit=1000",
+    "/instructor/enrollment/instructor/{instructor}",
+]
+
+
+def prepare(database, sections, students, writes):
+    datagen.generate(database, students=students, sections=sections)
+    writers = add_students(database, writes, prefix="ReplicaWriter")
+    with sqlite3.connect(database) as db:
+        db.execute(
+            "INSERT INTO Class (class_code, section_number, term, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username) "
+            "SELECT 'BENCH1', '01', 'FA2023', 'Replica', 'Bench', TRUE, ?, 0, c_instructor_username FROM Class LIMIT 1",
+            (writes + 100,),
+        )
+        instructors = [row[0] for row in db.execute("SELECT DISTINCT c_instructor_username FROM Class LIMIT 50")]
+    db.close()
+    return writers, instructors
+
+
+def run(database, writers, instructors, args, readers, replica_path=None):
+    settings = {}
+    if replica_path is not None:
+        settings = {"replica_database": replica_path, "replica_interval": args.interval}
+    api = load_app(database, **settings)
+
+    stop = threading.Event()
+    reads = [0]
+
+    def read_loop(client, n):
+        i = n
+        while not stop.is_set():
+            url = READS[i % len(READS)].format(instructor=instructors[i % len(instructors)])
+            client.get(url).raise_for_status()
+            reads[0] += 1
+            i += 1
+
+    def write(student):
+        client.post(f"/student/enroll_in_class/student/{student}/class/BENCH1/section/01").raise_for_status()
+        client.delete(f"/student/drop_class/student/{student}/class/BENCH1/section/01").raise_for_status()
+
+    lag, published = 0.0, 0
+    with TestClient(api.app) as client:
+        threads = [threading.Thread(target=read_loop, args=(client, n)) for n in range(readers)]
+        for thread in threads:
+            thread.start()
+        throughput, latencies = run_concurrent(write, writers, args.writers)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if api.replica is not None:
+            lag = api.replica.lag()
+            published = api.replica.published
+
+    api.pool.close()
+    if api.replica is not None:
+        api.replica_pool.close()
+        api.replica.close()
+
+    result = summarize(latencies)
+    result["writes_per_s"] = throughput
+    result["reads"] = reads[0]
+    result["published"] = published
+    result["lag_s"] = lag
+
+    # Re-enrolling needs the Dropped rows gone
+    with sqlite3.connect(database) as db:
+        db.execute("DELETE FROM Dropped WHERE d_class_code='BENCH1'")
+    db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=5000)
+    parser.add_argument("--students", type=int, default=50000)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, "replica-bench.db")
+    replica_path = os.path.join(directory, "replica.db")
+    writers, instructors = prepare(database, args.sections, args.students, args.writes)
+
+    print(f"{args.writes} enroll+drop pairs from {args.writers} writers, {args.readers} readers, {args.sections} sections")
+    print(f"{'readers on':<12}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'reads':>8}{'copies':>8}{'lag s':>7}")
+    for name, readers, path in (("(none)", 0, None), ("live", args.readers, None), ("replica", args.readers, replica_path)):
+        result = run(database, writers, instructors, args, readers, path)
+        print(
+            f"{name:<12}{result['writes_per_s']:>10.1f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+            f"{result['reads']:>8}{result['published']:>8}{result['lag_s']:>7.2f}"
+        )
+
+    remove_database(database)
+    remove_database(replica_path)
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
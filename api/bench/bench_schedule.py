@@ -0,0 +1,116 @@
+"""Schedule conflict check: the indexed SQL overlap query against a nested loop.
+
+For every combination of enrolled sections per student and meeting blocks
+per section, one student is enrolled in that many sections and a candidate
+section with the same number of blocks is checked for conflicts. The blocks
+interleave without overlapping, so neither approach can stop early:
+
+    sql        schedule.conflict, one statement seeking Meeting_section
+    loop       fetch both schedules and compare every pair of blocks in Python
+
+Usage (from within the api folder):
+    python bench/bench_schedule.py [--sections 4,16,64] [--blocks 2,8,32] [--checks 200]
+"""
+import argparse
+import math
+import sqlite3
+import time
+
+from common import add_students, make_database, remove_database
+
+import pool
+import schedule
+
+ENROLLED_BLOCKS = """
+    SELECT day, start_minute, end_minute
+    FROM Enroll, Meeting
+    WHERE e_student_username=?
+    AND m_class_code=e_class_code
+    AND m_section_number=e_section_number
+"""
+
+SECTION_BLOCKS = """
+    SELECT day, start_minute, end_minute
+    FROM Meeting
+    WHERE m_class_code=? AND m_section_number=?
+"""
+
+
+def loop_conflict(db, student_username, class_code, section_number):
+    enrolled = db.execute(ENROLLED_BLOCKS, (student_username,)).fetchall()
+    for day, start, end in db.execute(SECTION_BLOCKS, (class_code, section_number)).fetchall():
+        for other_day, other_start, other_end in enrolled:
+            if day == other_day and other_start < end and other_end > start:
+                return True
+    return False
+
+
+def build(database, student, sections, blocks):
+    """Enroll `student` in `sections` sections of `blocks` blocks each; return the candidate section."""
+    # Every enrolled block gets its own slot in the week; the candidate's
+    # blocks sit in the second half of a slot, right after an enrolled block
+    slots_per_day = math.ceil(sections * blocks / 7)
+    width = 1440 // slots_per_day
+    if width < 2:
+        raise SystemExit(f"{sections} sections x {blocks} blocks do not fit in a week")
+
+    def slot(i):
+        return i % 7, (i // 7) * width
+
+    with sqlite3.connect(database) as db:
+        for s in range(sections + 1):
+            code = "SCH" + f"{s:04d}"
+            db.execute(
+                "INSERT INTO Class (class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username, term)"
+                " VALUES (?, '01', 'Bench', 'Bench', 1, 10, 5, 'IreneDoe100', 'FA2023')",
+                (code,),
+            )
+            rows = []
+            for b in range(blocks):
+                if s < sections:
+                    day, start = slot(s * blocks + b)
+                    rows.append((code, "01", day, start, start + width // 2))
+                else:
+                    # Spread over the enrolled slots so every day has work to do
+                    day, start = slot(b * sections)
+                    rows.append((code, "01", day, start + width // 2, start + width))
+            db.executemany("INSERT INTO Meeting VALUES (?, ?, ?, ?, ?)", rows)
+            if s < sections:
+                db.execute("INSERT INTO Enroll VALUES (?, ?, ?)", (student, code, "01"))
+    db.close()
+    return "SCH" + f"{sections:04d}", "01"
+
+
+def time_checks(check, db, student, candidate, checks):
+    start = time.perf_counter()
+    for _ in range(checks):
+        if check(db, student, *candidate):
+            raise SystemExit("benchmark layout overlaps")
+    return (time.perf_counter() - start) / checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default="4,16,64")
+    parser.add_argument("--blocks", default="2,8,32")
+    parser.add_argument("--checks", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'sections':>8}{'blocks':>8}{'sql us':>10}{'loop us':>10}")
+    for sections in map(int, args.sections.split(",")):
+        for blocks in map(int, args.blocks.split(",")):
+            database = make_database()
+            student, = add_students(database, 1)
+            candidate = build(database, student, sections, blocks)
+
+            db = pool.connect(database)
+            sql = time_checks(schedule.conflict, db, student, candidate, args.checks)
+            loop = time_checks(loop_conflict, db, student, candidate, args.checks)
+            db.close()
+            remove_database(database)
+
+            print(f"{sections:>8}{blocks:>8}{sql * 1e6:>10.1f}{loop * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Catalog search latency: the ClassSearch FTS5 index against a LIKE '%...%' scan.
+
+Generates a catalog of --sections sections with datagen.py and runs a mix
+of type-ahead queries (partial words, several words, instructor names)
+--repeat times each through search.search, and through the same search
+written as LIKE '%word%' over the class code, name, department and
+instructor names, which has to read every section. Both return the first
+20 matches; "open" adds the open-seats filter.
+
+Usage (from within the api folder):
+    python bench/bench_search.py [--sections 50000] [--repeat 20]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import percentile, remove_database
+
+import datagen
+import pool
+import search
+
+QUERIES = ["cp", "cps", "cpsc1", "data", "intro", "intro comp", "smith", "sys", "adv phys", "quinn", "econ meth", "hist120"]
+
+LIKE_SQL = """
+    SELECT class_code, section_number, class_name, department, i_first_name, i_last_name,
+        max_enrollment - current_enrollment AS open_seats
+    FROM Class
+    LEFT JOIN Instructor ON instructor_username=c_instructor_username
+    WHERE {words}
+    AND (NOT :open_only OR current_enrollment < max_enrollment)
+    ORDER BY class_code, section_number
+    LIMIT 20
+"""
+
+LIKE_WORD = "(class_code LIKE :w{i} OR class_name LIKE :w{i} OR department LIKE :w{i} OR i_first_name LIKE :w{i} OR i_last_name LIKE :w{i})"
+
+
+def like_search(db, text, open_only):
+    words = search.WORD.findall(text)
+    sql = LIKE_SQL.format(words=" AND ".join(LIKE_WORD.format(i=i) for i in range(len(words))))
+    params = {f"w{i}": f"%{word}%" for i, word in enumerate(words)}
+    return db.execute(sql, dict(params, open_only=open_only)).fetchall()
+
+
+def fts_search(db, text, open_only):
+    return search.search(db, text, open_only, 20)
+
+
+def run(db, fn, open_only, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for text in QUERIES:
+            start = time.perf_counter()
+            fn(db, text, open_only)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=50000)
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(), "search.db")
+    datagen.generate(database, students=args.students, sections=args.sections)
+    db = pool.connect(database, read_only=True)
+
+    print(f"{args.sections} sections, {len(QUERIES) * args.repeat} queries per row")
+    print(f"{'search':>8}{'open':>6}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, fn in (("like", like_search), ("fts5", fts_search)):
+        for open_only in (False, True):
+            latencies = run(db, fn, open_only, args.repeat)
+            print(f"{name:>8}{'yes' if open_only else 'no':>6}{percentile(latencies, 50) * 1000:>9.2f}{percentile(latencies, 99) * 1000:>9.2f}")
+
+    db.close()
+    remove_database(database)
+    os.rmdir(os.path.dirname(database))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Time to turn 10k Class rows into a JSON response body, per serialization path.
+
+"encoder" is FastAPI's default path: sqlite3.Row objects through
+jsonable_encoder and JSONResponse. "rows" fetches plain tuples with
+serialize.fetch and renders them with RowsResponse, using orjson when it is
+installed; "rows (stdlib)" forces the json module fallback.
+
+Usage (from within the api folder):
+    python bench/bench_serialize.py [--rows 10000] [--repeat 20]
+"""
+import argparse
+import json
+import sqlite3
+import statistics
+import time
+
+from common import make_database, remove_database
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import serialize
+
+SQL = "SELECT * FROM Class ORDER BY class_code, section_number LIMIT ?"
+
+
+def add_sections(database, count):
+    with sqlite3.connect(database) as db:
+        db.executemany(
+            "INSERT INTO Class (class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username, term) VALUES (?, ?, ?, ?, TRUE, 30, 15, 'IreneDoe100', 'FA2023')",
+            [(f"B{i:06d}", "01", f"Bench Class {i}", "Bench") for i in range(count)],
+        )
+    db.close()
+
+
+def encoder_path(db, limit):
+    classes = db.execute(SQL, (limit,)).fetchall()
+    return JSONResponse(jsonable_encoder({"classes": classes, "next": None})).body
+
+
+def rows_path(db, limit):
+    classes = serialize.fetch(db, SQL, (limit,))
+    return serialize.RowsResponse({"classes": classes, "next": None}).body
+
+
+def stdlib_path(db, limit):
+    classes = serialize.fetch(db, SQL, (limit,))
+    return json.dumps({"classes": classes, "next": None}, default=serialize._default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    database = make_database()
+    add_sections(database, args.rows)
+    db = sqlite3.connect(database)
+    db.row_factory = sqlite3.Row
+
+    paths = {"encoder": encoder_path, "rows": rows_path, "rows (stdlib)": stdlib_path}
+    bodies = {name: json.loads(path(db, args.rows)) for name, path in paths.items()}
+    assert all(body == bodies["encoder"] for body in bodies.values()), "serialization paths disagree"
+    row_count = len(bodies["encoder"]["classes"])
+
+    print(f"{'path':<16}{'ms per 10k rows':>16}")
+    for name, path in paths.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            path(db, args.rows)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<16}{statistics.median(timings) * 1000 * 10000 / row_count:>16.2f}")
+    print(f"orjson installed: {serialize.orjson is not None}")
+
+    db.close()
+    remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
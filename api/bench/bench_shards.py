@@ -0,0 +1,126 @@
+"""Enrollment write throughput on 1, 4 and 8 shards under concurrent load.
+
+--sections new sections are added to the sample database, with seats for
+about 70% of the --processes x --enrolls attempts and room on every
+waitlist, then the database is split with sharding.split. Each process
+stands in for an api worker: it builds its own ShardRouter and runs
+enrollment.enroll for random (student, section) pairs as fast as it can.
+Processes rather than threads, so that what limits throughput is the SQLite
+write locks rather than the GIL. Writers on different shards take different
+locks; waitlist joins in every shard still take the directory's lock for
+the cross-shard waitlist limit, which the run checks afterwards.
+
+Usage (from within the api folder):
+    python bench/bench_shards.py [--shards 1 4 8] [--processes 8] [--enrolls 2000] [--sections 400]
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common import add_students, make_database, percentile, remove_database
+
+import enrollment
+import sharding
+
+
+def prepare(processes, enrolls, sections):
+    database = make_database()
+    students = add_students(database, processes * enrolls // 8, prefix="ShardStudent")
+    codes = [f"S{i:05d}" for i in range(sections)]
+    seats = max(1, int(processes * enrolls * 0.7 / sections))
+    with sqlite3.connect(database) as db:
+        db.executemany(
+            "INSERT INTO Class (class_code, section_number, term, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username) VALUES (?, '01', 'FA2023', 'Shard', 'Bench', TRUE, ?, 1000, 'IreneDoe100')",
+            [(code, seats) for code in codes],
+        )
+    db.close()
+    return database, students, codes
+
+
+def worker(directory, databases, pairs, start, results):
+    router = sharding.ShardRouter(directory, databases, size=1, overflow=0)
+    latencies = []
+    outcomes = collections.Counter()
+    start.wait()
+    for student, code in pairs:
+        began = time.perf_counter()
+        with router.connection(code) as db:
+            outcome = enrollment.enroll(db, student, code, "01", shards=router)
+        latencies.append(time.perf_counter() - began)
+        outcomes[outcome.value] += 1
+    router.close()
+    results.put((latencies, outcomes))
+
+
+def run(database, students, codes, count, args):
+    folder = tempfile.mkdtemp()
+    directory = os.path.join(folder, "directory.db")
+    databases = [os.path.join(folder, f"shard{i}.db") for i in range(count)]
+    sharding.split(database, directory, databases)
+
+    # Every student is driven by one process, as a browser session would be
+    rng = random.Random(0)
+    chunks = [students[p::args.processes] for p in range(args.processes)]
+    work = [[(rng.choice(chunk), rng.choice(codes)) for _ in range(args.enrolls)] for chunk in chunks]
+
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(directory, databases, pairs, start, results)) for pairs in work]
+    for process in processes:
+        process.start()
+    time.sleep(0.5)
+    began = time.perf_counter()
+    start.set()
+    collected = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join()
+
+    latencies = [latency for latency_list, _ in collected for latency in latency_list]
+    outcomes = sum((outcome for _, outcome in collected), collections.Counter())
+
+    router = sharding.ShardRouter(directory, databases, size=1)
+    with router.connection() as db:
+        most_waitlists = db.execute("SELECT max(num_waitlist) FROM Student").fetchone()[0]
+    router.close()
+    for path in [directory, *databases]:
+        remove_database(path)
+    os.rmdir(folder)
+
+    return {
+        "per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "outcomes": outcomes,
+        "most_waitlists": most_waitlists,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--enrolls", type=int, default=2000, help="attempts per process")
+    parser.add_argument("--sections", type=int, default=400)
+    args = parser.parse_args()
+
+    database, students, codes = prepare(args.processes, args.enrolls, args.sections)
+    print(f"{args.processes} processes x {args.enrolls} enrollment attempts over {args.sections} sections")
+    print(f"{'shards':>6}{'enrolls/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'enrolled':>10}{'waitlisted':>12}{'over_limit':>12}{'max waitlists':>15}")
+    for count in args.shards:
+        result = run(database, students, codes, count, args)
+        outcomes = result["outcomes"]
+        print(
+            f"{count:>6}{result['per_s']:>11.0f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+            f"{outcomes['enrolled']:>10}{outcomes['waitlisted']:>12}{outcomes['over_limit']:>12}{result['most_waitlists']:>15}"
+        )
+    remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
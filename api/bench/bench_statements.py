@@ -0,0 +1,73 @@
+"""Per-statement prepare overhead, with and without the statement cache warm-up.
+
+Runs every read statement in the queries.py registry (with the same zero
+parameters warm_up uses, so the execution itself is trivial) for a number of
+rounds on a fresh connection per configuration:
+
+    cold       default cache, no warm-up: the first round prepares everything
+    thrashing  a cache smaller than the registry: every round re-prepares
+    warmed     the api's settings: the cache is filled when the connection opens
+
+Usage (from within the api folder):
+    python bench/bench_statements.py [--rounds 200]
+"""
+import argparse
+import time
+
+from common import make_database, remove_database
+
+import pool
+import queries
+
+CONFIGS = {
+    "cold": {"cached_statements": 128, "prepare": ()},
+    "thrashing": {"cached_statements": 8, "prepare": ()},
+    "warmed": {"cached_statements": 256, "prepare": queries.reads()},
+}
+
+
+def run_statements(db, statements):
+    """Seconds taken by each statement."""
+    timings = []
+    for sql in statements:
+        names = queries.NAMED_PARAM.findall(sql)
+        params = dict.fromkeys(names, 0) if names else (0,) * sql.count("?")
+        start = time.perf_counter()
+        db.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    database = make_database()
+    # Statements without parameters would run in full; warm_up skips them too
+    statements = [sql for sql in queries.reads() if "?" in sql or queries.NAMED_PARAM.search(sql)]
+
+    print(f"{len(statements)} read statements, {args.rounds} rounds")
+    print(f"{'config':<11}{'open ms':>9}{'first us':>10}{'later us':>10}")
+    for name, config in CONFIGS.items():
+        start = time.perf_counter()
+        db = pool.connect(database, **config)
+        opened = time.perf_counter() - start
+
+        first = run_statements(db, statements)
+        later = []
+        for _ in range(args.rounds - 1):
+            later.extend(run_statements(db, statements))
+        db.close()
+
+        print(
+            f"{name:<11}{opened * 1000:>9.2f}"
+            f"{sum(first) / len(first) * 1e6:>10.1f}"
+            f"{sum(later) / max(len(later), 1) * 1e6:>10.1f}"
+        )
+
+    remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
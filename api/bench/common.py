@@ -0,0 +1,135 @@
+"""Helpers shared by the benchmark scripts in this folder.
+
+Run the benchmarks from within the `api` folder, e.g. `python bench/bench_pool.py`,
+so the relative paths in `.env` and `etc/logging.ini` resolve.
+"""
+import importlib
+import logging
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA = os.path.join(API_DIR, "share", "projectDatabase.sql")
+
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+
+def make_database(path=None):
+    """Create a fresh copy of the sample database and return its path."""
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.remove(path)
+
+    with open(SCHEMA) as f:
+        script = f.read()
+    with sqlite3.connect(path) as db:
+        db.executescript(script)
+    db.close()
+    return path
+
+
+def remove_database(path):
+    """Delete a database file along with its WAL, shared-memory, catalog invalidation and replica publisher files."""
+    for suffix in ("", "-wal", "-shm", "-journal", "-catalog", "-lock", "-published"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def add_students(database, count, prefix="BenchStudent"):
+    """Insert `count` extra students and return their usernames."""
+    usernames = [f"{prefix}{i}" for i in range(count)]
+    with sqlite3.connect(database) as db:
+        db.executemany(
+            "INSERT INTO Student (s_first_name, s_last_name, student_username) VALUES (?, ?, ?)",
+            [("Bench", str(i), username) for i, username in enumerate(usernames)],
+        )
+    db.close()
+    return usernames
+
+
+def load_app(database, log_level=logging.WARNING, **settings):
+    """Import (or re-import) api.py against `database` with the given settings overrides.
+
+    The root logger is set to `log_level`; pass None to keep the configured level.
+    """
+    os.environ["DATABASE"] = database
+    for key, value in settings.items():
+        os.environ[key.upper()] = str(value)
+
+    if "api" in sys.modules:
+        old = sys.modules["api"]
+        if getattr(old, "pool", None) is not None:
+            old.pool.close()
+        if getattr(old, "writer", None) is not None:
+            old.writer.close()
+        if getattr(old, "router", None) is not None:
+            old.router.close()
+        if getattr(old, "replica", None) is not None:
+            old.replica_pool.close()
+            old.replica.close()
+        module = importlib.reload(old)
+    else:
+        module = importlib.import_module("api")
+
+    # etc/logging.ini logs every TestClient request at DEBUG, which would dominate the timings
+    if log_level is not None:
+        logging.getLogger().setLevel(log_level)
+    return module
+
+
+def run_concurrent(fn, items, concurrency):
+    """Call fn(item) for every item using `concurrency` threads.
+
+    Returns (requests_per_second, latencies_in_seconds).
+    """
+    items = list(items)
+    latencies = []
+    lock = threading.Lock()
+    index = iter(range(len(items)))
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                i = next(index, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            fn(items[i])
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    return len(items) / elapsed, latencies
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
@@ -0,0 +1,197 @@
+"""Deterministic synthetic registration database generator.
+
+Builds a database with the schema from share/projectDatabase.sql (the sample
+rows are discarded) filled with generated students, instructors, sections,
+enrollments, waitlists and drops. The same arguments and seed always produce
+the same database.
+
+Usage (from within the api folder):
+    python bench/datagen.py --output ./var/projectDatabase.db --students 50000 --sections 5000
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import time
+
+from common import SCHEMA
+
+from enrollment import MAX_STUDENT_WAITLISTS
+
+DEPARTMENTS = [
+    ("CPSC", "Computer Science"),
+    ("MATH", "Mathematics"),
+    ("ENGL", "English"),
+    ("PHYS", "Physics"),
+    ("CHEM", "Chemistry"),
+    ("BIOL", "Biology"),
+    ("HIST", "History"),
+    ("ECON", "Economics"),
+    ("PSYC", "Psychology"),
+    ("ARTS", "Art"),
+]
+
+FIRST_NAMES = ["Sam", "Alex", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Avery", "Jamie", "Quinn"]
+LAST_NAMES = ["Doe", "Smith", "Johnson", "Brown", "Wilson", "Davis", "Garcia", "Lee", "Nguyen", "Patel"]
+SUBJECTS = ["Foundations of", "Introduction to", "Topics in", "Advanced", "Seminar in", "Applied"]
+TOPICS = ["Systems", "Theory", "Analysis", "Methods", "Design", "Practice", "Modeling", "Computation"]
+
+TERM_START = datetime.datetime(2023, 9, 1, 8, 0, 0)
+
+
+def generate(
+    output,
+    students=1000,
+    instructors=None,
+    sections=200,
+    sections_per_class=3,
+    min_enrollment=20,
+    max_enrollment=60,
+    max_waitlist=15,
+    fill_ratio=0.85,
+    full_ratio=0.3,
+    waitlist_depth=0.5,
+    drop_ratio=0.05,
+    seed=449,
+):
+    """Write a generated database to `output` and return its row counts.
+
+    fill_ratio: average fraction of seats taken in sections that are not full.
+    full_ratio: fraction of sections that are completely full.
+    waitlist_depth: average fraction of max_waitlist used by full sections.
+    drop_ratio: Dropped rows as a fraction of Enroll rows.
+    """
+    rng = random.Random(seed)
+    instructors = instructors or max(1, sections // 4)
+
+    if os.path.exists(output):
+        os.remove(output)
+    db = sqlite3.connect(output)
+    with open(SCHEMA) as f:
+        db.executescript(f.read())
+    db.execute("PRAGMA journal_mode=OFF")
+    db.execute("PRAGMA synchronous=OFF")
+    # Start from an empty schema; the sample rows would collide with generated ones
+    for table in ("Meeting", "Dropped", "Waitlist", "Enroll", "Class", "Instructor", "Student"):
+        db.execute(f"DELETE FROM {table}")
+
+    student_names = [f"student{i:07d}" for i in range(students)]
+    instructor_names = [f"instructor{i:05d}" for i in range(instructors)]
+
+    # Sections: consecutive sections share a class code
+    section_rows = []
+    for i in range(sections):
+        prefix, department = DEPARTMENTS[(i // sections_per_class) % len(DEPARTMENTS)]
+        number = 100 + (i // sections_per_class) // len(DEPARTMENTS)
+        class_code = f"{prefix}{number}"
+        section_number = f"{i % sections_per_class + 1:02d}"
+        class_name = f"{SUBJECTS[number % len(SUBJECTS)]} {department} {TOPICS[(number // len(SUBJECTS)) % len(TOPICS)]}"
+        section_rows.append([
+            class_code,
+            section_number,
+            class_name,
+            department,
+            True,
+            rng.randint(min_enrollment, max_enrollment),
+            max_waitlist,
+            rng.choice(instructor_names),
+            0,
+            0,
+        ])
+
+    # Enrollments, then waitlists for the full sections, with the counters kept in Python
+    enroll_rows = []
+    waitlist_rows = []
+    student_waitlists = [0] * students
+    for section in section_rows:
+        class_code, section_number, capacity = section[0], section[1], section[5]
+        if rng.random() < full_ratio:
+            taken = capacity
+        else:
+            taken = min(capacity - 1, max(0, round(rng.gauss(fill_ratio, 0.1) * capacity)))
+        taken = min(taken, students)
+        enrolled = rng.sample(range(students), taken)
+        enroll_rows.extend((student_names[s], class_code, section_number) for s in enrolled)
+        section[8] = taken
+
+        if taken == capacity and max_waitlist:
+            depth = min(max_waitlist, max(0, round(rng.gauss(waitlist_depth, 0.2) * max_waitlist)))
+            enrolled = set(enrolled)
+            attempts = 0
+            waitlisted = set()
+            while len(waitlisted) < depth and attempts < depth * 10:
+                attempts += 1
+                s = rng.randrange(students)
+                if s in enrolled or s in waitlisted or student_waitlists[s] >= MAX_STUDENT_WAITLISTS:
+                    continue
+                waitlisted.add(s)
+                student_waitlists[s] += 1
+                joined = TERM_START + datetime.timedelta(seconds=rng.randrange(14 * 24 * 3600))
+                waitlist_rows.append((student_names[s], class_code, section_number, str(joined)))
+            section[9] = len(waitlisted)
+
+    enrolled_keys = set(enroll_rows)
+    dropped_rows = set()
+    for _ in range(int(len(enroll_rows) * drop_ratio)):
+        section = rng.choice(section_rows)
+        row = (student_names[rng.randrange(students)], section[0], section[1])
+        if row not in enrolled_keys:
+            dropped_rows.add(row)
+
+    # Children first, so the counter triggers find no Class/Student rows to update
+    # and the precomputed counters below are inserted as-is
+    db.executemany("INSERT INTO Enroll (e_student_username, e_class_code, e_section_number) VALUES (?, ?, ?)", enroll_rows)
+    db.executemany("INSERT INTO Waitlist (w_student_username, w_class_code, w_section_number, timestamp) VALUES (?, ?, ?, ?)", waitlist_rows)
+    db.executemany("INSERT INTO Dropped (d_student_username, d_class_code, d_section_number) VALUES (?, ?, ?)", sorted(dropped_rows))
+    db.executemany(
+        "INSERT INTO Class (class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username, current_enrollment, current_waitlist, term) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'FA2023')",
+        section_rows,
+    )
+    db.executemany(
+        "INSERT INTO Instructor (instructor_username, i_first_name, i_last_name) VALUES (?, ?, ?)",
+        ((name, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)) for name in instructor_names),
+    )
+    db.executemany(
+        "INSERT INTO Student (s_first_name, s_last_name, student_username, num_waitlist) VALUES (?, ?, ?, ?)",
+        ((rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), name, student_waitlists[i]) for i, name in enumerate(student_names)),
+    )
+    db.commit()
+    db.execute("ANALYZE")
+    db.execute("PRAGMA journal_mode=WAL")
+    db.close()
+
+    return {
+        "students": students,
+        "instructors": instructors,
+        "sections": sections,
+        "enrollments": len(enroll_rows),
+        "waitlist": len(waitlist_rows),
+        "dropped": len(dropped_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--instructors", type=int)
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--sections-per-class", type=int, default=3)
+    parser.add_argument("--min-enrollment", type=int, default=20)
+    parser.add_argument("--max-enrollment", type=int, default=60)
+    parser.add_argument("--max-waitlist", type=int, default=15)
+    parser.add_argument("--fill-ratio", type=float, default=0.85)
+    parser.add_argument("--full-ratio", type=float, default=0.3)
+    parser.add_argument("--waitlist-depth", type=float, default=0.5)
+    parser.add_argument("--drop-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=449)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(**{k: v for k, v in vars(args).items()})
+    print(f"wrote {args.output} in {time.perf_counter() - start:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Replay a registration-week traffic mix against the api and report per-endpoint latency.
+
+By default the app runs in-process through TestClient against a generated
+database. With --url the same mix is sent to a running server instead
+(e.g. `foreman start` or `uvicorn api:app`), which must be serving a database
+generated with the same datagen arguments.
+
+Usage (from within the api folder):
+    python bench/loadtest.py --requests 5000 --concurrency 16 --output results.json
+    python bench/loadtest.py --url http://localhost:5000 --database ./var/projectDatabase.db
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import load_app, percentile, remove_database
+
+import datagen
+
+# (name, weight, method, path template, source); weights roughly follow registration
+# week. The source says where the student/section come from: any student and
+# section, an existing enrollment, or an existing waitlist entry.
+TRAFFIC_MIX = [
+    ("available_classes", 20, "GET", "/student/available_classes?limit=50", "any"),
+    ("enroll", 25, "POST", "/student/enroll_in_class/student/{student}/class/{class_code}/section/{section_number}", "any"),
+    ("drop", 8, "DELETE", "/student/drop_class/student/{student}/class/{class_code}/section/{section_number}", "enrolled"),
+    ("waitlist_position", 15, "GET", "/student/waitlist_position/student/{student}/class/{class_code}/section/{section_number}", "waitlisted"),
+    ("waitlist_positions", 5, "GET", "/student/waitlist_positions/student/{student}", "waitlisted"),
+    ("remove_from_waitlist", 4, "DELETE", "/student/remove_from_waitlist/student/{student}/class/{class_code}/section/{section_number}", "waitlisted"),
+    ("student_enrollment", 10, "GET", "/student_enrollment/{student}", "enrolled"),
+    ("instructor_enrollment", 5, "GET", "/instructor/enrollment/instructor/{instructor}?limit=100", "any"),
+    ("instructor_waitlist", 4, "GET", "/instructor/waitlist_for_class/instructor/{instructor}/class/{class_code}/section/{section_number}", "any"),
+    ("instructor_dropped", 4, "GET", "/instructor/dropped/instructor/{instructor}/class/{class_code}/section/{section_number}", "any"),
+]
+
+
+def load_population(database):
+    db = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    population = {
+        "students": [row[0] for row in db.execute("SELECT student_username FROM Student ORDER BY student_username")],
+        "sections": db.execute("SELECT class_code, section_number, c_instructor_username FROM Class ORDER BY class_code, section_number").fetchall(),
+        "enrolled": db.execute("SELECT e_student_username, e_class_code, e_section_number FROM Enroll ORDER BY 1, 2, 3").fetchall(),
+        "waitlisted": db.execute("SELECT w_student_username, w_class_code, w_section_number FROM Waitlist ORDER BY 1, 2, 3").fetchall(),
+    }
+    db.close()
+    return population
+
+
+def plan_requests(population, count, seed):
+    """A deterministic list of (name, method, url) requests."""
+    rng = random.Random(seed)
+    names = [name for name, _, _, _, _ in TRAFFIC_MIX]
+    weights = [weight for _, weight, _, _, _ in TRAFFIC_MIX]
+    templates = {name: (method, path, source) for name, _, method, path, source in TRAFFIC_MIX}
+    instructors = {(class_code, section_number): instructor for class_code, section_number, instructor in population["sections"]}
+
+    requests = []
+    for name in rng.choices(names, weights=weights, k=count):
+        method, path, source = templates[name]
+        if source == "any" or not population[source]:
+            student = rng.choice(population["students"])
+            class_code, section_number, _ = rng.choice(population["sections"])
+        else:
+            student, class_code, section_number = rng.choice(population[source])
+
+        url = path.format(
+            student=student,
+            class_code=class_code,
+            section_number=section_number,
+            instructor=instructors.get((class_code, section_number), ""),
+        )
+        requests.append((name, method, url))
+    return requests
+
+
+def run(client, requests, concurrency):
+    latencies = collections.defaultdict(list)
+    statuses = collections.defaultdict(collections.Counter)
+    lock = threading.Lock()
+    index = iter(range(len(requests)))
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                i = next(index, None)
+            if i is None:
+                break
+            name, method, url = requests[i]
+            start = time.perf_counter()
+            response = client.request(method, url)
+            local.append((name, time.perf_counter() - start, response.status_code))
+        with lock:
+            for name, latency, status_code in local:
+                latencies[name].append(latency)
+                statuses[name][status_code] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for name, values in sorted(latencies.items()):
+        endpoints[name] = {
+            "requests": len(values),
+            "throughput": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p90_ms": percentile(values, 90) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": max(values) * 1000,
+            "status": {str(code): n for code, n in sorted(statuses[name].items())},
+        }
+    return {
+        "elapsed_seconds": elapsed,
+        "throughput": len(requests) / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['elapsed_seconds']:.2f}s ({report['throughput']:.1f} req/s)")
+    print(f"{'endpoint':<24}{'req':>7}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}  status")
+    for name, e in report["endpoints"].items():
+        print(f"{name:<24}{e['requests']:>7}{e['throughput']:>9.1f}{e['p50_ms']:>9.2f}{e['p90_ms']:>9.2f}{e['p99_ms']:>9.2f}  {e['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server; in-process if omitted")
+    parser.add_argument("--database", help="existing database; generated if omitted")
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=449)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    database = args.database
+    generated = database is None
+    if generated:
+        fd, database = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        datagen.generate(database, students=args.students, sections=args.sections, seed=args.seed)
+
+    population = load_population(database)
+    requests = plan_requests(population, args.requests, args.seed)
+
+    if args.url:
+        import httpx
+        client = httpx.Client(base_url=args.url, timeout=60)
+    else:
+        from fastapi.testclient import TestClient
+        client = TestClient(load_app(database).app)
+
+    with client:
+        result = run(client, requests, args.concurrency)
+
+    report = {
+        "target": args.url or "in-process",
+        "database": None if generated else database,
+        "students": len(population["students"]),
+        "sections": len(population["sections"]),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **result,
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if generated:
+        remove_database(database)
+
+
+if __name__ == "__main__":
+    main()
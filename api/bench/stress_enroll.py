@@ -0,0 +1,77 @@
+"""Race many threads on one section and check capacity is never exceeded.
+
+Usage (from within the api folder):
+    python bench/stress_enroll.py [--threads 64] [--max-enrollment 30] [--max-waitlist 15]
+
+Exits with status 1 if the section ends up over max_enrollment or max_waitlist,
+or if any student is left on more than three waitlists.
+"""
+import argparse
+import collections
+import sqlite3
+import sys
+import threading
+
+from common import add_students, make_database, remove_database
+
+import enrollment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--max-enrollment", type=int, default=30)
+    parser.add_argument("--max-waitlist", type=int, default=15)
+    args = parser.parse_args()
+
+    database = make_database()
+    students = add_students(database, args.threads)
+    with sqlite3.connect(database) as db:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "UPDATE Class SET max_enrollment=?, max_waitlist=? WHERE class_code='CPSC449' AND section_number='02'",
+            (args.max_enrollment, args.max_waitlist),
+        )
+        # Start from an empty section so every seat is contested
+        db.execute("DELETE FROM Enroll WHERE e_class_code='CPSC449' AND e_section_number='02'")
+    db.close()
+
+    outcomes = collections.Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.threads)
+
+    def race(student):
+        db = sqlite3.connect(database, timeout=60)
+        db.row_factory = sqlite3.Row
+        barrier.wait()
+        outcome = enrollment.enroll(db, student, "CPSC449", "02")
+        db.close()
+        with lock:
+            outcomes[outcome.value] += 1
+
+    threads = [threading.Thread(target=race, args=(student,)) for student in students]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with sqlite3.connect(database) as db:
+        enrolled = db.execute("SELECT COUNT(*) FROM Enroll WHERE e_class_code='CPSC449' AND e_section_number='02'").fetchone()[0]
+        waitlisted = db.execute("SELECT COUNT(*) FROM Waitlist WHERE w_class_code='CPSC449' AND w_section_number='02'").fetchone()[0]
+        over_limit = db.execute("SELECT COUNT(*) FROM (SELECT 1 FROM Waitlist GROUP BY w_student_username HAVING COUNT(*) > 3)").fetchone()[0]
+    db.close()
+    remove_database(database)
+
+    print(f"outcomes: {dict(outcomes)}")
+    print(f"enrolled {enrolled}/{args.max_enrollment}, waitlisted {waitlisted}/{args.max_waitlist}")
+
+    expected_enrolled = min(args.threads, args.max_enrollment)
+    expected_waitlisted = min(args.threads - expected_enrolled, args.max_waitlist)
+    if enrolled != expected_enrolled or waitlisted != expected_waitlisted or over_limit:
+        print("FAILED: capacity invariant violated")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Move closed terms out of the live database into the archive database.
+
+Every section of a closed term is moved, with its enrollment, waitlist,
+dropped list, meeting times and lottery requests, in small batches while
+the api keeps serving (see archive.archive_term); its change feed events
+are deleted. The freed pages are then handed back a
+few at a time with incremental vacuum, and the planner statistics refreshed
+with PRAGMA optimize. Instructors' dropped lists (task 5) keep showing the
+archived terms through the DroppedHistory view, as long as the api runs
+with ARCHIVE_DATABASE pointing at the same archive.
+
+The api workers' catalog caches are told to forget the archived sections
+through their invalidation file: the one next to --database, or
+CATALOG_INVALIDATION_FILE if they were started with one.
+
+Usage (from within the api folder):
+    python bin/archive_terms.py [--close SP2023] [--archive ./var/archive.db] [--batch-size 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+import archive
+import pool
+from catalog import CatalogCache, default_invalidation_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=os.environ.get("DATABASE", "./var/projectDatabase.db"))
+    parser.add_argument("--archive", default=os.environ.get("ARCHIVE_DATABASE", "./var/archive.db"))
+    parser.add_argument("--close", action="append", default=[], metavar="TERM", help="close this term first (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=50, help="sections moved per transaction")
+    parser.add_argument("--pause", type=float, default=0.01, help="seconds between transactions")
+    parser.add_argument("--vacuum-pages", type=int, default=256, help="pages released per incremental vacuum step")
+    parser.add_argument("--invalidation-file", default=os.environ.get("CATALOG_INVALIDATION_FILE"))
+    args = parser.parse_args()
+
+    archive.create(args.archive)
+    db = pool.connect(args.database, archive_database=args.archive)
+
+    for term in args.close:
+        if not archive.close_term(db, term):
+            sys.exit(f"No such term: {term}")
+
+    start = time.perf_counter()
+    moved = archive.archive_closed_terms(db, args.batch_size, args.pause)
+    for term, sections in moved.items():
+        print(f"{term}: {sections} sections archived")
+
+    if any(moved.values()):
+        CatalogCache(invalidation_file=args.invalidation_file or default_invalidation_file(args.database)).invalidate()
+
+    released = archive.compact(db, args.vacuum_pages, args.pause)
+    if released is None:
+        print("auto_vacuum is not INCREMENTAL; free pages stay in the file until a full VACUUM")
+    else:
+        print(f"{released} pages released")
+    print(f"done in {time.perf_counter() - start:.2f} s")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
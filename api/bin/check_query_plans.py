@@ -0,0 +1,241 @@
+"""Fail if any SQL statement in the api regresses to a full table scan.
+
+Every statement in the queries.py registry, plus any constant SQL string
+still passed inline to `execute`/`executemany` (or to `serialize.fetch`) in
+the modules below, is run through EXPLAIN QUERY PLAN against a copy of the
+schema padded with synthetic rows. A `SCAN` of any table holding more than
+--threshold rows is reported as a regression, unless the statement (or the
+enclosing function, for inline SQL) is listed in ALLOWED_SCANS because it
+intentionally reads the whole table. Aliases in the plan are resolved to
+their table; a scanned name that is neither a table nor a CTE or
+table-valued function fails the check too.
+
+Usage (from within the api folder):
+    python bin/check_query_plans.py [--threshold 100] [--database ./var/projectDatabase.db [--archive ./var/archive.db]]
+"""
+import argparse
+import ast
+import os
+import re
+import sqlite3
+import sys
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA = os.path.join(API_DIR, "share", "projectDatabase.sql")
+MODULES = [
+    "api.py",
+    "archive.py",
+    "bulk.py",
+    "catalog.py",
+    "enrollment.py",
+    "etags.py",
+    "events.py",
+    "idempotency.py",
+    "lottery.py",
+    "promotion.py",
+    "schedule.py",
+    "search.py",
+    "sections.py",
+    "sharding.py",
+]
+
+# Statements whose whole purpose is to list an entire table
+ALLOWED_SCANS = {
+    "ALL_CLASSES": {"Class"},
+    "ALL_WAITLIST": {"Waitlist"},
+    "REBALANCE_CANDIDATES": {"Waitlist"},
+}
+
+# Position of the SQL argument in the calls that run a statement
+SQL_ARGUMENT = {"execute": 0, "executemany": 0, "fetch": 1}
+
+SCAN = re.compile(r"^SCAN (\w+)")
+# EXPLAIN QUERY PLAN names a table by its alias, if it has one
+ALIAS = re.compile(r"\b(?:FROM|JOIN|,)\s+(?:\w+\.)?(\w+)(?:\s*\([^()]*\))?\s+AS\s+(\w+)", re.IGNORECASE)
+CTE = re.compile(r"(?:\bWITH(?:\s+RECURSIVE)?|,)\s+(\w+)\s+AS\s+(?:NOT\s+)?(?:MATERIALIZED\s+)?\(", re.IGNORECASE)
+# Scanned names that are not tables: table-valued functions over a
+# parameter, and the single row of a SELECT without FROM
+NOT_TABLES = {"json_each", "json_tree", "CONSTANT"}
+# An FTS5 table queried with MATCH reads its full-text index, not every row
+FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:M")
+NAMED_PARAM = re.compile(r":(\w+)")
+NUMBERED_PARAM = re.compile(r"\?(\d+)")
+
+sys.path.insert(0, API_DIR)
+
+
+def find_statements(path):
+    """Yield (function name, line number, sql) for every constant SQL string executed in `path`."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+
+    for function in ast.walk(tree):
+        if not isinstance(function, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+
+        # SQL kept in a local variable, e.g. to share it with a streaming path
+        local_strings = {
+            node.targets[0].id: node.value.value
+            for node in ast.walk(function)
+            if isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+            and isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str)
+        }
+
+        for node in ast.walk(function):
+            if not (
+                isinstance(node, ast.Call)
+                and isinstance(node.func, ast.Attribute)
+                and node.func.attr in SQL_ARGUMENT
+                and len(node.args) > SQL_ARGUMENT[node.func.attr]
+            ):
+                continue
+
+            arg = node.args[SQL_ARGUMENT[node.func.attr]]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                sql = arg.value
+            elif isinstance(arg, ast.Name) and arg.id in local_strings:
+                sql = local_strings[arg.id]
+            else:
+                continue
+
+            sql = sql.strip()
+            if sql.upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+                yield function.name, node.lineno, sql
+
+
+def all_statements():
+    """Yield (location, name, sql) for the registry and for inline SQL in MODULES."""
+    import queries
+
+    for name, sql in queries.statements().items():
+        yield "queries.py", name, sql
+    for module in MODULES:
+        for function, lineno, sql in find_statements(os.path.join(API_DIR, module)):
+            yield f"{module}:{lineno}", function, sql
+
+
+def padded_database(rows):
+    """Build an in-memory copy of the schema with `rows` synthetic rows per table.
+
+    The attached archive gets a copy of every section as a past term.
+    """
+    import archive
+
+    db = sqlite3.connect(":memory:")
+    with open(SCHEMA) as f:
+        db.executescript(f.read())
+    archive.attach(db)
+
+    students = [(f"S{i}", f"S{i}", f"student{i}") for i in range(rows)]
+    instructors = [(f"instructor{i}", f"I{i}", f"I{i}") for i in range(max(1, rows // 10))]
+    # Spread over ten terms, so Class_term is as selective as in a live database
+    sections = [
+        (f"C{i:06d}", "01", f"Class {i}", "Dept", True, 30, 15, instructors[i % len(instructors)][0], f"T{i % 10:05d}")
+        for i in range(rows)
+    ]
+    db.executemany("INSERT INTO Student (s_first_name, s_last_name, student_username) VALUES (?, ?, ?)", students)
+    db.executemany("INSERT INTO Instructor VALUES (?, ?, ?)", instructors)
+    db.executemany(
+        "INSERT INTO Class (class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username, term) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        sections,
+    )
+    pairs = [(students[i][2], sections[(i * 7) % rows][0], "01") for i in range(rows)]
+    db.executemany("INSERT INTO Enroll VALUES (?, ?, ?)", pairs)
+    db.executemany("INSERT INTO Waitlist VALUES (?, ?, ?, '2023-09-15 10:00:00')", pairs)
+    db.executemany("INSERT INTO Dropped VALUES (?, ?, ?)", pairs)
+    db.executemany("INSERT INTO Event (kind, student_username, class_code, section_number) VALUES ('enrolled', ?, ?, ?)", pairs)
+    db.executemany("INSERT INTO EnrollmentRequest (r_student_username, request_number, choice, r_class_code, r_section_number) VALUES (?, 1, 1, ?, ?)", pairs)
+    db.executemany(
+        "INSERT INTO Meeting (m_class_code, m_section_number, day, start_minute, end_minute) VALUES (?, '01', ?, ?, ?)",
+        [(section[0], i % 5, 480 + 60 * (i % 8), 555 + 60 * (i % 8)) for i, section in enumerate(sections)],
+    )
+    db.executemany("INSERT INTO IdempotencyKey (key, fingerprint, expires) VALUES (?, x'00', ?)", [(f"key{i}", i) for i in range(rows)])
+    db.execute("INSERT INTO archive.Class SELECT 'SP2023', class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username FROM Class")
+    db.execute("INSERT INTO archive.Enroll SELECT 'SP2023', * FROM Enroll")
+    db.execute("INSERT INTO archive.Waitlist SELECT 'SP2023', * FROM Waitlist")
+    db.execute("INSERT INTO archive.Dropped SELECT 'SP2023', * FROM Dropped")
+    db.execute("ANALYZE")
+    db.execute("ANALYZE archive")
+    db.commit()
+    return db
+
+
+def table_sizes(db):
+    tables = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+    return {table: db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+
+def scanned_tables(sql):
+    """Map every name a plan may SCAN to the table it reads, or to None if it is not a table."""
+    names = {cte: None for cte in CTE.findall(sql)}
+    names.update(dict.fromkeys(NOT_TABLES))
+    for table, alias in ALIAS.findall(sql):
+        names[alias] = None if table in NOT_TABLES or table in names else table
+    return names
+
+
+def explain(db, sql):
+    names = NAMED_PARAM.findall(sql)
+    numbered = [int(number) for number in NUMBERED_PARAM.findall(sql)]
+    if names:
+        params = dict.fromkeys(names)
+    elif numbered:
+        params = (None,) * max(numbered)
+    else:
+        params = (None,) * sql.count("?")
+    return [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=int, default=100, help="tables with more rows than this may not be scanned")
+    parser.add_argument("--database", help="check against an existing database instead of synthetic data")
+    parser.add_argument("--archive", help="the archive database attached to --database")
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every statement")
+    args = parser.parse_args()
+
+    if args.database:
+        import archive
+
+        db = sqlite3.connect(f"file:{args.database}?mode=ro", uri=True)
+        archive.attach(db, args.archive, read_only=True)
+    else:
+        db = padded_database(args.threshold * 10)
+    sizes = table_sizes(db)
+
+    regressions = 0
+    checked = 0
+    for location, name, sql in all_statements():
+        checked += 1
+        plan = explain(db, sql)
+        if args.verbose:
+            print(f"{location} {name}")
+            for detail in plan:
+                print(f"    {detail}")
+
+        names = scanned_tables(sql)
+        for detail in plan:
+            match = SCAN.match(detail)
+            if not match or FTS_MATCH.search(detail):
+                continue
+            table = names.get(match.group(1), match.group(1))
+            if table is None:
+                continue
+            if table not in sizes:
+                regressions += 1
+                print(f"{location} {name}: {detail} (unknown table)")
+                continue
+            if sizes[table] <= args.threshold or table in ALLOWED_SCANS.get(name, ()):
+                continue
+            regressions += 1
+            print(f"{location} {name}: {detail} ({sizes[table]} rows)")
+
+    print(f"{checked} statements checked, {regressions} full scans")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Fail if a section-scoped endpoint issues more SQL statements than its budget.
+
+Replays SCENARIO, in order, against a fresh copy of the sample database with
+the catalog cache disabled (the worst case), counting the statements of each
+request with the app's own metrics. Every execute/executemany/commit/rollback
+counts as one statement.
+
+Usage (from within the api folder):
+    python bin/check_statement_counts.py
+"""
+import argparse
+import importlib
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA = os.path.join(API_DIR, "share", "projectDatabase.sql")
+
+# (method, path, expected status, baseline, statement budget), run in order on
+# the sample data; a request expecting 304 sends the ETag of the response
+# before it in If-None-Match.
+#
+# The baseline is what the request cost before the section context (commit
+# 74b84cd), None for a request that did not exist then. The budget is the
+# baseline with every section, status and instructor lookup folded into the
+# one sections.load statement, plus what later features add on purpose, as
+# noted per line: the schedule clash check (clash), the change feed's Event
+# insert (event), the ETag version read (etag) and deleting the section's
+# meetings (meetings).
+SCENARIO = [
+    ("POST", "/student/enroll_in_class/student/SamDoe123/class/CPSC449/section/02", 200, 5, 5 + 2),  # clash, event
+    ("POST", "/student/enroll_in_class/student/SamDoe123/class/CPSC449/section/02", 409, 3, 3),
+    ("POST", "/student/enroll_in_class/student/SamDoe123/class/MATH101/section/02", 200, 5, 5 + 2),  # clash, event
+    ("POST", "/student/enroll_in_class/student/SamDoe123/class/CHEM101/section/01", 409, None, 4),  # clash
+    ("GET", "/student/schedule/student/SamDoe123", 200, None, 1),
+    ("POST", "/student/enroll_in_class/student/SamDoe123/class/NOPE101/section/01", 404, 3, 3),
+    ("DELETE", "/student/drop_class/student/SamDoe123/class/MATH101/section/01", 200, 6, 5 + 1),  # event
+    ("DELETE", "/student/drop_class/student/SamDoe123/class/MATH101/section/01", 404, 2, 1),
+    ("DELETE", "/student/drop_class/student/SamDoe123/class/NOPE101/section/01", 404, 1, 1),
+    ("DELETE", "/instructor/drop_student/student/SteveBrown123/class/ENGL205/section/01", 200, 8, 7 + 2),  # event for the drop and the promotion
+    ("DELETE", "/student/remove_from_waitlist/student/SylviaWilson123/class/ENGL205/section/01", 200, 3, 3 + 1),  # event
+    ("DELETE", "/student/remove_from_waitlist/student/SylviaWilson123/class/ENGL205/section/01", 404, 1, 1),
+    ("GET", "/student/waitlist_position/student/ScottDavis123/class/PHYS202/section/02", 200, 1, 1),
+    ("GET", "/instructor/waitlist_for_class/instructor/IsaacSmit101/class/PHYS202/section/02", 200, 3, 2),
+    ("GET", "/instructor/waitlist_for_class/instructor/IsaacSmit101/class/PHYS202/section/02", 304, None, 1),
+    ("GET", "/instructor/dropped/instructor/IreneDoe100/class/CPSC449/section/01", 200, 2, 2),
+    ("GET", "/instructor/dropped/instructor/IreneDoe100/class/CPSC449/section/01", 304, None, 1),
+    ("GET", "/instructor/enrollment/instructor/IreneDoe100", 200, 1, 1 + 1),  # etag
+    ("GET", "/instructor/enrollment/instructor/IreneDoe100", 304, None, 1),
+    ("PATCH", "/registrar/change_instructor/class/CPSC449/section/02/new_instructor/IreneDoe100", 200, 4, 3 + 1),  # event
+    ("PATCH", "/registrar/freeze_enrollment/class/CPSC449/section/02", 200, 3, 3 + 1),  # event
+    ("DELETE", "/registrar/remove_class/code/CPSC449/section/02", 200, 6, 6 + 2),  # meetings, event
+]
+
+
+def load_app(database):
+    os.environ["DATABASE"] = database
+    os.environ["CATALOG_CACHE"] = "false"
+    os.environ["METRICS"] = "true"
+    if API_DIR not in sys.path:
+        sys.path.insert(0, API_DIR)
+    api = importlib.import_module("api")
+    logging.getLogger().setLevel(logging.WARNING)
+    return api
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    from fastapi.testclient import TestClient
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "statements.db")
+        with open(SCHEMA) as f:
+            script = f.read()
+        db = sqlite3.connect(database)
+        db.executescript(script)
+        db.close()
+
+        api = load_app(database)
+        statements = api.metrics.request_statements
+
+        failures = 0
+        print(f"{'baseline':>8} {'statements':>10} {'budget':>6}  request")
+        with TestClient(api.app) as client:
+            etag = None
+            for method, path, expected_status, baseline, budget in SCENARIO:
+                headers = {"If-None-Match": etag} if expected_status == 304 and etag else {}
+                before = statements.total()
+                response = client.request(method, path, headers=headers)
+                etag = response.headers.get("etag")
+                count = int(statements.total() - before)
+
+                problems = []
+                if response.status_code != expected_status:
+                    problems.append(f"status {response.status_code}, expected {expected_status}")
+                if count > budget:
+                    problems.append("over budget")
+                failures += bool(problems)
+                print(f"{'-' if baseline is None else baseline:>8} {count:>10} {budget:>6}  {method} {path} -> {response.status_code} {'; '.join(problems)}")
+
+        api.pool.close()
+
+    print(f"{len(SCENARIO)} requests checked, {failures} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+#!/bin/sh
+
+sqlite3 -header ./var/projectDatabase.db < ./share/reconcile.sql
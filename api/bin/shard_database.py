@@ -0,0 +1,45 @@
+"""Split a database into a directory database and several shards by a hash of class_code.
+
+Each shard gets the sections whose class code hashes to it, with their
+enrollment, waitlist, dropped list, meeting times, lottery requests and
+events; the directory gets none of those and keeps the idempotency keys.
+Student, Instructor and Term are copied to all of them (see sharding.split).
+Stop the api first: the copies are taken from the database as it is now.
+
+Then start the api with DATABASE pointing at the directory and
+SHARD_DATABASES listing the shards in order, as printed.
+
+Usage (from within the api folder):
+    python bin/shard_database.py --shards 4 [--database ./var/projectDatabase.db]
+"""
+import argparse
+import json
+import os
+import sys
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+import sharding
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=os.environ.get("DATABASE", "./var/projectDatabase.db"))
+    parser.add_argument("--shards", type=int, required=True, help=f"number of shards (1-{sharding.MAX_SHARDS})")
+    args = parser.parse_args()
+
+    stem, extension = os.path.splitext(args.database)
+    directory = f"{stem}.directory{extension}"
+    databases = [f"{stem}.shard{i}{extension}" for i in range(args.shards)]
+    existing = [path for path in [directory, *databases] if os.path.exists(path)]
+    if existing:
+        sys.exit(f"Already exists: {', '.join(existing)}")
+
+    sharding.split(args.database, directory, databases)
+    print(f"DATABASE={directory}")
+    print(f"SHARD_DATABASES='{json.dumps(databases)}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import csv
+import datetime
+import enum
+import io
+import json
+
+import events
+import lottery
+import promotion
+import queries
+import schedule
+from enrollment import MAX_STUDENT_WAITLISTS, EnrollOutcome
+
+# Rows written per transaction; keeps the write lock short for live traffic
+DEFAULT_CHUNK_SIZE = 500
+
+CSV_COLUMNS = ("student_username", "class_code", "section_number")
+
+
+class DropOutcome(str, enum.Enum):
+    DROPPED = "dropped"
+    NOT_ENROLLED = "not_enrolled"
+    NO_SECTION = "no_section"
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _students(rows):
+    return json.dumps(sorted({student for student, _, _ in rows}))
+
+
+def _sections(rows):
+    return json.dumps(sorted({(class_code, section_number) for _, class_code, section_number in rows}))
+
+
+def _load_sections(db, rows):
+    return {
+        (row["class_code"], row["section_number"]): dict(row)
+        for row in db.execute(queries.BULK_SECTIONS, (_sections(rows),))
+    }
+
+
+def _load_enrolled(db, rows):
+    return {
+        tuple(row)
+        for row in db.execute(queries.BULK_ENROLLED, (_students(rows),))
+    }
+
+
+def enroll_many(db, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Enroll (student_username, class_code, section_number) rows in bulk.
+
+    Applies the same checks as enrollment.enroll, in the same order and in
+    input order, so earlier rows take seats before later ones: a row for a
+    section in its lottery window is recorded as a request (REQUESTED), and
+    one that clashes with the student's sections, including those enrolled
+    by earlier rows, is rejected (CONFLICT). Each chunk reads the state it
+    needs in a few set-based queries under BEGIN IMMEDIATE, decides every
+    row in Python and writes the results with executemany. Returns one
+    EnrollOutcome per input row.
+    """
+    outcomes = []
+    for chunk in _chunks(list(rows), chunk_size):
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            outcomes.extend(_enroll_chunk(db, chunk))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+    return outcomes
+
+
+def _enroll_chunk(db, rows):
+    sections = _load_sections(db, rows)
+    enrolled = _load_enrolled(db, rows)
+    waitlisted = {
+        tuple(row)
+        for row in db.execute(queries.BULK_WAITLISTED, (_students(rows),))
+    }
+    student_waitlists = dict(db.execute(queries.BULK_STUDENT_WAITLISTS, (_students(rows),)).fetchall())
+    blocks = schedule.section_blocks(db, sections)
+    held = schedule.student_blocks(db, [student for student, _, _ in rows])
+
+    outcomes = []
+    enroll_rows = []
+    waitlist_rows = []
+    for row in rows:
+        student, class_code, section_number = row
+        section = sections.get((class_code, section_number))
+
+        if section is None:
+            outcome = EnrollOutcome.NO_SECTION
+        elif row in enrolled:
+            outcome = EnrollOutcome.ALREADY_ENROLLED
+        elif row in waitlisted:
+            outcome = EnrollOutcome.ALREADY_WAITLISTED
+        elif section["lottery"]:
+            lottery.record_request(db, student, [(class_code, section_number)])
+            outcome = EnrollOutcome.REQUESTED
+        elif schedule.clash(blocks.get((class_code, section_number), ()), held.get(student, ())):
+            outcome = EnrollOutcome.CONFLICT
+        elif section["current_enrollment"] < section["max_enrollment"]:
+            section["current_enrollment"] += 1
+            enrolled.add(row)
+            enroll_rows.append(row)
+            schedule.hold(held, student, class_code, section_number, blocks.get((class_code, section_number), ()))
+            outcome = EnrollOutcome.ENROLLED
+        elif section["current_waitlist"] >= section["max_waitlist"]:
+            outcome = EnrollOutcome.FULL
+        elif student_waitlists.get(student, 0) >= MAX_STUDENT_WAITLISTS:
+            outcome = EnrollOutcome.OVER_LIMIT
+        else:
+            section["current_waitlist"] += 1
+            student_waitlists[student] = student_waitlists.get(student, 0) + 1
+            waitlisted.add(row)
+            waitlist_rows.append((*row, str(datetime.datetime.now())))
+            outcome = EnrollOutcome.WAITLISTED
+        outcomes.append(outcome)
+
+    db.executemany(queries.INSERT_ENROLLMENT, enroll_rows)
+    db.executemany(queries.INSERT_WAITLIST_ENTRY, waitlist_rows)
+
+    # Remove them from the drop list if they previously dropped the class
+    db.executemany(queries.DELETE_DROPPED, enroll_rows + [row[:3] for row in waitlist_rows])
+
+    events.record_many(db, events.EventKind.ENROLLED, enroll_rows)
+    events.record_many(db, events.EventKind.WAITLISTED, [row[:3] for row in waitlist_rows])
+
+    return outcomes
+
+
+def drop_many(db, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Drop (student_username, class_code, section_number) rows in bulk.
+
+    Same rules as the single drop endpoints, including waitlist promotion for
+    the affected sections inside each chunk's transaction. Returns one
+    DropOutcome per input row and the list of promoted enrollments.
+    """
+    outcomes = []
+    promoted = []
+    for chunk in _chunks(list(rows), chunk_size):
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            chunk_outcomes, chunk_promoted = _drop_chunk(db, chunk)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        outcomes.extend(chunk_outcomes)
+        promoted.extend(chunk_promoted)
+    return outcomes, promoted
+
+
+def _drop_chunk(db, rows):
+    sections = _load_sections(db, rows)
+    enrolled = _load_enrolled(db, rows)
+
+    outcomes = []
+    drop_rows = []
+    for row in rows:
+        _, class_code, section_number = row
+        if (class_code, section_number) not in sections:
+            outcome = DropOutcome.NO_SECTION
+        elif row not in enrolled:
+            outcome = DropOutcome.NOT_ENROLLED
+        else:
+            enrolled.discard(row)
+            drop_rows.append(row)
+            outcome = DropOutcome.DROPPED
+        outcomes.append(outcome)
+
+    db.executemany(queries.DELETE_ENROLLMENT, drop_rows)
+    db.executemany(queries.INSERT_DROPPED, drop_rows)
+    events.record_many(db, events.EventKind.DROPPED, drop_rows)
+
+    promoted = []
+    for class_code, section_number in sorted({(c, s) for _, c, s in drop_rows}):
+        promoted.extend(
+            {"student_username": student, "class_code": class_code, "section_number": section_number}
+            for student in promotion.promote(db, class_code, section_number)
+        )
+    return outcomes, promoted
+
+
+def parse_csv(text):
+    """Rows from a CSV with student_username,class_code,section_number columns."""
+    reader = csv.DictReader(io.StringIO(text))
+    missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+    return [tuple((record[column] or "").strip() for column in CSV_COLUMNS) for record in reader]
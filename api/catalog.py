@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+import queries
+
+
+def default_invalidation_file(database):
+    """The invalidation file every process using `database` shares unless told otherwise."""
+    return f"{database}-catalog"
+
+
+class CatalogCache:
+    """In-process read-through cache of Class sections and Instructors.
+
+    The catalog only changes through the registrar endpoints, which call
+    invalidate() after committing. Every invalidation bumps `version`; a miss
+    only stores its result if the version did not move while it was reading,
+    so a lookup racing a registrar write can never repopulate stale data.
+    Lookups of sections or instructors that do not exist are not cached, so
+    one created elsewhere is found straight away.
+
+    With `invalidation_file` set, invalidate() also touches that file and every
+    lookup compares its mtime, so registrar writes on one uvicorn worker, or
+    bin/archive_terms.py, clear the caches of the others.
+
+    Only the catalog columns of Class are cached, never the enrollment counters.
+    """
+
+    def __init__(self, enabled=True, invalidation_file=None):
+        self.enabled = enabled
+        self.invalidation_file = invalidation_file
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._sections = {}
+        self._instructors = {}
+        self._file_mtime = self._mtime()
+
+    def _mtime(self):
+        if self.invalidation_file is None:
+            return None
+        try:
+            return os.stat(self.invalidation_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _check_shared(self):
+        if self.invalidation_file is None:
+            return
+        mtime = self._mtime()
+        if mtime != self._file_mtime:
+            with self._lock:
+                self._file_mtime = mtime
+                self._clear()
+
+    def _clear(self):
+        # In place: a lookup under way holds on to the dict it was given
+        self._sections.clear()
+        self._instructors.clear()
+        self.version += 1
+        self.invalidations += 1
+
+    def _lookup(self, table, key, load):
+        if not self.enabled:
+            return load()
+
+        self._check_shared()
+        value = table.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        version = self.version
+        value = load()
+        if value is not None:
+            with self._lock:
+                if version == self.version:
+                    table[key] = value
+        return value
+
+    def section(self, db, class_code, section_number):
+        """The catalog row of a section, or None if it does not exist."""
+        def load():
+            row = db.execute(queries.CATALOG_SECTION, (class_code, section_number)).fetchone()
+            return None if row is None else dict(row)
+
+        return self._lookup(self._sections, (class_code, section_number), load)
+
+    def instructor(self, db, instructor_username):
+        """The Instructor row, or None if it does not exist."""
+        def load():
+            row = db.execute(queries.CATALOG_INSTRUCTOR, (instructor_username,)).fetchone()
+            return None if row is None else dict(row)
+
+        return self._lookup(self._instructors, instructor_username, load)
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+        if self.invalidation_file is not None:
+            # An explicit time, as the default one can repeat within a clock tick
+            now = time.time_ns()
+            with open(self.invalidation_file, "a"):
+                os.utime(self.invalidation_file, ns=(now, now))
+            with self._lock:
+                self._file_mtime = self._mtime()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "sections": len(self._sections),
+            "instructors": len(self._instructors),
+        }
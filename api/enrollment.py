@@ -0,0 +1,108 @@
+import contextlib
+import datetime
+import enum
+
+import events
+import lottery
+import queries
+import schedule
+import sections
+
+# A student may sit on at most this many waitlists at once
+MAX_STUDENT_WAITLISTS = 3
+
+
+class EnrollOutcome(str, enum.Enum):
+    ENROLLED = "enrolled"
+    WAITLISTED = "waitlisted"
+    FULL = "full"
+    OVER_LIMIT = "over_limit"
+    NO_SECTION = "no_section"
+    ALREADY_ENROLLED = "already_enrolled"
+    ALREADY_WAITLISTED = "already_waitlisted"
+    CONFLICT = "conflict"
+    REQUESTED = "requested"
+
+
+def enroll(db, student_username, class_code, section_number, shards=None):
+    """Enroll a student into a section, or waitlist them if it is full.
+
+    The capacity checks and the insert run inside one BEGIN IMMEDIATE
+    transaction, so concurrent callers are serialized on the write lock and
+    can never push a section past max_enrollment or max_waitlist.
+
+    While the section's term is in its lottery window, the attempt is only
+    recorded as a request for lottery.allocate (outcome REQUESTED).
+
+    On a sharded layout `db` is the section's shard and `shards` the
+    sharding.ShardRouter, which checks the schedule and the waitlist limit
+    against the student's sections in every shard.
+    """
+    # Holds the waitlist lock of a sharded layout until the transaction ends
+    with contextlib.ExitStack() as held:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            outcome = _enroll(db, student_username, class_code, section_number, shards, held)
+        except BaseException:
+            db.rollback()
+            raise
+
+        if outcome in (EnrollOutcome.ENROLLED, EnrollOutcome.WAITLISTED, EnrollOutcome.REQUESTED):
+            db.commit()
+        else:
+            db.rollback()
+    return outcome
+
+
+def _enroll(db, student_username, class_code, section_number, shards=None, held=None):
+    params = {
+        "student_username": student_username,
+        "class_code": class_code,
+        "section_number": section_number,
+    }
+
+    # Everything needed to make the decision, in one round trip. The counters
+    # on Class and Student are maintained by triggers on Enroll and Waitlist.
+    section = sections.load(db, class_code, section_number, student_username)
+
+    if section is None:
+        return EnrollOutcome.NO_SECTION
+    if section["is_enrolled"]:
+        return EnrollOutcome.ALREADY_ENROLLED
+    if section["is_waitlisted"]:
+        return EnrollOutcome.ALREADY_WAITLISTED
+    if section["lottery"]:
+        lottery.record_request(db, student_username, [(class_code, section_number)])
+        return EnrollOutcome.REQUESTED
+    # Checked for the waitlist too, so a promotion cannot create a clash
+    # with the sections the student holds now
+    conflict = schedule.conflict if shards is None else shards.conflict
+    if conflict(db, student_username, class_code, section_number):
+        return EnrollOutcome.CONFLICT
+
+    if section["current_enrollment"] < section["max_enrollment"]:
+        # The capacity predicate is repeated in the insert so the statement
+        # itself can never overfill the section
+        inserted = db.execute(queries.ENROLL_IF_OPEN, params).rowcount
+        outcome = EnrollOutcome.ENROLLED
+    else:
+        if section["current_waitlist"] >= section["max_waitlist"]:
+            return EnrollOutcome.FULL
+        if shards is None:
+            num_waitlists = section["num_student_waitlists"]
+        else:
+            num_waitlists = held.enter_context(shards.waitlists(student_username))
+        if num_waitlists >= MAX_STUDENT_WAITLISTS:
+            return EnrollOutcome.OVER_LIMIT
+
+        inserted = db.execute(queries.WAITLIST_IF_OPEN, dict(params, timestamp=str(datetime.datetime.now()))).rowcount
+        outcome = EnrollOutcome.WAITLISTED
+
+    if not inserted:
+        return EnrollOutcome.FULL
+
+    # Remove them from the drop list if they previously dropped the class
+    db.execute(queries.DELETE_DROPPED, (student_username, class_code, section_number))
+
+    events.record(db, outcome.value, class_code, section_number, student_username)
+    return outcome
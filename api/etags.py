@@ -0,0 +1,50 @@
+import hashlib
+
+from fastapi.responses import Response
+
+import queries
+
+
+def section(db, class_code, section_number):
+    """The ETag of a section's rosters, or None if it is not in the live database.
+
+    Class.version is bumped by triggers on every Enroll, Waitlist and Dropped
+    write for the section, and by instructor changes, so the rosters of a
+    section are unchanged for as long as its version is. A new section
+    starts at its creation time in milliseconds, so one removed and added
+    again does not pick up the ETags of the old one.
+    """
+    row = db.execute(queries.SECTION_VERSION, (class_code, section_number)).fetchone()
+    if row is None:
+        return None
+    return section_tag(class_code, section_number, row["version"])
+
+
+def section_tag(class_code, section_number, version):
+    """The ETag of a section at `version`, for callers that already read it, e.g. through sections.load."""
+    return f'"{class_code}.{section_number}.{version}"'
+
+
+def instructor(db, instructor_username, *variant):
+    """One ETag over the versions of every section the instructor teaches.
+
+    `variant` holds whatever else selects the body, e.g. the page and the
+    media type, so that each representation has its own ETag.
+    """
+    digest = hashlib.sha1(repr(variant).encode())
+    for class_code, section_number, version in db.execute(queries.INSTRUCTOR_VERSIONS, (instructor_username,)):
+        digest.update(f"{class_code}.{section_number}.{version};".encode())
+    return f'"{instructor_username}.{digest.hexdigest()[:16]}"'
+
+
+def matches(if_none_match, etag):
+    """Whether an If-None-Match header lists `etag` (weak comparison, as RFC 9110 asks for GET)."""
+    if if_none_match is None or etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+def not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag})
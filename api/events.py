@@ -0,0 +1,202 @@
+import asyncio
+import contextvars
+import enum
+import json
+import logging
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+# Rows read per statement, by the tail and by a subscriber catching up
+BATCH_SIZE = 1000
+# Longest wait, in seconds, between retries of a failing tail read
+MAX_RETRY_DELAY = 30.0
+
+
+class EventKind(str, enum.Enum):
+    ENROLLED = "enrolled"
+    WAITLISTED = "waitlisted"
+    DROPPED = "dropped"
+    PROMOTED = "promoted"
+    LEFT_WAITLIST = "left_waitlist"
+    SECTION_ADDED = "section_added"
+    SECTION_REMOVED = "section_removed"
+    INSTRUCTOR_CHANGED = "instructor_changed"
+    ENROLLMENT_FROZEN = "enrollment_frozen"
+
+
+def record(db, kind, class_code, section_number, student_username=None, detail=None):
+    """Append an event, inside the caller's transaction so it commits (or not) with the change.
+
+    The section's enrollment and waitlist counters as of the change are
+    stored with it, so dashboards can follow them without querying.
+    """
+    db.execute(queries.INSERT_EVENT, (kind, class_code, section_number, student_username, detail))
+
+
+def record_many(db, kind, rows):
+    """record() for each (student_username, class_code, section_number) row."""
+    db.executemany(queries.INSERT_EVENT, [(kind, class_code, section_number, student_username, None) for student_username, class_code, section_number in rows])
+
+
+def format_event(row):
+    """One server-sent event; `id` is the sequence number to resume after."""
+    data = dict(row)
+    return f"id: {data['seq']}\nevent: {data['kind']}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    __slots__ = ("key", "queue", "overflowed")
+
+    def __init__(self, key, maxsize):
+        self.key = key
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+
+class EventHub:
+    """Tails the Event table once per worker and fans new events out to every subscriber.
+
+    While anyone is subscribed, one task reads the events appended since its
+    last read every `poll_interval` seconds, formats each once and hands it
+    to the subscriptions of its section and of its student, found by dict
+    lookup. However many subscribers there are, the database sees one tail
+    read per interval per worker.
+
+    A subscriber whose queue fills up (it stopped reading) is cut off with
+    a resync marker, and catches up from the table when it reconnects. A
+    failing tail read is logged and retried, backing off up to
+    MAX_RETRY_DELAY; subscribers just see keep-alives meanwhile.
+    `read` is a coroutine function that runs fn(*args, db=...) on a pooled
+    connection.
+    """
+
+    def __init__(self, read, poll_interval=0.2, queue_size=1000):
+        self.read = read
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+
+        self.position = None
+        self.reads = 0
+        self.delivered = 0
+        self.overflows = 0
+        self.errors = 0
+
+        # ("section", class_code, section_number) or ("student", username) -> subscriptions
+        self._subscribers = {}
+        self._task = None
+
+    def _last_seq(self, db):
+        return db.execute(queries.LAST_EVENT).fetchone()[0]
+
+    def _events_after(self, position, db):
+        return db.execute(queries.EVENTS_AFTER, (position, BATCH_SIZE)).fetchall()
+
+    async def subscribe(self, key):
+        """Start receiving the events of `key` appended after self.position, which is set on return."""
+        if self.position is None:
+            self.position = await self.read(self._last_seq)
+
+        subscription = Subscription(key, self.queue_size)
+        self._subscribers.setdefault(key, set()).add(subscription)
+        if self._task is None:
+            # A fresh context, so the tail's reads are not counted against the request that started it
+            self._task = asyncio.create_task(self._tail(), context=contextvars.Context())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.key)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.key]
+
+    async def _tail(self):
+        delay = self.poll_interval
+        try:
+            while self._subscribers:
+                try:
+                    rows = await self.read(self._events_after, self.position)
+                except Exception:
+                    self.errors += 1
+                    logger.exception("could not read the change feed, retrying in %.1f s", delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+                    continue
+                delay = self.poll_interval
+                self.reads += 1
+                for row in rows:
+                    self._dispatch(row)
+                if rows:
+                    self.position = rows[-1]["seq"]
+                if len(rows) < BATCH_SIZE:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            self._task = None
+
+    def _dispatch(self, row):
+        message = None
+        for key in (("section", row["class_code"], row["section_number"]), ("student", row["student_username"])):
+            for subscription in self._subscribers.get(key, ()):
+                if subscription.overflowed:
+                    continue
+                if message is None:
+                    message = format_event(row)
+                try:
+                    subscription.queue.put_nowait(message)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    subscription.overflowed = True
+                    self.overflows += 1
+
+    def stats(self):
+        return {
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "keys": len(self._subscribers),
+            "position": self.position or 0,
+            "reads": self.reads,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+            "errors": self.errors,
+        }
+
+    async def stream(self, key, after, heartbeat=15.0):
+        """The server-sent events of `key` after sequence number `after` (None: from now on), then live ones.
+
+        Events up to the hub's position at subscription are read from the
+        table (by index, per section or student); later ones come from the
+        tail. Both ranges are split at the same position, so nothing is sent
+        twice or skipped.
+        """
+        subscription = await self.subscribe(key)
+        try:
+            position = self.position
+            after = position if after is None else after
+            while after < position:
+                rows = await self.read(_backlog, key, after, position)
+                for row in rows:
+                    yield format_event(row)
+                if len(rows) < BATCH_SIZE:
+                    break
+                after = rows[-1]["seq"]
+
+            while True:
+                if subscription.overflowed and subscription.queue.empty():
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # An SSE comment keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+
+def _backlog(key, after, position, db):
+    if key[0] == "section":
+        return db.execute(queries.SECTION_EVENTS, (key[1], key[2], after, position, BATCH_SIZE)).fetchall()
+    return db.execute(queries.STUDENT_EVENTS, (key[1], after, position, BATCH_SIZE)).fetchall()
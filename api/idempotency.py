@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import time
+
+from fastapi import HTTPException
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+
+import queries
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+METHODS = frozenset(("POST", "PUT", "PATCH", "DELETE"))
+
+
+class IdempotencyStore:
+    """Runs a mutation sent with an Idempotency-Key once, and replays its response to retries.
+
+    A request with a key first looks the key up (a read). When it is
+    unknown, the request claims it with an in-flight row, runs the handler
+    and stores the status and body for `ttl` seconds. A retry arriving later
+    gets the stored response back without touching Enroll or Waitlist, and
+    with an `Idempotent-Replayed: true` header.
+
+    Identical requests in flight on this worker at the same time wait for
+    the first one instead of running again. One that finds the key claimed
+    by another worker polls for up to `wait` seconds before giving up with
+    409. The claim is renewed every `lease` / 3 seconds while the handler
+    runs, so a long one (a bulk import, a lottery allocation) keeps it; one
+    left behind by a crashed worker lapses after `lease` seconds. Reusing a
+    key for a different method, path, query string or body gets 422.
+    Responses with status 500 and above, and unexpected errors, release the
+    key so the request can be retried for real.
+
+    `read` and `write` are coroutine functions that run fn(*args, db=...)
+    on a connection, so the store works both on the pool and on the writer
+    queue.
+    """
+
+    def __init__(self, read, write, ttl=86400, lease=30, wait=10.0, poll=0.05, evict_every=60, evict_batch=500):
+        self.read = read
+        self.write = write
+        self.ttl = ttl
+        self.lease = lease
+        self.wait = wait
+        self.poll = poll
+        self.evict_every = evict_every
+        self.evict_batch = evict_batch
+
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+        self.evicted = 0
+
+        # key -> future of the stored response of the request running it
+        self._inflight = {}
+        self._last_eviction = 0
+
+    # ---------------------- SQL, run through read/write -----------------------------
+
+    def lookup(self, key, db):
+        """(fingerprint, status, media_type, body) of an unexpired key, or None; status is None while in flight."""
+        row = db.execute(queries.IDEMPOTENCY_LOOKUP, (key, int(time.time()))).fetchone()
+        return None if row is None else tuple(row)
+
+    def claim(self, key, fingerprint, db):
+        """Take the key for this request; False if someone else holds it."""
+        now = int(time.time())
+        claimed = db.execute(queries.IDEMPOTENCY_CLAIM, {"key": key, "fingerprint": fingerprint, "expires": now + self.lease, "now": now}).rowcount
+
+        # Piggyback the TTL eviction on an occasional claim
+        if now - self._last_eviction >= self.evict_every:
+            self._last_eviction = now
+            self.evicted += db.execute(queries.IDEMPOTENCY_EVICT, (now, self.evict_batch)).rowcount
+
+        db.commit()
+        return bool(claimed)
+
+    def renew(self, key, fingerprint, db):
+        """Push back the lease of a claim that is still in flight."""
+        db.execute(queries.IDEMPOTENCY_RENEW, (int(time.time()) + self.lease, key, fingerprint))
+        db.commit()
+
+    def complete(self, key, status_code, media_type, body, db):
+        db.execute(queries.IDEMPOTENCY_COMPLETE, (status_code, media_type, body, int(time.time()) + self.ttl, key))
+        db.commit()
+
+    def release(self, key, db):
+        db.execute(queries.IDEMPOTENCY_RELEASE, (key,))
+        db.commit()
+
+    # ---------------------- Requests -----------------------------
+
+    async def run(self, key, request, handler):
+        fingerprint = hashlib.sha256(f"{request.method} {request.url.path}?{request.url.query}\n".encode() + await request.body()).digest()[:16]
+
+        # Coalesce onto an identical request already running on this worker
+        while (future := self._inflight.get(key)) is not None:
+            stored = await asyncio.shield(future)
+            if stored is not None:
+                self.coalesced += 1
+                return self._replay(stored, fingerprint)
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        stored = None
+        try:
+            response, stored = await self._run(key, fingerprint, request, handler)
+        finally:
+            del self._inflight[key]
+            # Waiters replay `stored`, or run the request themselves if there is none
+            future.set_result(stored)
+        return response
+
+    async def _run(self, key, fingerprint, request, handler):
+        """(response, stored response or None)"""
+        deadline = time.monotonic() + self.wait
+        while True:
+            stored = await self.read(self.lookup, key)
+            if stored is None:
+                if await self.write(self.claim, key, fingerprint):
+                    break
+                # Lost the race for the key; look again
+                continue
+            if stored[1] is not None or stored[0] != fingerprint:
+                self.replayed += 1
+                return self._replay(stored, fingerprint), stored
+            if time.monotonic() >= deadline:
+                self.conflicts += 1
+                return _error(409, "A request with this Idempotency-Key is still in progress"), None
+            await asyncio.sleep(self.poll)
+
+        self.executed += 1
+        renewal = asyncio.create_task(self._renew(key, fingerprint))
+        try:
+            response = await handler(request)
+        except HTTPException as e:
+            response = await http_exception_handler(request, e)
+        except BaseException:
+            await self.write(self.release, key)
+            raise
+        finally:
+            # A renewal still running finds the key completed or released
+            # and changes nothing
+            renewal.cancel()
+
+        # Streaming responses have no body to keep
+        body = getattr(response, "body", None)
+        if response.status_code >= 500 or body is None:
+            await self.write(self.release, key)
+            return response, None
+
+        stored = (fingerprint, response.status_code, response.headers.get("content-type"), bytes(body))
+        await self.write(self.complete, key, *stored[1:])
+        return response, stored
+
+    async def _renew(self, key, fingerprint):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.write(self.renew, key, fingerprint)
+            except sqlite3.OperationalError:
+                # Busy, e.g. behind the handler's own write transaction; a
+                # later round renews it
+                logger.warning("could not renew the idempotency key %r", key)
+
+    def _replay(self, stored, fingerprint):
+        stored_fingerprint, status_code, media_type, body = stored
+        if stored_fingerprint != fingerprint:
+            return _error(422, "Idempotency-Key was already used for a different request")
+        return Response(content=body, status_code=status_code, headers={"content-type": media_type, "Idempotent-Replayed": "true"})
+
+    def stats(self):
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "conflicts": self.conflicts,
+            "evicted": self.evicted,
+            "in_flight": len(self._inflight),
+        }
+
+
+def _error(status_code, detail):
+    return JSONResponse({"detail": detail}, status_code=status_code)
+
+
+def route_class(store):
+    """An APIRoute that sends mutations carrying an Idempotency-Key through `store`.
+
+    Set it as app.router.route_class before the endpoints are declared. It
+    runs after routing, so the metrics still see the matched route template.
+    """
+    class IdempotentRoute(APIRoute):
+        def get_route_handler(self):
+            handler = super().get_route_handler()
+
+            async def idempotent_handler(request):
+                key = request.headers.get(HEADER)
+                if key is None or request.method not in METHODS:
+                    return await handler(request)
+                return await store.run(key, request, handler)
+
+            return idempotent_handler
+
+    return IdempotentRoute
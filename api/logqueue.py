@@ -0,0 +1,62 @@
+import logging
+import logging.handlers
+import queue
+
+
+class _Listener(logging.handlers.QueueListener):
+    """Passes each record on to the handlers of the `target` logger."""
+
+    def __init__(self, queue, target):
+        super().__init__(queue)
+        self.target = target
+
+    def handle(self, record):
+        # Looked up per record, so the target's handlers may be configured after this one
+        logging.getLogger(self.target).handle(self.prepare(record))
+
+    def enqueue_sentinel(self):
+        # The queue may be full; wait for room rather than losing the stop signal
+        self.queue.put(self._sentinel)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a background thread that writes them to the target handlers.
+
+    The request thread only formats the message and puts it on a bounded
+    queue; the file and console I/O happens on the listener thread. When the
+    queue is full the record is dropped and counted instead of blocking the
+    request.
+
+    The targets are the handlers of the logger named `target`, configured in
+    the same logging.ini with propagate = 0 so records do not come back to
+    this handler. They keep their own level and formatter.
+    """
+
+    def __init__(self, target, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.maxsize = maxsize
+        self.dropped = 0
+
+        self.listener = _Listener(self.queue, target)
+        self.listener.start()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # emit() runs under the handler lock, so the count is exact
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "queued": self.queue.qsize(),
+            "maxsize": self.maxsize,
+            "dropped": self.dropped,
+        }
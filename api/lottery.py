@@ -0,0 +1,210 @@
+import collections
+import datetime
+import json
+import random
+import time
+
+# enrollment imports this module too; its names are looked up at call time
+import enrollment
+import events
+import queries
+import schedule
+
+PENDING = "pending"
+# An alternative not needed because an earlier one, or a seat the student already held, was used
+UNUSED = "unused"
+
+# Alternatives a single request may rank
+MAX_CHOICES = 5
+
+
+def record_request(db, student_username, sections):
+    """Record a request for the first section of `sections` that can be had, in ranked order.
+
+    Runs inside the caller's transaction. Returns the request number.
+    Sections the student already has a pending request for are left out, so
+    a retry records nothing and returns the number of the earlier request.
+    """
+    number = db.execute(queries.NEXT_REQUEST_NUMBER, (student_username,)).fetchone()[0]
+    inserted = db.executemany(queries.INSERT_ENROLLMENT_REQUEST, [
+        (student_username, number, choice, class_code, section_number)
+        for choice, (class_code, section_number) in enumerate(sections, 1)
+    ]).rowcount
+    if inserted:
+        return number
+    return db.execute(queries.PENDING_REQUEST_NUMBER, (student_username, *sections[0])).fetchone()[0]
+
+
+def request_sections(db, sections):
+    """{(class_code, section_number): (term, lottery)} for those of `sections` that exist."""
+    return {
+        (row["class_code"], row["section_number"]): (row["term"], bool(row["lottery"]))
+        for row in db.execute(queries.REQUEST_SECTIONS, (json.dumps(sections),))
+    }
+
+
+def open_window(db, term):
+    """Start recording enrollment requests for `term` instead of enrolling. Returns False if there is no open such term."""
+    opened = db.execute(queries.OPEN_LOTTERY, (term,)).rowcount
+    db.commit()
+    return bool(opened)
+
+
+def allocate(db, term, seed=None):
+    """Assign seats and waitlist slots to every pending request of `term` in one pass, and close its window.
+
+    Students are put in a random order drawn from `seed`. Requests are then
+    served in rounds: every student's first request, then every second one,
+    and so on, with the order reversed each round (a snake draft) so the
+    students drawn last get first pick of the next round. A request takes a
+    seat in its first alternative that has one; failing that, a slot on the
+    waitlist of its first alternative that has room, within the limit of
+    MAX_STUDENT_WAITLISTS waitlists per student. Alternatives that clash with
+    the student's sections, including those allocated earlier in the run,
+    are passed over. Waitlist timestamps follow the allocation order, so
+    waitlist positions do too.
+
+    The decisions are made in Python from one read of the term's sections
+    and the requesting students' enrollments, and written with executemany,
+    all in one BEGIN IMMEDIATE transaction: the same data and seed always
+    give the same result.
+
+    Returns a summary including the seed used.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    start = time.perf_counter()
+
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        requests = _requests(db, term)
+        decided, outcomes = _decide(db, term, requests, seed)
+        _write(db, decided)
+        db.execute(queries.CLOSE_LOTTERY, (term,))
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    elapsed = time.perf_counter() - start
+
+    return {
+        "term": term,
+        "seed": seed,
+        "students": len(requests),
+        "requests": sum(len(student_requests) for student_requests in requests.values()),
+        "outcomes": dict(outcomes),
+        "elapsed_seconds": elapsed,
+    }
+
+
+def _requests(db, term):
+    """{student: [[(request_number, choice, class_code, section_number), ...] per request]}"""
+    requests = {}
+    for student, number, choice, class_code, section_number in db.execute(queries.LOTTERY_REQUESTS, (term,)):
+        student_requests = requests.setdefault(student, [])
+        if not student_requests or student_requests[-1][0][0] != number:
+            student_requests.append([])
+        student_requests[-1].append((number, choice, class_code, section_number))
+    return requests
+
+
+def _decide(db, term, requests, seed):
+    """([(outcome, student, alternative)] for every alternative of every request in allocation order, Counter of outcomes per request)"""
+    sections = {
+        (row["class_code"], row["section_number"]): dict(row)
+        for row in db.execute(queries.LOTTERY_SECTIONS, (term,))
+    }
+    students = json.dumps(sorted(requests))
+    enrolled = {tuple(row) for row in db.execute(queries.BULK_ENROLLED, (students,))}
+    waitlisted = {tuple(row) for row in db.execute(queries.BULK_WAITLISTED, (students,))}
+    student_waitlists = dict(db.execute(queries.BULK_STUDENT_WAITLISTS, (students,)).fetchall())
+    blocks = schedule.section_blocks(db, sections)
+    held = schedule.student_blocks(db, requests)
+
+    order = sorted(requests)
+    random.Random(seed).shuffle(order)
+
+    decided = []
+    outcomes = collections.Counter()
+    for round_number in range(max(map(len, requests.values()), default=0)):
+        for student in order if round_number % 2 == 0 else reversed(order):
+            if round_number >= len(requests[student]):
+                continue
+            alternatives = requests[student][round_number]
+            keys = [(student, class_code, section_number) for _, _, class_code, section_number in alternatives]
+
+            clashing = {key for key in keys if schedule.clash(blocks.get(key[1:], ()), held.get(student, ()))}
+            chosen, outcome = _choose(keys, sections, enrolled, waitlisted, clashing, student_waitlists.get(student, 0))
+            outcomes[outcome.value] += 1
+            if outcome == enrollment.EnrollOutcome.ENROLLED:
+                sections[keys[chosen][1:]]["current_enrollment"] += 1
+                enrolled.add(keys[chosen])
+                schedule.hold(held, *keys[chosen], blocks.get(keys[chosen][1:], ()))
+            elif outcome == enrollment.EnrollOutcome.WAITLISTED:
+                sections[keys[chosen][1:]]["current_waitlist"] += 1
+                student_waitlists[student] = student_waitlists.get(student, 0) + 1
+                waitlisted.add(keys[chosen])
+
+            for i, alternative in enumerate(alternatives):
+                if chosen is None or i == chosen:
+                    decided.append((outcome.value, student, alternative))
+                else:
+                    decided.append((UNUSED, student, alternative))
+    return decided, outcomes
+
+
+def _choose(keys, sections, enrolled, waitlisted, clashing, num_waitlists):
+    """(index of the alternative used or None, outcome) for one request."""
+    for i, key in enumerate(keys):
+        if key in enrolled:
+            return i, enrollment.EnrollOutcome.ALREADY_ENROLLED
+
+    for i, key in enumerate(keys):
+        section = sections.get(key[1:])
+        if section is not None and key not in waitlisted and key not in clashing and section["current_enrollment"] < section["max_enrollment"]:
+            return i, enrollment.EnrollOutcome.ENROLLED
+
+    for i, key in enumerate(keys):
+        if key in waitlisted:
+            return i, enrollment.EnrollOutcome.ALREADY_WAITLISTED
+
+    if not any(key[1:] in sections for key in keys):
+        return None, enrollment.EnrollOutcome.NO_SECTION
+    if all(key in clashing for key in keys if key[1:] in sections):
+        return None, enrollment.EnrollOutcome.CONFLICT
+    if num_waitlists >= enrollment.MAX_STUDENT_WAITLISTS:
+        return None, enrollment.EnrollOutcome.OVER_LIMIT
+
+    for i, key in enumerate(keys):
+        section = sections.get(key[1:])
+        if section is not None and key not in clashing and section["current_waitlist"] < section["max_waitlist"]:
+            return i, enrollment.EnrollOutcome.WAITLISTED
+
+    return None, enrollment.EnrollOutcome.FULL
+
+
+def _write(db, decided):
+    enroll_rows = []
+    waitlist_rows = []
+    # One microsecond apart, so the waitlist order is the allocation order
+    joined = datetime.datetime.now()
+    for outcome, student, (_, _, class_code, section_number) in decided:
+        if outcome == enrollment.EnrollOutcome.ENROLLED:
+            enroll_rows.append((student, class_code, section_number))
+        elif outcome == enrollment.EnrollOutcome.WAITLISTED:
+            joined += datetime.timedelta(microseconds=1)
+            waitlist_rows.append((student, class_code, section_number, str(joined)))
+
+    db.executemany(queries.INSERT_ENROLLMENT, enroll_rows)
+    db.executemany(queries.INSERT_WAITLIST_ENTRY, waitlist_rows)
+
+    # Remove them from the drop list if they previously dropped the class
+    db.executemany(queries.DELETE_DROPPED, enroll_rows + [row[:3] for row in waitlist_rows])
+
+    events.record_many(db, events.EventKind.ENROLLED, enroll_rows)
+    events.record_many(db, events.EventKind.WAITLISTED, [row[:3] for row in waitlist_rows])
+
+    db.executemany(queries.SET_REQUEST_OUTCOME, [
+        (outcome, student, number, choice)
+        for outcome, student, (number, choice, _, _) in decided
+    ])
@@ -0,0 +1,230 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (1, 2, 3, 4, 6, 8, 10, 15, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+# The _Request being served by the current task or threadpool thread, if any
+_current = contextvars.ContextVar("metrics_request", default=None)
+
+
+class _Request:
+    __slots__ = ("method", "path", "statements")
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.statements = 0
+
+
+class Histogram:
+    """A Prometheus-style histogram with fixed buckets, one series per label set."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def total(self):
+        """Sum of every observation, across all label sets."""
+        with self._lock:
+            return sum(total for _, total in self._series.values())
+
+    def count(self, *label_values):
+        """Number of observations of one label set, or of all of them if none is given."""
+        with self._lock:
+            if label_values:
+                series = self._series.get(label_values)
+                return 0 if series is None else sum(series[0])
+            return sum(sum(counts) for counts, _ in self._series.values())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+
+        for label_values, (counts, total) in series:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Request, connection and SQL statement timings of one worker.
+
+    With `slow_query_ms` set, every statement that takes longer is logged as
+    a warning together with the request it ran for.
+    """
+
+    def __init__(self, slow_query_ms=None):
+        self.slow_query_seconds = None if slow_query_ms is None else slow_query_ms / 1000
+
+        self.requests = Histogram(
+            "http_request_duration_seconds",
+            "Time to serve a request, by route template.",
+            ("method", "route", "status"),
+            REQUEST_BUCKETS,
+        )
+        self.request_statements = Histogram(
+            "http_request_sql_statements",
+            "SQL statements executed per request, by route template.",
+            ("method", "route"),
+            COUNT_BUCKETS,
+        )
+        self.statements = Histogram(
+            "sqlite_statement_duration_seconds",
+            "Time spent in execute/executemany/commit/rollback, by statement keyword.",
+            ("statement",),
+            STATEMENT_BUCKETS,
+        )
+        self.connections = Histogram(
+            "sqlite_connection_acquire_seconds",
+            "Time to get a connection from the pool or open one.",
+            (),
+            REQUEST_BUCKETS,
+        )
+
+    def observe_statement(self, sql, elapsed):
+        request = _current.get()
+        if request is not None:
+            request.statements += 1
+
+        self.statements.observe(elapsed, _keyword(sql))
+
+        if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+            where = "" if request is None else f" in {request.method} {request.path}"
+            logger.warning("slow query (%.1f ms)%s: %s", elapsed * 1000, where, " ".join(sql.split()))
+
+    def render(self, gauges=None):
+        """The Prometheus text exposition of every histogram plus `gauges`.
+
+        gauges maps a name prefix to a stats dict; its numeric values are
+        exported as `<prefix>_<key>`.
+        """
+        lines = []
+        for histogram in (self.requests, self.request_statements, self.statements, self.connections):
+            lines.extend(histogram.render())
+
+        for prefix, stats in (gauges or {}).items():
+            if stats is None:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (bool, int, float)):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _keyword(sql):
+    words = sql.split(None, 1)
+    return words[0].upper() if words else ""
+
+
+class TimedConnection:
+    """Wraps a sqlite3 connection so every statement and commit is timed and counted.
+
+    The time of execute() covers preparing the statement and stepping to the
+    first row, not fetching the rest of a large result.
+    """
+
+    def __init__(self, db, metrics):
+        self._db = db
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return self._db.execute(sql, *args)
+        finally:
+            self._metrics.observe_statement(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return self._db.executemany(sql, *args)
+        finally:
+            self._metrics.observe_statement(sql, time.perf_counter() - start)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            self._db.commit()
+        finally:
+            self._metrics.observe_statement("COMMIT", time.perf_counter() - start)
+
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            self._db.rollback()
+        finally:
+            self._metrics.observe_statement("ROLLBACK", time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """ASGI middleware that times each request under its route template, e.g.
+    /student/drop_class/student/{student_username}/class/{class_code}/section/{section_number}.
+    """
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = _Request(scope["method"], scope["path"])
+        token = _current.set(request)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            self.metrics.requests.observe(elapsed, request.method, route, str(status_code))
+            self.metrics.request_statements.observe(request.statements, request.method, route)
@@ -0,0 +1,72 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+
+import serialize
+
+# Rows pulled from the sqlite cursor per chunk when streaming
+STREAM_BATCH_SIZE = 500
+
+
+def decode_cursor(cursor, size):
+    """Turn an opaque `after` cursor back into the key values of the last row seen.
+
+    With no cursor the keys start at the empty string, which sorts before every
+    key, so the same keyset query serves the first page too.
+    """
+    if cursor is None:
+        return ("",) * size
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        values = None
+
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor."
+        )
+    return tuple(values)
+
+
+def encode_cursor(row, key_columns):
+    values = [row[column] for column in key_columns]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def next_cursor(rows, limit, key_columns):
+    """Cursor for the page after `rows`, or None if this was the last page."""
+    if limit is None or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1], key_columns)
+
+
+def sql_limit(limit):
+    # SQLite treats a negative LIMIT as no limit
+    return -1 if limit is None else limit
+
+
+def stream_ndjson(connect, sql, params, batch_size=STREAM_BATCH_SIZE):
+    """Stream a query as newline-delimited JSON, one object per row.
+
+    The generator opens its own connection with `connect` once the body
+    starts, rather than reusing the request's, so it does not depend on when
+    FastAPI tears down a dependency. Handlers that stream therefore take
+    `connect` alone, not a connection as well, so a streaming request holds
+    one pooled connection at a time. Memory stays bounded by `batch_size` rows.
+    """
+    def generate():
+        with connect() as db:
+            cursor = db.execute(sql, params)
+            cursor.row_factory = None
+            columns = [description[0] for description in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield b"".join(serialize.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -0,0 +1,183 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+
+import archive
+import queries
+import sharding
+
+
+def connect(database, read_only=False, mmap_size=268435456, cache_size=-16000, busy_timeout=5000, cached_statements=128, prepare=(), archive_database=None, shards=(), attach_read_only=False):
+    """Open a connection configured the way every connection in the api should be.
+
+    `cached_statements` sizes the connection's prepared-statement cache, and the
+    read statements in `prepare` are put into it before the connection is used.
+    The archive database is attached for the history views (see archive.attach),
+    and the `shards` of a sharded layout for the views over all of them (see
+    sharding.attach). With attach_read_only both are attached with mode=ro, so
+    the connection's write transactions lock its own database only.
+    """
+    options = {"timeout": busy_timeout / 1000, "check_same_thread": False, "cached_statements": cached_statements}
+    if read_only:
+        db = sqlite3.connect(f"file:{database}?mode=ro", uri=True, **options)
+    else:
+        # A plain path opens the same with uri=True, which ATTACH needs for mode=ro
+        db = sqlite3.connect(database, uri=attach_read_only, **options)
+        db.execute("PRAGMA journal_mode=WAL")
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+    db.execute(f"PRAGMA cache_size={int(cache_size)}")
+    db.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+    archive.attach(db, archive_database, read_only or attach_read_only)
+    sharding.attach(db, shards, read_only or attach_read_only)
+    queries.warm_up(db, prepare)
+    return db
+
+
+class ConnectionPool:
+    """A fixed-size pool of SQLite connections shared by the request threads of one worker.
+
+    Each uvicorn worker imports api.py and therefore builds its own pool, so the
+    size is per worker. Connections are opened lazily, configured once, and
+    handed out LIFO so the most recently used (warmest) connection is reused first.
+
+    Beyond `size`, up to `overflow` extra connections are opened on demand and
+    closed again when released. FastAPI tears get_db down on a threadpool
+    thread, so if every threadpool thread could block in acquire() no
+    connection would ever come back; keeping size + overflow at or above the
+    threadpool size (40 by default) rules that deadlock out.
+
+    A read_only pool opens its connections with mode=ro.
+    """
+
+    def __init__(self, database, size=10, timeout=30.0, overflow=40, mmap_size=268435456, cache_size=-16000, busy_timeout=5000, read_only=False, cached_statements=128, prepare=(), archive_database=None, shards=(), attach_read_only=False):
+        self.database = database
+        self.read_only = read_only
+        self.size = size
+        self.overflow = overflow
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.prepare = prepare
+        self.archive_database = archive_database
+        self.shards = shards
+        self.attach_read_only = attach_read_only
+
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._closed = False
+
+    def _connect(self):
+        return connect(
+            self.database,
+            read_only=self.read_only,
+            mmap_size=self.mmap_size,
+            cache_size=self.cache_size,
+            busy_timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+            prepare=self.prepare,
+            archive_database=self.archive_database,
+            shards=self.shards,
+            attach_read_only=self.attach_read_only,
+        )
+
+    def acquire(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed.")
+
+        try:
+            db = self._idle.get_nowait()
+        except queue.Empty:
+            db = None
+            with self._lock:
+                if self._opened < self.size + self.overflow:
+                    self._opened += 1
+                    open_new = True
+                else:
+                    open_new = False
+
+            if open_new:
+                try:
+                    db = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                try:
+                    db = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError("Timed out waiting for a database connection.") from None
+
+        with self._lock:
+            self._in_use += 1
+        return db
+
+    def release(self, db):
+        with self._lock:
+            self._in_use -= 1
+
+        # Never hand out a connection with a half-finished transaction
+        try:
+            if db.in_transaction:
+                db.rollback()
+        except sqlite3.Error:
+            self._discard(db)
+            return
+
+        if self._closed:
+            self._discard(db)
+            return
+
+        try:
+            self._idle.put_nowait(db)
+        except queue.Full:
+            # An overflow connection; only `size` connections are kept open
+            self._discard(db)
+
+    def _discard(self, db):
+        with self._lock:
+            self._opened -= 1
+        with contextlib.suppress(sqlite3.Error):
+            db.close()
+
+    @contextlib.contextmanager
+    def connection(self):
+        db = self.acquire()
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+    def health(self):
+        healthy = True
+        try:
+            with self.connection() as db:
+                db.execute("SELECT 1").fetchone()
+        except (sqlite3.Error, TimeoutError, RuntimeError):
+            healthy = False
+
+        return {
+            "healthy": healthy,
+            "size": self.size,
+            "overflow": self.overflow,
+            "read_only": self.read_only,
+            "opened": self._opened,
+            "in_use": self._in_use,
+            "idle": self._idle.qsize(),
+        }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(db)
@@ -0,0 +1,87 @@
+import collections
+import time
+
+import events
+import queries
+import schedule
+
+
+def promote(db, class_code, section_number, shards=None):
+    """Move waitlisted students into any open seats of one section.
+
+    Runs inside the caller's transaction (e.g. right after a drop, before the
+    commit) so the seat never appears free to other requests. Sections with
+    auto_enrollment turned off are left alone. Students are promoted in the
+    same order as Task 11 reports positions, skipping any whose enrollments
+    clash with the section; they stay on the waitlist. On a sharded layout
+    `shards` checks the clash against every shard, as in enrollment.enroll.
+    Returns the promoted usernames.
+    """
+    candidates = db.execute(queries.PROMOTION_CANDIDATES, {"class_code": class_code, "section_number": section_number}).fetchall()
+
+    promoted = []
+    for username, open_seats in candidates:
+        if len(promoted) >= open_seats:
+            break
+        if shards is None or not shards.conflict(db, username, class_code, section_number):
+            promoted.append(username)
+
+    _move(db, [(username, class_code, section_number) for username in promoted])
+    return promoted
+
+
+def rebalance(db):
+    """Fill the open seats of every auto-enrollment section from its waitlist in one transaction.
+
+    Meant to be run after capacities change. Commits its own transaction and
+    returns a summary including the promotion throughput.
+    """
+    start = time.perf_counter()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        rows = []
+        # A row held back for clashing with another of its pass is looked at
+        # again, with that one enrolled, in the next
+        while moving := _without_clashes(db, [tuple(row) for row in db.execute(queries.REBALANCE_CANDIDATES)]):
+            _move(db, moving)
+            rows.extend(moving)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    elapsed = time.perf_counter() - start
+
+    return {
+        "promoted": len(rows),
+        "sections": len({(class_code, section_number) for _, class_code, section_number in rows}),
+        "elapsed_seconds": elapsed,
+        "promotions_per_second": len(rows) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def _without_clashes(db, rows):
+    """`rows` less those that clash with an earlier row of the same student."""
+    counts = collections.Counter(student for student, _, _ in rows)
+    repeated = {student for student, count in counts.items() if count > 1}
+    if not repeated:
+        return rows
+
+    blocks = schedule.section_blocks(db, [row[1:] for row in rows if row[0] in repeated])
+    held = {}
+    kept = []
+    for student, class_code, section_number in rows:
+        wanted = blocks.get((class_code, section_number), ())
+        if student in repeated and schedule.clash(wanted, held.get(student, ())):
+            continue
+        schedule.hold(held, student, class_code, section_number, wanted)
+        kept.append((student, class_code, section_number))
+    return kept
+
+
+def _move(db, rows):
+    if not rows:
+        return
+
+    db.executemany(queries.DELETE_WAITLIST_ENTRY, rows)
+    db.executemany(queries.INSERT_ENROLLMENT_IF_ABSENT, rows)
+    events.record_many(db, events.EventKind.PROMOTED, rows)
@@ -0,0 +1,859 @@
+"""Every SQL statement the api runs, as named constants.
+
+sqlite3 caches prepared statements per connection, keyed on the exact SQL
+text. Keeping each statement in one place, with its whitespace normalized,
+means every caller hits the same cache entry, and lets warm_up() prepare the
+read statements as soon as a connection is opened.
+"""
+import re
+
+NAMED_PARAM = re.compile(r":(\w+)")
+
+
+def _sql(text):
+    # One statement, one spelling: collapse the indentation of the source
+    return " ".join(text.split())
+
+
+# ---------------------- Catalog -----------------------------
+
+CATALOG_SECTION = _sql("""
+    SELECT class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username, term
+    FROM Class
+    WHERE class_code=?
+    AND section_number=?
+""")
+
+CATALOG_INSTRUCTOR = _sql("""
+    SELECT *
+    FROM Instructor
+    WHERE instructor_username=?
+""")
+
+# The section, its counters and the caller's status in it; see sections.load
+SECTION_CONTEXT = _sql("""
+    SELECT Class.*,
+        e_student_username IS NOT NULL AS is_enrolled,
+        w_student_username IS NOT NULL AS is_waitlisted,
+        d_student_username IS NOT NULL AS has_dropped,
+        IFNULL(num_waitlist, 0) AS num_student_waitlists,
+        lottery,
+        instructor_username IS NOT NULL AS instructor_exists
+    FROM Class
+    JOIN Term ON Term.term=Class.term
+    LEFT JOIN Enroll
+    ON e_student_username=:student_username
+    AND e_class_code=class_code
+    AND e_section_number=section_number
+    LEFT JOIN Waitlist
+    ON w_student_username=:student_username
+    AND w_class_code=class_code
+    AND w_section_number=section_number
+    LEFT JOIN Dropped
+    ON d_student_username=:student_username
+    AND d_class_code=class_code
+    AND d_section_number=section_number
+    LEFT JOIN Student
+    ON student_username=:student_username
+    LEFT JOIN Instructor
+    ON instructor_username=:instructor_username
+    WHERE class_code=:class_code
+    AND section_number=:section_number
+""")
+
+
+# ---------------------- Search -----------------------------
+
+# Ranked full-text search of the catalog (see search.py). bm25 weighs a
+# match on the class code above one on the name, department or instructor.
+SEARCH_CLASSES = _sql("""
+    SELECT Class.class_code, section_number, Class.class_name, Class.department, i_first_name, i_last_name,
+        max_enrollment - current_enrollment AS open_seats
+    FROM ClassSearch
+    JOIN Class ON Class.rowid=ClassSearch.rowid
+    LEFT JOIN Instructor ON instructor_username=c_instructor_username
+    WHERE ClassSearch MATCH :query
+    AND (NOT :open_only OR current_enrollment < max_enrollment)
+    ORDER BY bm25(ClassSearch, 10.0, 4.0, 2.0, 1.0), Class.class_code, section_number
+    LIMIT :limit
+""")
+
+
+# ---------------------- Lists -----------------------------
+
+# Keyset pages: the cursor values, then the LIMIT (see paging.py)
+ALL_CLASSES = _sql("""
+    SELECT *
+    FROM Class
+    WHERE (class_code, section_number) > (?, ?)
+    ORDER BY class_code, section_number
+    LIMIT ?
+""")
+
+ALL_WAITLIST = _sql("""
+    SELECT *
+    FROM Waitlist
+    WHERE (w_student_username, w_class_code, w_section_number) > (?, ?, ?)
+    ORDER BY w_student_username, w_class_code, w_section_number
+    LIMIT ?
+""")
+
+AVAILABLE_CLASSES = _sql("""
+    SELECT class_code, section_number, class_name, i_first_name, i_last_name
+    FROM Class, Instructor
+    WHERE max_enrollment - current_enrollment > 0
+    AND c_instructor_username = instructor_username
+    AND (class_code, section_number) > (?, ?)
+    ORDER BY class_code, section_number
+    LIMIT ?
+""")
+
+INSTRUCTOR_ENROLLMENT = _sql("""
+    SELECT student_username, s_first_name, s_last_name, class_code, section_number, class_name
+    FROM Instructor, Class, Enroll, Student
+    WHERE Instructor.instructor_username=?
+    AND Instructor.instructor_username=Class.c_instructor_username
+    AND Class.class_code=Enroll.e_class_code
+    AND Class.section_number=Enroll.e_section_number
+    AND Enroll.e_student_username=student_username
+    AND (class_code, section_number, student_username) > (?, ?, ?)
+    ORDER BY class_code, section_number, student_username
+    LIMIT ?
+""")
+
+STUDENT_DETAILS = _sql("""
+    SELECT *
+    FROM Student
+    WHERE student_username=?
+""")
+
+STUDENT_ENROLLMENT = _sql("""
+    SELECT *
+    FROM Enroll
+    WHERE e_student_username=?
+""")
+
+# Every term of the section, archived ones included
+INSTRUCTOR_DROPPED = _sql("""
+    SELECT student_username, s_first_name, s_last_name, d_class_code AS class_code, d_section_number AS section_number, term
+    FROM DroppedHistory, Student
+    WHERE c_instructor_username=?
+    AND d_class_code=?
+    AND d_section_number=?
+    AND d_student_username=student_username
+""")
+
+INSTRUCTOR_WAITLIST = _sql("""
+    SELECT student_username, s_first_name, s_last_name, class_code, section_number, timestamp
+    FROM Instructor, Class, Waitlist, Student
+    WHERE Instructor.instructor_username=?
+    AND Class.class_code=?
+    AND Class.section_number=?
+    AND Instructor.instructor_username=Class.c_instructor_username
+    AND Class.class_code=Waitlist.w_class_code
+    AND Class.section_number=Waitlist.w_section_number
+    AND Waitlist.w_student_username=student_username
+""")
+
+
+# ---------------------- Versions -----------------------------
+
+# The ETags of the instructor endpoints, see etags.py
+SECTION_VERSION = _sql("""
+    SELECT version
+    FROM Class
+    WHERE class_code=?
+    AND section_number=?
+""")
+
+INSTRUCTOR_VERSIONS = _sql("""
+    SELECT class_code, section_number, version
+    FROM Class
+    WHERE c_instructor_username=?
+    ORDER BY class_code, section_number
+""")
+
+
+# ---------------------- Waitlist positions -----------------------------
+
+# Count the students who joined earlier, breaking timestamp ties by username,
+# with a range read on the Waitlist_section index
+WAITLIST_POSITION = _sql("""
+    SELECT me.w_student_username IS NOT NULL AS on_waitlist,
+        current_waitlist AS total,
+        (
+            SELECT COUNT(*)
+            FROM Waitlist AS ahead
+            WHERE ahead.w_class_code=me.w_class_code
+            AND ahead.w_section_number=me.w_section_number
+            AND (ahead.timestamp, ahead.w_student_username) < (me.timestamp, me.w_student_username)
+        ) AS ahead
+    FROM Class
+    LEFT JOIN Waitlist AS me
+    ON me.w_class_code=class_code
+    AND me.w_section_number=section_number
+    AND me.w_student_username=:student_username
+    WHERE class_code=:class_code
+    AND section_number=:section_number
+""")
+
+WAITLIST_POSITIONS = _sql("""
+    SELECT class_code, section_number, current_waitlist AS total,
+        (
+            SELECT COUNT(*)
+            FROM Waitlist AS ahead
+            WHERE ahead.w_class_code=me.w_class_code
+            AND ahead.w_section_number=me.w_section_number
+            AND (ahead.timestamp, ahead.w_student_username) < (me.timestamp, me.w_student_username)
+        ) AS ahead
+    FROM Waitlist AS me, Class
+    WHERE me.w_student_username=?
+    AND me.w_class_code=class_code
+    AND me.w_section_number=section_number
+    ORDER BY me.timestamp
+""")
+
+
+# ---------------------- Enrollment -----------------------------
+
+# The capacity predicate is repeated in the inserts so the statement itself
+# can never overfill the section
+ENROLL_IF_OPEN = _sql("""
+    INSERT INTO Enroll (e_student_username, e_class_code, e_section_number)
+    SELECT :student_username, class_code, section_number
+    FROM Class
+    WHERE class_code=:class_code
+    AND section_number=:section_number
+    AND current_enrollment < max_enrollment
+""")
+
+WAITLIST_IF_OPEN = _sql("""
+    INSERT INTO Waitlist (w_student_username, w_class_code, w_section_number, timestamp)
+    SELECT :student_username, class_code, section_number, :timestamp
+    FROM Class
+    WHERE class_code=:class_code
+    AND section_number=:section_number
+    AND current_waitlist < max_waitlist
+""")
+
+# Over every shard on a sharded layout's directory connection, see sharding.attach
+STUDENT_NUM_WAITLIST = _sql("""
+    SELECT num_waitlist
+    FROM Student
+    WHERE student_username=?
+""")
+
+# The statements below take (student_username, class_code, section_number)
+
+INSERT_ENROLLMENT = _sql("""
+    INSERT INTO Enroll (e_student_username, e_class_code, e_section_number)
+    VALUES (?, ?, ?)
+""")
+
+# A student already holding the seat (possible in imported data) just leaves the waitlist
+INSERT_ENROLLMENT_IF_ABSENT = _sql("""
+    INSERT OR IGNORE INTO Enroll (e_student_username, e_class_code, e_section_number)
+    VALUES (?, ?, ?)
+""")
+
+DELETE_ENROLLMENT = _sql("""
+    DELETE FROM Enroll
+    WHERE e_student_username=?
+    AND e_class_code=?
+    AND e_section_number=?
+""")
+
+# Followed by the timestamp
+INSERT_WAITLIST_ENTRY = _sql("""
+    INSERT INTO Waitlist (w_student_username, w_class_code, w_section_number, timestamp)
+    VALUES (?, ?, ?, ?)
+""")
+
+DELETE_WAITLIST_ENTRY = _sql("""
+    DELETE FROM Waitlist
+    WHERE w_student_username=?
+    AND w_class_code=?
+    AND w_section_number=?
+""")
+
+# A student can have dropped the section before; keep a single Dropped row
+INSERT_DROPPED = _sql("""
+    INSERT OR IGNORE INTO Dropped (d_student_username, d_class_code, d_section_number)
+    VALUES (?, ?, ?)
+""")
+
+DELETE_DROPPED = _sql("""
+    DELETE FROM Dropped
+    WHERE d_student_username=?
+    AND d_class_code=?
+    AND d_section_number=?
+""")
+
+
+# ---------------------- Schedule -----------------------------
+
+# (class_code, section_number, day, start_minute, end_minute)
+INSERT_MEETING = _sql("""
+    INSERT INTO Meeting (m_class_code, m_section_number, day, start_minute, end_minute)
+    VALUES (?, ?, ?, ?, ?)
+""")
+
+# The first enrolled section whose blocks overlap a block of the wanted
+# section: per block and enrolled section, one range seek on Meeting_section
+SCHEDULE_CONFLICT = _sql("""
+    SELECT other.m_class_code AS class_code, other.m_section_number AS section_number
+    FROM Meeting AS wanted, Enroll, Meeting AS other
+    WHERE wanted.m_class_code=:class_code
+    AND wanted.m_section_number=:section_number
+    AND e_student_username=:student_username
+    AND other.m_class_code=e_class_code
+    AND other.m_section_number=e_section_number
+    AND other.day=wanted.day
+    AND other.start_minute < wanted.end_minute
+    AND other.end_minute > wanted.start_minute
+    LIMIT 1
+""")
+
+# The same check on a shard of a sharded layout, which may not hold the wanted
+# section: its blocks come in as a JSON array of [day, start_minute, end_minute]
+SECTION_BLOCKS = _sql("""
+    SELECT day, start_minute, end_minute
+    FROM Meeting
+    WHERE m_class_code=?
+    AND m_section_number=?
+""")
+
+BLOCKS_CONFLICT = _sql("""
+    SELECT other.m_class_code AS class_code, other.m_section_number AS section_number
+    FROM json_each(:blocks) AS wanted, Enroll, Meeting AS other
+    WHERE e_student_username=:student_username
+    AND other.m_class_code=e_class_code
+    AND other.m_section_number=e_section_number
+    AND other.day=json_extract(wanted.value, '$[0]')
+    AND other.start_minute < json_extract(wanted.value, '$[2]')
+    AND other.end_minute > json_extract(wanted.value, '$[1]')
+    LIMIT 1
+""")
+
+# For the checks that decide a whole batch in Python (bulk.py, lottery.py):
+# the blocks of a JSON array of [class_code, section_number] pairs, and of
+# every section a JSON array of students is enrolled in
+BATCH_SECTION_BLOCKS = _sql("""
+    SELECT m_class_code, m_section_number, day, start_minute, end_minute
+    FROM json_each(?) AS wanted, Meeting
+    WHERE m_class_code=json_extract(wanted.value, '$[0]')
+    AND m_section_number=json_extract(wanted.value, '$[1]')
+""")
+
+BATCH_STUDENT_BLOCKS = _sql("""
+    SELECT e_student_username, e_class_code, e_section_number, day, start_minute, end_minute
+    FROM Enroll, Meeting
+    WHERE e_student_username IN (SELECT value FROM json_each(?))
+    AND m_class_code=e_class_code
+    AND m_section_number=e_section_number
+""")
+
+STUDENT_SCHEDULE = _sql("""
+    SELECT class_code, section_number, class_name, day, start_minute, end_minute
+    FROM Enroll, Class, Meeting
+    WHERE e_student_username=?
+    AND class_code=e_class_code
+    AND section_number=e_section_number
+    AND m_class_code=e_class_code
+    AND m_section_number=e_section_number
+    ORDER BY day, start_minute, class_code, section_number
+""")
+
+
+# ---------------------- Promotion -----------------------------
+
+# Waitlisted students whose enrollments do not clash with the section (the
+# SCHEDULE_CONFLICT test), in waitlist order, with the section's open seats
+PROMOTION_CANDIDATES = _sql("""
+    SELECT w_student_username, max_enrollment - current_enrollment AS open_seats
+    FROM Waitlist, Class
+    WHERE w_class_code=:class_code
+    AND w_section_number=:section_number
+    AND class_code=w_class_code
+    AND section_number=w_section_number
+    AND auto_enrollment
+    AND current_enrollment < max_enrollment
+    AND NOT EXISTS (
+        SELECT 1
+        FROM Meeting AS wanted, Enroll, Meeting AS other
+        WHERE wanted.m_class_code=w_class_code
+        AND wanted.m_section_number=w_section_number
+        AND e_student_username=w_student_username
+        AND other.m_class_code=e_class_code
+        AND other.m_section_number=e_section_number
+        AND other.day=wanted.day
+        AND other.start_minute < wanted.end_minute
+        AND other.end_minute > wanted.start_minute
+    )
+    ORDER BY timestamp, w_student_username
+""")
+
+# The same for every section at once; clashes between two of the rows are
+# left to promotion.rebalance
+REBALANCE_CANDIDATES = _sql("""
+    SELECT w_student_username, w_class_code, w_section_number
+    FROM (
+        SELECT w_student_username, w_class_code, w_section_number,
+            max_enrollment - current_enrollment AS open_seats,
+            ROW_NUMBER() OVER (
+                PARTITION BY w_class_code, w_section_number
+                ORDER BY timestamp, w_student_username
+            ) AS place
+        FROM Waitlist, Class
+        WHERE class_code=w_class_code
+        AND section_number=w_section_number
+        AND auto_enrollment
+        AND current_enrollment < max_enrollment
+        AND NOT EXISTS (
+            SELECT 1
+            FROM Meeting AS wanted, Enroll, Meeting AS other
+            WHERE wanted.m_class_code=w_class_code
+            AND wanted.m_section_number=w_section_number
+            AND e_student_username=w_student_username
+            AND other.m_class_code=e_class_code
+            AND other.m_section_number=e_section_number
+            AND other.day=wanted.day
+            AND other.start_minute < wanted.end_minute
+            AND other.end_minute > wanted.start_minute
+        )
+    )
+    WHERE place <= open_seats
+""")
+
+
+# ---------------------- Registrar -----------------------------
+
+# Inserts nothing unless the term exists and is still open
+INSERT_CLASS = _sql("""
+    INSERT INTO Class (class_code, section_number, term, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username)
+    SELECT :class_code, :section_number, term, :class_name, :department, :auto_enrollment, :max_enrollment, :max_waitlist, :c_instructor_username
+    FROM Term
+    WHERE term=:term
+    AND NOT closed
+""")
+
+# The statements below take (class_code, section_number)
+
+DELETE_CLASS = _sql("""
+    DELETE FROM Class
+    WHERE class_code=?
+    AND section_number=?
+""")
+
+DELETE_SECTION_ENROLLMENT = _sql("""
+    DELETE FROM Enroll
+    WHERE e_class_code=?
+    AND e_section_number=?
+""")
+
+DELETE_SECTION_WAITLIST = _sql("""
+    DELETE FROM Waitlist
+    WHERE w_class_code=?
+    AND w_section_number=?
+""")
+
+DELETE_SECTION_MEETINGS = _sql("""
+    DELETE FROM Meeting
+    WHERE m_class_code=?
+    AND m_section_number=?
+""")
+
+DELETE_SECTION_DROPPED = _sql("""
+    DELETE FROM Dropped
+    WHERE d_class_code=?
+    AND d_section_number=?
+""")
+
+DELETE_SECTION_REQUESTS = _sql("""
+    DELETE FROM EnrollmentRequest
+    WHERE r_class_code=?
+    AND r_section_number=?
+""")
+
+DELETE_SECTION_EVENTS = _sql("""
+    DELETE FROM Event
+    WHERE class_code=?
+    AND section_number=?
+""")
+
+FREEZE_ENROLLMENT = _sql("""
+    UPDATE Class
+    SET auto_enrollment = FALSE
+    WHERE class_code=?
+    AND section_number=?
+""")
+
+# (instructor_username, class_code, section_number)
+# A new instructor changes what the instructor endpoints return: bump the version too
+CHANGE_INSTRUCTOR = _sql("""
+    UPDATE Class
+    SET c_instructor_username=?, version=version + 1
+    WHERE class_code=?
+    AND section_number=?
+""")
+
+
+# ---------------------- Bulk -----------------------------
+
+# Each takes a JSON array: of [class_code, section_number] pairs for the
+# sections, of usernames for the others
+
+BULK_SECTIONS = _sql("""
+    SELECT class_code, section_number, max_enrollment, max_waitlist, current_enrollment, current_waitlist, lottery
+    FROM Class, Term, json_each(?) AS wanted
+    WHERE class_code=json_extract(wanted.value, '$[0]')
+    AND section_number=json_extract(wanted.value, '$[1]')
+    AND Term.term=Class.term
+""")
+
+BULK_ENROLLED = _sql("""
+    SELECT e_student_username, e_class_code, e_section_number
+    FROM Enroll
+    WHERE e_student_username IN (SELECT value FROM json_each(?))
+""")
+
+BULK_WAITLISTED = _sql("""
+    SELECT w_student_username, w_class_code, w_section_number
+    FROM Waitlist
+    WHERE w_student_username IN (SELECT value FROM json_each(?))
+""")
+
+BULK_STUDENT_WAITLISTS = _sql("""
+    SELECT student_username, num_waitlist
+    FROM Student
+    WHERE student_username IN (SELECT value FROM json_each(?))
+""")
+
+
+# ---------------------- Lottery -----------------------------
+
+# Takes a JSON array of [class_code, section_number] pairs
+REQUEST_SECTIONS = _sql("""
+    SELECT class_code, section_number, Class.term, lottery
+    FROM Class, Term, json_each(?) AS wanted
+    WHERE class_code=json_extract(wanted.value, '$[0]')
+    AND section_number=json_extract(wanted.value, '$[1]')
+    AND Term.term=Class.term
+""")
+
+NEXT_REQUEST_NUMBER = _sql("""
+    SELECT IFNULL(MAX(request_number), 0) + 1
+    FROM EnrollmentRequest
+    WHERE r_student_username=?
+""")
+
+# (student_username, request_number, choice, class_code, section_number); a
+# section the student already has a pending request for is skipped
+INSERT_ENROLLMENT_REQUEST = _sql("""
+    INSERT OR IGNORE INTO EnrollmentRequest (r_student_username, request_number, choice, r_class_code, r_section_number)
+    VALUES (?, ?, ?, ?, ?)
+""")
+
+PENDING_REQUEST_NUMBER = _sql("""
+    SELECT request_number
+    FROM EnrollmentRequest
+    WHERE r_student_username=?
+    AND r_class_code=?
+    AND r_section_number=?
+    AND outcome='pending'
+""")
+
+STUDENT_REQUESTS = _sql("""
+    SELECT request_number, choice, r_class_code AS class_code, r_section_number AS section_number, outcome
+    FROM EnrollmentRequest
+    WHERE r_student_username=?
+    ORDER BY request_number, choice
+""")
+
+# The statements below take the term
+
+OPEN_LOTTERY = _sql("""
+    UPDATE Term
+    SET lottery=TRUE
+    WHERE term=?
+    AND NOT closed
+""")
+
+CLOSE_LOTTERY = _sql("""
+    UPDATE Term
+    SET lottery=FALSE
+    WHERE term=?
+""")
+
+LOTTERY_SECTIONS = _sql("""
+    SELECT class_code, section_number, max_enrollment, max_waitlist, current_enrollment, current_waitlist
+    FROM Class
+    WHERE term=?
+""")
+
+LOTTERY_REQUESTS = _sql("""
+    SELECT r_student_username, request_number, choice, r_class_code, r_section_number
+    FROM Class, EnrollmentRequest
+    WHERE term=?
+    AND r_class_code=class_code
+    AND r_section_number=section_number
+    AND outcome='pending'
+    ORDER BY r_student_username, request_number, choice
+""")
+
+# (outcome, student_username, request_number, choice)
+SET_REQUEST_OUTCOME = _sql("""
+    UPDATE EnrollmentRequest
+    SET outcome=?
+    WHERE r_student_username=?
+    AND request_number=?
+    AND choice=?
+""")
+
+
+# ---------------------- Idempotency -----------------------------
+
+# (key, now)
+IDEMPOTENCY_LOOKUP = _sql("""
+    SELECT fingerprint, status, media_type, body
+    FROM IdempotencyKey
+    WHERE key=?
+    AND expires >= ?
+""")
+
+# Takes over an expired key, never a live one
+IDEMPOTENCY_CLAIM = _sql("""
+    INSERT INTO IdempotencyKey (key, fingerprint, expires)
+    VALUES (:key, :fingerprint, :expires)
+    ON CONFLICT (key) DO UPDATE
+    SET fingerprint=excluded.fingerprint, status=NULL, media_type=NULL, body=NULL, expires=excluded.expires
+    WHERE expires < :now
+""")
+
+# (expires, key, fingerprint); only while the claim is in flight
+IDEMPOTENCY_RENEW = _sql("""
+    UPDATE IdempotencyKey
+    SET expires=?
+    WHERE key=?
+    AND fingerprint=?
+    AND status IS NULL
+""")
+
+# (status, media_type, body, expires, key)
+IDEMPOTENCY_COMPLETE = _sql("""
+    UPDATE IdempotencyKey
+    SET status=?, media_type=?, body=?, expires=?
+    WHERE key=?
+""")
+
+IDEMPOTENCY_RELEASE = _sql("""
+    DELETE FROM IdempotencyKey
+    WHERE key=?
+""")
+
+# (now, batch size)
+IDEMPOTENCY_EVICT = _sql("""
+    DELETE FROM IdempotencyKey
+    WHERE key IN (
+        SELECT key
+        FROM IdempotencyKey
+        WHERE expires < ?
+        LIMIT ?
+    )
+""")
+
+
+# ---------------------- Archive -----------------------------
+
+# Live and archived rows read together; archive.attach creates these views on
+# every connection, with the archive database (or an empty one) attached
+
+CLASS_HISTORY = _sql("""
+    CREATE TEMP VIEW IF NOT EXISTS ClassHistory AS
+    SELECT term, class_code, section_number, c_instructor_username
+    FROM main.Class
+    UNION ALL
+    SELECT term, class_code, section_number, c_instructor_username
+    FROM archive.Class
+""")
+
+DROPPED_HISTORY = _sql("""
+    CREATE TEMP VIEW IF NOT EXISTS DroppedHistory AS
+    SELECT term, c_instructor_username, d_student_username, d_class_code, d_section_number
+    FROM main.Class, main.Dropped
+    WHERE d_class_code=class_code
+    AND d_section_number=section_number
+    UNION ALL
+    SELECT term, c_instructor_username, d_student_username, d_class_code, d_section_number
+    FROM archive.Class, archive.Dropped
+    WHERE d_class_code=class_code
+    AND d_section_number=section_number
+    AND d_term=term
+""")
+
+# Whether the section exists in any term, live or archived
+SECTION_HISTORY = _sql("""
+    SELECT 1
+    FROM ClassHistory
+    WHERE class_code=?
+    AND section_number=?
+    LIMIT 1
+""")
+
+CLOSED_TERMS = _sql("""
+    SELECT term
+    FROM Term
+    WHERE closed
+""")
+
+CLOSE_TERM = _sql("""
+    UPDATE Term
+    SET closed = TRUE
+    WHERE term=?
+""")
+
+# (term, batch size)
+TERM_SECTIONS = _sql("""
+    SELECT class_code, section_number
+    FROM Class
+    WHERE term=?
+    LIMIT ?
+""")
+
+# Copy one section to the archive; each takes (class_code, section_number)
+# and is followed by the matching DELETE_* statement above
+
+ARCHIVE_CLASS = _sql("""
+    INSERT INTO archive.Class (term, class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username)
+    SELECT term, class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username
+    FROM main.Class
+    WHERE class_code=?
+    AND section_number=?
+""")
+
+ARCHIVE_ENROLLMENT = _sql("""
+    INSERT INTO archive.Enroll (e_term, e_student_username, e_class_code, e_section_number)
+    SELECT term, e_student_username, e_class_code, e_section_number
+    FROM main.Class, main.Enroll
+    WHERE class_code=?
+    AND section_number=?
+    AND e_class_code=class_code
+    AND e_section_number=section_number
+""")
+
+ARCHIVE_WAITLIST = _sql("""
+    INSERT INTO archive.Waitlist (w_term, w_student_username, w_class_code, w_section_number, timestamp)
+    SELECT term, w_student_username, w_class_code, w_section_number, timestamp
+    FROM main.Class, main.Waitlist
+    WHERE class_code=?
+    AND section_number=?
+    AND w_class_code=class_code
+    AND w_section_number=section_number
+""")
+
+ARCHIVE_DROPPED = _sql("""
+    INSERT INTO archive.Dropped (d_term, d_student_username, d_class_code, d_section_number)
+    SELECT term, d_student_username, d_class_code, d_section_number
+    FROM main.Class, main.Dropped
+    WHERE class_code=?
+    AND section_number=?
+    AND d_class_code=class_code
+    AND d_section_number=section_number
+""")
+
+ARCHIVE_MEETINGS = _sql("""
+    INSERT INTO archive.Meeting (m_term, m_class_code, m_section_number, day, start_minute, end_minute)
+    SELECT term, m_class_code, m_section_number, day, start_minute, end_minute
+    FROM main.Class, main.Meeting
+    WHERE class_code=?
+    AND section_number=?
+    AND m_class_code=class_code
+    AND m_section_number=section_number
+""")
+
+ARCHIVE_REQUESTS = _sql("""
+    INSERT INTO archive.EnrollmentRequest (r_term, r_student_username, request_number, choice, r_class_code, r_section_number, outcome)
+    SELECT term, r_student_username, request_number, choice, r_class_code, r_section_number, outcome
+    FROM main.Class, main.EnrollmentRequest
+    WHERE class_code=?
+    AND section_number=?
+    AND r_class_code=class_code
+    AND r_section_number=section_number
+""")
+
+
+
+# ---------------------- Events -----------------------------
+
+# (kind, class_code, section_number, student_username, detail); the counters
+# are read back from Class, and stay NULL once the section is gone
+INSERT_EVENT = _sql("""
+    INSERT INTO Event (kind, class_code, section_number, student_username, current_enrollment, current_waitlist, detail)
+    SELECT ?1, ?2, ?3, ?4, current_enrollment, current_waitlist, ?5
+    FROM (SELECT 1) LEFT JOIN Class ON class_code=?2 AND section_number=?3
+""")
+
+LAST_EVENT = _sql("""
+    SELECT IFNULL(MAX(seq), 0)
+    FROM Event
+""")
+
+# The tail read shared by every subscriber of a worker: (after, limit)
+EVENTS_AFTER = _sql("""
+    SELECT *
+    FROM Event
+    WHERE seq > ?
+    ORDER BY seq
+    LIMIT ?
+""")
+
+# Catching up: (class_code, section_number, after, up_to, limit)
+SECTION_EVENTS = _sql("""
+    SELECT *
+    FROM Event
+    WHERE class_code=?
+    AND section_number=?
+    AND seq > ?
+    AND seq <= ?
+    ORDER BY seq
+    LIMIT ?
+""")
+
+# (student_username, after, up_to, limit)
+STUDENT_EVENTS = _sql("""
+    SELECT *
+    FROM Event
+    WHERE student_username=?
+    AND seq > ?
+    AND seq <= ?
+    ORDER BY seq
+    LIMIT ?
+""")
+
+
+def statements():
+    """Every statement in the registry, by name."""
+    return {name: value for name, value in globals().items() if name.isupper() and isinstance(value, str)}
+
+
+def reads():
+    return [sql for sql in statements().values() if sql.startswith(("SELECT", "WITH"))]
+
+
+def warm_up(db, statements):
+    """Prepare `statements` into the connection's statement cache.
+
+    The sqlite3 module only prepares a statement by executing it, so each one
+    runs with every parameter bound to 0: the keys here are text, so nothing
+    matches, and every LIMIT becomes 0. Statements without parameters would
+    run in full and are skipped. Only pass reads.
+    """
+    for sql in statements:
+        names = NAMED_PARAM.findall(sql)
+        if names:
+            params = dict.fromkeys(names, 0)
+        elif "?" in sql:
+            params = (0,) * sql.count("?")
+        else:
+            continue
+        db.execute(sql, params).fetchall()
@@ -0,0 +1,149 @@
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import pool
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    """Publishes a read-only snapshot of the database for the read-mostly endpoints.
+
+    A thread copies `database` into `path` every `interval` seconds with the
+    online backup API. The copy is made in one backup step, so it is one
+    consistent read transaction of the source, taken without blocking its
+    writers (WAL). The snapshot file is itself in WAL mode: connections
+    reading it keep the previous snapshot until their transaction ends and see
+    the new one from their next. A round in which nothing was committed to the
+    source (PRAGMA data_version) copies nothing.
+
+    Every uvicorn worker creates a Replica, but only the one holding an
+    exclusive lock on `<path>-lock` publishes. The others follow: they read
+    the snapshot it publishes and try to take the lock every interval, so one
+    of them takes over when the publisher exits. After every round the
+    publisher sets the mtime of `<path>-published` to the time the source was
+    read, which is how followers know the age of the snapshot.
+
+    Every backup rewrites the whole file, so the interval trades the lag of
+    the snapshot against the I/O spent on copies. lag() is the age of the
+    snapshot: how long ago the source was last read for it.
+    """
+
+    def __init__(self, database, path, interval=1.0, busy_timeout=5000):
+        self.database = database
+        self.path = path
+        self.interval = interval
+        self.busy_timeout = busy_timeout
+        self.publisher = False
+        self.published = 0
+        self.unchanged = 0
+        self.failures = 0
+        self.last_publish_seconds = 0.0
+
+        self._heartbeat = f"{path}-published"
+        self._lock_file = None
+        self._source = None
+        self._target = None
+        self._version = None
+        self._snapshot_time = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Return once a snapshot can be opened, publishing the first one if this worker is the publisher, then keep it current."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._lock_file = open(f"{self.path}-lock", "a")
+            # Wait for the publisher's first snapshot, or for the lock if it went away before that
+            while not self._elect() and not os.path.exists(self._heartbeat):
+                time.sleep(min(self.interval, 0.1))
+            if self.publisher:
+                self.publish()
+            self._thread = threading.Thread(target=self._run, name="sqlite-replica", daemon=True)
+            self._thread.start()
+
+    def _elect(self):
+        """Take the publisher's lock if it is free; once held, it is kept until close()."""
+        if self.publisher:
+            return True
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+
+        self._source = pool.connect(self.database, read_only=True, busy_timeout=self.busy_timeout)
+        self._target = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, check_same_thread=False)
+        self._target.execute("PRAGMA journal_mode=WAL")
+        # A lost snapshot is simply published again
+        self._target.execute("PRAGMA synchronous=OFF")
+        self.publisher = True
+        logger.info("publishing the replica %s", self.path)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self._elect():
+                    self.publish()
+            except sqlite3.Error:
+                self.failures += 1
+                logger.exception("could not publish the replica %s", self.path)
+
+    def publish(self):
+        """Copy the source into the snapshot file unless nothing changed since the last copy."""
+        start = time.time_ns()
+        version = self._source.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            self.unchanged += 1
+        else:
+            # Anything committed after data_version was read is copied too and
+            # only makes the next round copy again
+            self._source.backup(self._target)
+            # Backups do not trigger the automatic checkpoint
+            self._target.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self._version = version
+            self.published += 1
+            self.last_publish_seconds = (time.time_ns() - start) / 1e9
+        self._snapshot_time = start / 1e9
+        with open(self._heartbeat, "a"):
+            os.utime(self._heartbeat, ns=(start, start))
+
+    def lag(self):
+        if self.publisher:
+            snapshot_time = self._snapshot_time
+        else:
+            try:
+                snapshot_time = os.stat(self._heartbeat).st_mtime
+            except FileNotFoundError:
+                snapshot_time = None
+        if snapshot_time is None:
+            return float("inf")
+        return time.time() - snapshot_time
+
+    def stats(self):
+        return {
+            "publisher": self.publisher,
+            "lag_seconds": self.lag(),
+            "interval": self.interval,
+            "published": self.published,
+            "unchanged": self.unchanged,
+            "failures": self.failures,
+            "last_publish_seconds": self.last_publish_seconds,
+        }
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for db in (self._source, self._target):
+            if db is not None:
+                db.close()
+        # Releases the lock, so another worker takes over publishing
+        if self._lock_file is not None:
+            self._lock_file.close()
@@ -0,0 +1,87 @@
+import json
+
+import queries
+
+# Meeting.day is an index into this tuple
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def minutes(clock):
+    """A datetime.time as minutes since midnight, the unit Meeting stores."""
+    return clock.hour * 60 + clock.minute
+
+
+def clock(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def add_meetings(db, class_code, section_number, meetings):
+    """Insert the weekly blocks of a section; meetings are (day, start, end) with day in DAYS."""
+    db.executemany(queries.INSERT_MEETING, [
+        (class_code, section_number, DAYS.index(day), minutes(start), minutes(end))
+        for day, start, end in meetings
+    ])
+
+
+def conflict(db, student_username, class_code, section_number):
+    """The first section the student is enrolled in that overlaps this one, or None.
+
+    Two blocks overlap when they are on the same day and each starts before
+    the other ends, so back-to-back blocks do not conflict. For every block
+    of the wanted section and every enrolled section, Meeting_section turns
+    this into a range seek on start_minute instead of comparing all pairs.
+    """
+    row = db.execute(queries.SCHEDULE_CONFLICT, {"student_username": student_username, "class_code": class_code, "section_number": section_number}).fetchone()
+
+    return None if row is None else dict(row)
+
+
+def section_blocks(db, sections):
+    """{(class_code, section_number): [(day, start_minute, end_minute)]} for those of `sections` that meet."""
+    blocks = {}
+    for class_code, section_number, *block in db.execute(queries.BATCH_SECTION_BLOCKS, (json.dumps(sorted(set(sections))),)):
+        blocks.setdefault((class_code, section_number), []).append(tuple(block))
+    return blocks
+
+
+def student_blocks(db, students):
+    """{student: [(day, start_minute, end_minute, class_code, section_number)]} over the sections each is enrolled in."""
+    blocks = {}
+    for student, class_code, section_number, *block in db.execute(queries.BATCH_STUDENT_BLOCKS, (json.dumps(sorted(set(students))),)):
+        blocks.setdefault(student, []).append((*block, class_code, section_number))
+    return blocks
+
+
+def clash(wanted, held):
+    """conflict() for checks made in Python over a whole batch.
+
+    `wanted` are the blocks of a section and `held` those of the student's
+    sections, as returned by section_blocks() and student_blocks(). Returns
+    the (class_code, section_number) of the first held block that overlaps,
+    or None.
+    """
+    for day, start, end in wanted:
+        for other_day, other_start, other_end, class_code, section_number in held:
+            if other_day == day and other_start < end and other_end > start:
+                return class_code, section_number
+    return None
+
+
+def hold(held, student, class_code, section_number, wanted):
+    """Add the blocks of a section the batch just enrolled `student` in to `held`."""
+    held.setdefault(student, []).extend((*block, class_code, section_number) for block in wanted)
+
+
+def student_schedule(db, student_username):
+    """The student's enrolled blocks for the week, ordered by day and start time."""
+    return [
+        {
+            "class_code": row["class_code"],
+            "section_number": row["section_number"],
+            "class_name": row["class_name"],
+            "day": DAYS[row["day"]],
+            "start": clock(row["start_minute"]),
+            "end": clock(row["end_minute"]),
+        }
+        for row in db.execute(queries.STUDENT_SCHEDULE, (student_username,))
+    ]
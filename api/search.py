@@ -0,0 +1,28 @@
+import re
+
+import queries
+import serialize
+
+# Words as FTS5's default unicode61 tokenizer splits them
+WORD = re.compile(r"\w+")
+
+
+def match_query(text):
+    """An FTS5 query matching every word of `text` as a prefix, or None if it has no words.
+
+    Each word is quoted, so FTS5 operators and column filters typed by a
+    user are searched for literally, and starred, so "data sys" already
+    finds "Database Systems" while it is being typed.
+    """
+    words = WORD.findall(text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search(db, text, open_only=False, limit=20):
+    """Sections whose code, name, department or instructor match `text`, best match first, as serialize.Rows."""
+    query = match_query(text)
+    if query is None:
+        return serialize.Rows(("class_code", "section_number", "class_name", "department", "i_first_name", "i_last_name", "open_seats"), [])
+    return serialize.fetch(db, queries.SEARCH_CLASSES, {"query": query, "open_only": open_only, "limit": limit})
@@ -0,0 +1,20 @@
+import queries
+
+
+def load(db, class_code, section_number, student_username=None, instructor_username=None):
+    """Everything a section-scoped handler needs to decide, in one statement.
+
+    Returns None if the section does not exist, otherwise a dict with the
+    Class row (including the current_enrollment/current_waitlist counters kept
+    by triggers) and, for `student_username`, whether the student is
+    enrolled, waitlisted or has dropped the section, and how many waitlists
+    they are on. Without a student those flags are all false. With
+    `instructor_username`, `instructor_exists` says whether that instructor
+    exists.
+    """
+    row = db.execute(
+        queries.SECTION_CONTEXT,
+        {"student_username": student_username, "instructor_username": instructor_username, "class_code": class_code, "section_number": section_number},
+    ).fetchone()
+
+    return None if row is None else dict(row)
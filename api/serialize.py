@@ -0,0 +1,71 @@
+import json
+import sqlite3
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class Rows:
+    """Query results kept as the cursor's plain tuples plus the column names.
+
+    Returned inside a RowsResponse they are serialized directly, instead of
+    FastAPI's jsonable_encoder walking every sqlite3.Row generically.
+    Indexing gives a row as a dict, which is what paging.next_cursor expects.
+    """
+
+    __slots__ = ("columns", "values")
+
+    def __init__(self, columns, values):
+        self.columns = columns
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return dict(zip(self.columns, self.values[index]))
+
+    def as_dicts(self):
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in self.values]
+
+
+def fetch(db, sql, params=()):
+    """Run a query and return every row as Rows."""
+    cursor = db.execute(sql, params)
+    # Skip building a sqlite3.Row per row; the column names are kept once
+    cursor.row_factory = None
+    return Rows(tuple(description[0] for description in cursor.description), cursor.fetchall())
+
+
+def _default(value):
+    if isinstance(value, Rows):
+        return value.as_dicts()
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(content):
+        return orjson.dumps(content, default=_default)
+else:
+    def dumps(content):
+        # Same output as FastAPI's JSONResponse
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RowsResponse(Response):
+    """A JSON response that understands Rows and sqlite3.Row, using orjson when installed.
+
+    Endpoints return it directly so FastAPI skips jsonable_encoder.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
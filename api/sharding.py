@@ -0,0 +1,176 @@
+import contextlib
+import json
+import sqlite3
+import zlib
+
+import pool
+import queries
+
+# Tables split by section, with the column holding the class code; Class last
+# so split() deletes a section's rows before the section
+PARTITIONED = {
+    "Enroll": "e_class_code",
+    "Waitlist": "w_class_code",
+    "Dropped": "d_class_code",
+    "Meeting": "m_class_code",
+    "EnrollmentRequest": "r_class_code",
+    "Event": "class_code",
+    "Class": "class_code",
+}
+
+# Event sequence numbers are per shard, so the change feed has no view over
+# every shard and is not served from a sharded layout
+VIEWS = [table for table in PARTITIONED if table != "Event"]
+
+# SQLite attaches at most 10 databases, and the archive is one of them
+MAX_SHARDS = 9
+
+
+def shard_of(class_code, count):
+    """The shard a class code lives in; stable across processes, unlike hash()."""
+    return zlib.crc32(class_code.encode()) % count
+
+
+def attach(db, databases, read_only=False):
+    """Attach every shard and shadow the split tables with TEMP views over all of them.
+
+    Unqualified table names resolve to the temp schema first, so the read
+    statements in queries.py run unchanged against the union of the shards.
+    Joins between the views cannot use the shards' indexes, though, so the
+    enrollment path reads the shards one by one (see ShardRouter). Each
+    shard's Student.num_waitlist counts its own waitlists; the Student view
+    adds them up.
+    """
+    if not databases:
+        return
+    for i, path in enumerate(databases):
+        if read_only:
+            # Read-only connections are opened with uri=True
+            db.execute(f"ATTACH DATABASE ? AS shard{i}", (f"file:{path}?mode=ro",))
+        else:
+            db.execute(f"ATTACH DATABASE ? AS shard{i}", (path,))
+
+    for table in VIEWS:
+        union = " UNION ALL ".join(f"SELECT * FROM shard{i}.{table}" for i in range(len(databases)))
+        db.execute(f"CREATE TEMP VIEW {table} AS {union}")
+    counts = " + ".join(
+        f"IFNULL((SELECT num_waitlist FROM shard{i}.Student AS s WHERE s.student_username=Student.student_username), 0)"
+        for i in range(len(databases))
+    )
+    db.execute(f"CREATE TEMP VIEW Student AS SELECT s_first_name, s_last_name, student_username, {counts} AS num_waitlist FROM main.Student")
+
+
+def split(source, directory, databases):
+    """Copy `source` into a directory database and one database per shard.
+
+    Every copy keeps the tables that are not split (Student, Instructor,
+    Term). Each shard keeps the sections whose class code hashes to it, with
+    their rows in the other split tables; the directory keeps none, and
+    serves the idempotency keys. The rows go through the usual delete
+    triggers, so every counter is right for its copy.
+    """
+    if not 1 <= len(databases) <= MAX_SHARDS:
+        raise ValueError(f"between 1 and {MAX_SHARDS} shards")
+
+    with contextlib.closing(sqlite3.connect(source)) as src:
+        for index, path in [(None, directory), *enumerate(databases)]:
+            with contextlib.closing(sqlite3.connect(path)) as db:
+                src.backup(db)
+                db.create_function("shard_of", 1, lambda class_code: shard_of(class_code, len(databases)), deterministic=True)
+                for table, column in PARTITIONED.items():
+                    if index is None:
+                        db.execute(f"DELETE FROM {table}")
+                    else:
+                        db.execute(f"DELETE FROM {table} WHERE shard_of({column}) != ?", (index,))
+                if index is not None:
+                    db.execute("DELETE FROM IdempotencyKey")
+                db.commit()
+                db.execute("VACUUM")
+
+
+class ShardRouter:
+    """Connections for a layout split over several database files by a hash of class_code.
+
+    Section-scoped work gets a pooled connection to the section's shard, so
+    writes to sections in different shards take different write locks.
+    Everything else gets a connection to the directory database with every
+    shard attached read-only (see attach()). A directory connection's write
+    transactions lock the directory alone; waitlists() uses that as the lock
+    for the waitlist limit, which spans the shards.
+    """
+
+    def __init__(self, directory, databases, **pool_args):
+        if not 1 <= len(databases) <= MAX_SHARDS:
+            raise ValueError(f"between 1 and {MAX_SHARDS} shards")
+        self.directory = directory
+        self.databases = list(databases)
+        self.shards = [pool.ConnectionPool(path, attach_read_only=True, **pool_args) for path in self.databases]
+        self.fan_out = pool.ConnectionPool(directory, shards=self.databases, attach_read_only=True, **pool_args)
+
+    def shard(self, class_code):
+        return shard_of(class_code, len(self.databases))
+
+    def connection(self, class_code=None):
+        """A connection to the shard of `class_code`, or to every shard without one."""
+        if class_code is None:
+            return self.fan_out.connection()
+        return self.shards[self.shard(class_code)].connection()
+
+    def conflict(self, db, student_username, class_code, section_number):
+        """schedule.conflict over the student's sections in every shard; `db` is the section's shard.
+
+        An enrolled section and its meetings live in the same shard, so each
+        shard is checked on its own against the wanted section's blocks. The
+        other shards' committed enrollments are seen, so two enrollments of
+        one student in different shards at the same moment are not checked
+        against each other.
+        """
+        blocks = db.execute(queries.SECTION_BLOCKS, (class_code, section_number)).fetchall()
+        if not blocks:
+            return None
+
+        params = {"student_username": student_username, "blocks": json.dumps([tuple(block) for block in blocks])}
+        own = self.shard(class_code)
+        for i, shard in enumerate(self.shards):
+            if i == own:
+                row = db.execute(queries.BLOCKS_CONFLICT, params).fetchone()
+            else:
+                with shard.connection() as other:
+                    row = other.execute(queries.BLOCKS_CONFLICT, params).fetchone()
+            if row is not None:
+                return dict(row)
+        return None
+
+    @contextlib.contextmanager
+    def waitlists(self, student_username):
+        """The number of waitlists the student is on in every shard.
+
+        The directory's write lock is taken before counting and held until the
+        block exits, which enrollment.enroll arranges to be after the shard
+        transaction adding the waitlist entry ends. Waitlist joins of the
+        same student on two shards therefore cannot both pass the count.
+        """
+        with self.fan_out.connection() as everywhere:
+            everywhere.execute("BEGIN IMMEDIATE")
+            try:
+                row = everywhere.execute(queries.STUDENT_NUM_WAITLIST, (student_username,)).fetchone()
+                yield row[0] if row else 0
+            finally:
+                everywhere.rollback()
+
+    def health(self):
+        shards = [shard.health() for shard in self.shards]
+        fan_out = self.fan_out.health()
+        return {
+            "healthy": fan_out["healthy"] and all(shard["healthy"] for shard in shards),
+            "shards": len(shards),
+            "opened": fan_out["opened"] + sum(shard["opened"] for shard in shards),
+            "in_use": fan_out["in_use"] + sum(shard["in_use"] for shard in shards),
+            "fan_out": fan_out,
+            "pools": shards,
+        }
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self.fan_out.close()
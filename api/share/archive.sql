@@ -0,0 +1,65 @@
+-- Sections of closed terms, moved out of the live database by bin/archive_terms.py.
+-- Run against a connection that has the archive attached as `archive`.
+-- The same section code can come back term after term, so the term is part of
+-- every key; keys lead with the section since history is read per section.
+
+CREATE TABLE IF NOT EXISTS archive.Class (
+    term VARCHAR(6),
+    class_code CHAR(7),
+    section_number CHAR(2),
+    class_name VARCHAR(255),
+    department VARCHAR(255),
+    auto_enrollment BOOLEAN,
+    max_enrollment TINYINT,
+    max_waitlist TINYINT,
+    c_instructor_username VARCHAR(255),
+    PRIMARY KEY (class_code, section_number, term)
+);
+
+CREATE TABLE IF NOT EXISTS archive.Enroll (
+    e_term VARCHAR(6),
+    e_student_username VARCHAR(8),
+    e_class_code CHAR(7),
+    e_section_number CHAR(2),
+    PRIMARY KEY (e_class_code, e_section_number, e_term, e_student_username)
+);
+
+CREATE TABLE IF NOT EXISTS archive.Waitlist (
+    w_term VARCHAR(6),
+    w_student_username VARCHAR(8),
+    w_class_code CHAR(7),
+    w_section_number CHAR(2),
+    timestamp DATETIME,
+    PRIMARY KEY (w_class_code, w_section_number, w_term, w_student_username)
+);
+
+CREATE TABLE IF NOT EXISTS archive.Dropped (
+    d_term VARCHAR(6),
+    d_student_username VARCHAR(8),
+    d_class_code CHAR(7),
+    d_section_number CHAR(2),
+    PRIMARY KEY (d_class_code, d_section_number, d_term, d_student_username)
+);
+
+CREATE TABLE IF NOT EXISTS archive.Meeting (
+    m_term VARCHAR(6),
+    m_class_code CHAR(7),
+    m_section_number CHAR(2),
+    day TINYINT,
+    start_minute SMALLINT,
+    end_minute SMALLINT
+);
+
+CREATE INDEX IF NOT EXISTS archive.Meeting_section ON Meeting(m_class_code, m_section_number, m_term);
+
+CREATE TABLE IF NOT EXISTS archive.EnrollmentRequest (
+    r_term VARCHAR(6),
+    r_student_username VARCHAR(8),
+    request_number SMALLINT,
+    choice TINYINT,
+    r_class_code CHAR(7),
+    r_section_number CHAR(2),
+    outcome VARCHAR(32)
+);
+
+CREATE INDEX IF NOT EXISTS archive.EnrollmentRequest_section ON EnrollmentRequest(r_class_code, r_section_number, r_term);
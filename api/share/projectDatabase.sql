@@ -1,7 +1,12 @@
+-- Lets bin/archive_terms.py hand the pages of archived rows back to the filesystem
+-- a few at a time (only takes effect before the first table is created)
+PRAGMA auto_vacuum = INCREMENTAL;
+
 CREATE TABLE Student (
     s_first_name VARCHAR(255), 
     s_last_name VARCHAR(255), 
-    student_username VARCHAR(255) PRIMARY KEY
+    student_username VARCHAR(255) PRIMARY KEY,
+    num_waitlist TINYINT NOT NULL DEFAULT 0
 );
 
 CREATE TABLE Instructor (
@@ -10,16 +15,32 @@ CREATE TABLE Instructor (
     i_last_name VARCHAR(255)
 );
 
+-- Closed terms are moved to the archive database by bin/archive_terms.py
+-- While lottery is set, enrolling in a section of the term only records a
+-- request, until the registrar runs the allocator (see lottery.py)
+CREATE TABLE Term (
+    term VARCHAR(6) PRIMARY KEY,
+    closed BOOLEAN NOT NULL DEFAULT FALSE,
+    lottery BOOLEAN NOT NULL DEFAULT FALSE
+);
+
 CREATE TABLE Class (
     class_code CHAR(7),
     section_number CHAR(2),
+    term VARCHAR(6) NOT NULL,
     class_name VARCHAR(255),
     department VARCHAR(255),
     auto_enrollment BOOLEAN,
     max_enrollment TINYINT,
     max_waitlist TINYINT,
     c_instructor_username VARCHAR(255),
+    current_enrollment TINYINT NOT NULL DEFAULT 0,
+    current_waitlist TINYINT NOT NULL DEFAULT 0,
+    -- Bumped on every Enroll/Waitlist/Dropped write for the section (see etags.py);
+    -- starts at the creation time in milliseconds
+    version INTEGER NOT NULL DEFAULT (CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)),
     PRIMARY KEY (class_code, section_number),
+    FOREIGN KEY (term) REFERENCES Term(term),
     FOREIGN KEY (c_instructor_username) REFERENCES Instructor(instructor_username)
 );
 
@@ -51,6 +72,189 @@ CREATE TABLE Dropped (
     FOREIGN KEY (d_class_code, d_section_number) REFERENCES Class(class_code, section_number)
 );
 
+-- Weekly meeting blocks of a section; day is 0 (Monday) to 6 (Sunday) and
+-- the times are minutes since midnight
+CREATE TABLE Meeting (
+    m_class_code CHAR(7),
+    m_section_number CHAR(2),
+    day TINYINT NOT NULL CHECK (day BETWEEN 0 AND 6),
+    start_minute SMALLINT NOT NULL CHECK (start_minute BETWEEN 0 AND 1439),
+    end_minute SMALLINT NOT NULL CHECK (end_minute > start_minute AND end_minute <= 1440),
+    FOREIGN KEY (m_class_code, m_section_number) REFERENCES Class(class_code, section_number)
+);
+
+-- Requests recorded during a lottery window, one row per ranked alternative
+-- section (choice 1 first); outcome is 'pending' until the allocator runs
+CREATE TABLE EnrollmentRequest (
+    r_student_username VARCHAR(8),
+    request_number SMALLINT NOT NULL,
+    choice TINYINT NOT NULL,
+    r_class_code CHAR(7) NOT NULL,
+    r_section_number CHAR(2) NOT NULL,
+    outcome VARCHAR(32) NOT NULL DEFAULT 'pending',
+    PRIMARY KEY (r_student_username, request_number, choice),
+    FOREIGN KEY (r_student_username) REFERENCES Student(student_username),
+    FOREIGN KEY (r_class_code, r_section_number) REFERENCES Class(class_code, section_number)
+);
+
+-- Responses to mutations sent with an Idempotency-Key (see idempotency.py);
+-- status is NULL while the first request is still running
+CREATE TABLE IdempotencyKey (
+    key VARCHAR(255) PRIMARY KEY,
+    fingerprint BLOB NOT NULL,
+    status SMALLINT,
+    media_type VARCHAR(255),
+    body BLOB,
+    expires INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- Append-only change feed of enrollment, waitlist and registrar changes (see
+-- events.py); seq is the rowid, so the tail read is a range scan. It is
+-- AUTOINCREMENT because archiving a term deletes that term's events, and a
+-- reused seq would be skipped by subscribers already past it. The section's
+-- counters are copied in as of the change, and detail holds the new
+-- instructor of an instructor_changed event
+CREATE TABLE Event (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind VARCHAR(32) NOT NULL,
+    class_code CHAR(7) NOT NULL,
+    section_number CHAR(2) NOT NULL,
+    student_username VARCHAR(8),
+    current_enrollment TINYINT,
+    current_waitlist TINYINT,
+    detail VARCHAR(255),
+    created DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Secondary indexes for the per-section and per-instructor lookups
+-- (the primary keys on Enroll/Waitlist/Dropped lead with the student)
+CREATE INDEX Class_instructor ON Class(c_instructor_username);
+CREATE INDEX Class_term ON Class(term);
+CREATE INDEX Enroll_section ON Enroll(e_class_code, e_section_number);
+CREATE INDEX Waitlist_section ON Waitlist(w_class_code, w_section_number, timestamp, w_student_username);
+CREATE INDEX Dropped_section ON Dropped(d_class_code, d_section_number);
+
+CREATE INDEX EnrollmentRequest_section ON EnrollmentRequest(r_class_code, r_section_number);
+
+-- At most one pending request per student and section, so retrying an
+-- enrollment during a lottery window records nothing new
+CREATE UNIQUE INDEX EnrollmentRequest_pending ON EnrollmentRequest(r_student_username, r_class_code, r_section_number) WHERE outcome='pending';
+
+-- Interval lookups: the blocks of one section on one day, as a range on start_minute
+CREATE INDEX Meeting_section ON Meeting(m_class_code, m_section_number, day, start_minute, end_minute);
+
+-- Catching up on the events of one section or one student
+CREATE INDEX Event_section ON Event(class_code, section_number, seq);
+CREATE INDEX Event_student ON Event(student_username, seq);
+
+-- TTL eviction of idempotency keys
+CREATE INDEX IdempotencyKey_expires ON IdempotencyKey(expires);
+
+-- Keep the denormalized counters on Class and Student in step with Enroll and Waitlist
+-- (run ./bin/reconcile.sh to recompute them from the base tables), and bump
+-- the section's version on every Enroll, Waitlist and Dropped write
+CREATE TRIGGER Enroll_insert_count AFTER INSERT ON Enroll
+BEGIN
+    UPDATE Class
+    SET current_enrollment = current_enrollment + 1, version = version + 1
+    WHERE class_code = NEW.e_class_code
+    AND section_number = NEW.e_section_number;
+END;
+
+CREATE TRIGGER Enroll_delete_count AFTER DELETE ON Enroll
+BEGIN
+    UPDATE Class
+    SET current_enrollment = current_enrollment - 1, version = version + 1
+    WHERE class_code = OLD.e_class_code
+    AND section_number = OLD.e_section_number;
+END;
+
+CREATE TRIGGER Waitlist_insert_count AFTER INSERT ON Waitlist
+BEGIN
+    UPDATE Class
+    SET current_waitlist = current_waitlist + 1, version = version + 1
+    WHERE class_code = NEW.w_class_code
+    AND section_number = NEW.w_section_number;
+
+    UPDATE Student
+    SET num_waitlist = num_waitlist + 1
+    WHERE student_username = NEW.w_student_username;
+END;
+
+CREATE TRIGGER Waitlist_delete_count AFTER DELETE ON Waitlist
+BEGIN
+    UPDATE Class
+    SET current_waitlist = current_waitlist - 1, version = version + 1
+    WHERE class_code = OLD.w_class_code
+    AND section_number = OLD.w_section_number;
+
+    UPDATE Student
+    SET num_waitlist = num_waitlist - 1
+    WHERE student_username = OLD.w_student_username;
+END;
+
+CREATE TRIGGER Dropped_insert_version AFTER INSERT ON Dropped
+BEGIN
+    UPDATE Class
+    SET version = version + 1
+    WHERE class_code = NEW.d_class_code
+    AND section_number = NEW.d_section_number;
+END;
+
+CREATE TRIGGER Dropped_delete_version AFTER DELETE ON Dropped
+BEGIN
+    UPDATE Class
+    SET version = version + 1
+    WHERE class_code = OLD.d_class_code
+    AND section_number = OLD.d_section_number;
+END;
+
+-- Full-text index of the catalog for /search, one row per Class row with the
+-- same rowid (after a full VACUUM, rebuild it with ./bin/reconcile.sh); prefix
+-- indexes on the first 2 and 3 characters of each token keep type-ahead
+-- queries from scanning the term list
+CREATE VIRTUAL TABLE ClassSearch USING fts5(
+    class_code, class_name, department, instructor,
+    prefix='2 3'
+);
+
+-- Keep ClassSearch in step with Class and Instructor. The counter updates on
+-- Class do not touch the searchable columns and so do not fire these.
+CREATE TRIGGER Class_insert_search AFTER INSERT ON Class
+BEGIN
+    INSERT INTO ClassSearch (rowid, class_code, class_name, department, instructor)
+    SELECT NEW.rowid, NEW.class_code, NEW.class_name, NEW.department, i_first_name || ' ' || i_last_name
+    FROM (SELECT 1) LEFT JOIN Instructor ON instructor_username = NEW.c_instructor_username;
+END;
+
+CREATE TRIGGER Class_delete_search AFTER DELETE ON Class
+BEGIN
+    DELETE FROM ClassSearch WHERE rowid = OLD.rowid;
+END;
+
+CREATE TRIGGER Class_update_search AFTER UPDATE OF class_code, class_name, department, c_instructor_username ON Class
+BEGIN
+    DELETE FROM ClassSearch WHERE rowid = OLD.rowid;
+    INSERT INTO ClassSearch (rowid, class_code, class_name, department, instructor)
+    SELECT NEW.rowid, NEW.class_code, NEW.class_name, NEW.department, i_first_name || ' ' || i_last_name
+    FROM (SELECT 1) LEFT JOIN Instructor ON instructor_username = NEW.c_instructor_username;
+END;
+
+-- Also covers sections inserted before their instructor, as bench/datagen.py does
+CREATE TRIGGER Instructor_insert_search AFTER INSERT ON Instructor
+BEGIN
+    UPDATE ClassSearch
+    SET instructor = NEW.i_first_name || ' ' || NEW.i_last_name
+    WHERE rowid IN (SELECT rowid FROM Class WHERE c_instructor_username = NEW.instructor_username);
+END;
+
+CREATE TRIGGER Instructor_update_search AFTER UPDATE OF i_first_name, i_last_name ON Instructor
+BEGIN
+    UPDATE ClassSearch
+    SET instructor = NEW.i_first_name || ' ' || NEW.i_last_name
+    WHERE rowid IN (SELECT rowid FROM Class WHERE c_instructor_username = NEW.instructor_username);
+END;
+
 -- Insert six students with names starting with 'S'
 INSERT INTO Student (s_first_name, s_last_name, student_username)
 VALUES
@@ -68,18 +272,42 @@ VALUES
     ('IsaacSmit101', 'Isaac', 'Smith'),
     ('IsabellaJohnson102', 'Isabella', 'Johnson');
 
+INSERT INTO Term (term)
+VALUES ('FA2023');
+
 -- Insert six courses
-INSERT INTO Class (class_code, section_number, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username)
+INSERT INTO Class (class_code, section_number, term, class_name, department, auto_enrollment, max_enrollment, max_waitlist, c_instructor_username)
+VALUES
+    ('CPSC449', '01', 'FA2023', 'Database Systems', 'Computer Science', TRUE, 30, 15, 'IreneDoe100'),
+    ('CPSC449', '02', 'FA2023', 'Database Systems', 'Computer Science', TRUE, 30, 15, 'IsaacSmit101'),
+    ('MATH101', '01', 'FA2023', 'Introduction to Calculus', 'Mathematics', TRUE, 25, 15, 'IsabellaJohnson102'),
+    ('MATH101', '02', 'FA2023', 'Introduction to Calculus', 'Mathematics', TRUE, 2, 15, 'IsabellaJohnson102'),
+    ('ENGL205', '01', 'FA2023', 'American Literature', 'English', TRUE, 3, 3, 'IreneDoe100'),
+    ('PHYS202', '01', 'FA2023', 'Physics II', 'Physics', TRUE, 40, 15, 'IsaacSmit101'),
+    ('PHYS202', '02', 'FA2023', 'Physics II', 'Physics', TRUE, 3, 15, 'IsaacSmit101'),
+    ('CHEM101', '01', 'FA2023', 'Introduction to Chemistry', 'Chemistry', TRUE, 20, 15, 'IsabellaJohnson102'),
+    ('CHEM101', '02', 'FA2023', 'Introduction to Chemistry', 'Chemistry', TRUE, 1, 5, 'IsabellaJohnson102');
+
+-- Meeting times; CHEM101 01 overlaps CPSC449 01 and MATH101 01
+INSERT INTO Meeting (m_class_code, m_section_number, day, start_minute, end_minute)
 VALUES
-    ('CPSC449', '01', 'Database Systems', 'Computer Science', TRUE, 30, 15, 'IreneDoe100'),
-    ('CPSC449', '02', 'Database Systems', 'Computer Science', TRUE, 30, 15, 'IsaacSmit101'),
-    ('MATH101', '01', 'Introduction to Calculus', 'Mathematics', TRUE, 25, 15, 'IsabellaJohnson102'),
-    ('MATH101', '02', 'Introduction to Calculus', 'Mathematics', TRUE, 2, 15, 'IsabellaJohnson102'),
-    ('ENGL205', '01', 'American Literature', 'English', TRUE, 3, 3, 'IreneDoe100'),
-    ('PHYS202', '01', 'Physics II', 'Physics', TRUE, 40, 15, 'IsaacSmit101'),
-    ('PHYS202', '02', 'Physics II', 'Physics', TRUE, 3, 15, 'IsaacSmit101'),
-    ('CHEM101', '01', 'Introduction to Chemistry', 'Chemistry', TRUE, 20, 15, 'IsabellaJohnson102'),
-    ('CHEM101', '02', 'Introduction to Chemistry', 'Chemistry', TRUE, 1, 5, 'IsabellaJohnson102');
+    ('CPSC449', '01', 0, 540, 615),
+    ('CPSC449', '01', 2, 540, 615),
+    ('CPSC449', '02', 1, 540, 615),
+    ('CPSC449', '02', 3, 540, 615),
+    ('MATH101', '01', 0, 630, 705),
+    ('MATH101', '01', 2, 630, 705),
+    ('MATH101', '02', 1, 630, 705),
+    ('MATH101', '02', 3, 630, 705),
+    ('ENGL205', '01', 0, 780, 855),
+    ('ENGL205', '01', 2, 780, 855),
+    ('PHYS202', '01', 1, 780, 855),
+    ('PHYS202', '01', 3, 780, 855),
+    ('PHYS202', '02', 4, 540, 705),
+    ('CHEM101', '01', 0, 570, 645),
+    ('CHEM101', '01', 2, 570, 645),
+    ('CHEM101', '02', 1, 870, 945),
+    ('CHEM101', '02', 3, 870, 945);
 
 -- Enroll every student in two classes
 INSERT INTO Enroll (e_student_username, e_class_code, e_section_number)
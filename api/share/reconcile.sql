@@ -0,0 +1,48 @@
+-- Recompute the denormalized counters on Class and Student from Enroll and Waitlist,
+-- and the ClassSearch index from Class and Instructor.
+-- The triggers in projectDatabase.sql keep them correct; this repairs any drift
+-- (e.g. after rows were edited with the triggers dropped or by a bulk import).
+
+BEGIN IMMEDIATE;
+
+-- Sections whose counters had drifted
+SELECT class_code, section_number, current_enrollment, actual_enrollment, current_waitlist, actual_waitlist
+FROM (
+    SELECT class_code, section_number, current_enrollment, current_waitlist,
+        (SELECT COUNT(*) FROM Enroll WHERE e_class_code = class_code AND e_section_number = section_number) AS actual_enrollment,
+        (SELECT COUNT(*) FROM Waitlist WHERE w_class_code = class_code AND w_section_number = section_number) AS actual_waitlist
+    FROM Class
+)
+WHERE current_enrollment != actual_enrollment
+OR current_waitlist != actual_waitlist;
+
+UPDATE Class
+SET current_enrollment = (
+        SELECT COUNT(*)
+        FROM Enroll
+        WHERE e_class_code = class_code
+        AND e_section_number = section_number
+    ),
+    current_waitlist = (
+        SELECT COUNT(*)
+        FROM Waitlist
+        WHERE w_class_code = class_code
+        AND w_section_number = section_number
+    );
+
+UPDATE Student
+SET num_waitlist = (
+    SELECT COUNT(*)
+    FROM Waitlist
+    WHERE w_student_username = student_username
+);
+
+-- ClassSearch rows share the rowid of their Class row, which a full VACUUM may renumber
+DELETE FROM ClassSearch;
+
+INSERT INTO ClassSearch (rowid, class_code, class_name, department, instructor)
+SELECT Class.rowid, class_code, class_name, department, i_first_name || ' ' || i_last_name
+FROM Class
+LEFT JOIN Instructor ON instructor_username = c_instructor_username;
+
+COMMIT;
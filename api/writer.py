@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import sqlite3
+import threading
+
+import pool
+from metrics import TimedConnection
+
+logger = logging.getLogger(__name__)
+
+
+class _OperationConnection:
+    """The connection an operation sees while it runs inside a group commit.
+
+    Handlers written for a connection of their own call BEGIN, commit() and
+    rollback() themselves. Inside a group those map onto the operation's
+    savepoint instead, so one failing operation never undoes the others.
+    """
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    @property
+    def in_transaction(self):
+        return True
+
+    def execute(self, sql, *args):
+        # The group transaction is already open
+        if sql.lstrip().upper().startswith("BEGIN"):
+            return None
+        return self._db.execute(sql, *args)
+
+    def commit(self):
+        self._db.execute("RELEASE operation")
+        self._db.execute("SAVEPOINT operation")
+
+    def rollback(self):
+        self._db.execute("ROLLBACK TO operation")
+
+
+class WriteQueue:
+    """Runs every mutation of one worker on a single connection with group commit.
+
+    Request handlers await submit(); the operations queue up and a dedicated
+    writer thread takes them in batches of up to `max_batch`. It runs each
+    batch in one BEGIN IMMEDIATE ... COMMIT, with a savepoint per operation.
+    Writes within the worker therefore never contend for the SQLite lock, and
+    a burst of writes pays for one commit instead of one per request.
+
+    The writer is a thread rather than an asyncio task so the blocking sqlite
+    calls stay off the event loop. Each operation runs in the context of the
+    request that submitted it, so `metrics` attributes its statements there.
+
+    If the writer thread dies, e.g. because it cannot open the database, every
+    queued operation fails with the error that stopped it, and so does every
+    later submit(), rather than waiting forever.
+    """
+
+    def __init__(self, database, max_batch=64, metrics=None, **connect_args):
+        self.database = database
+        self.max_batch = max_batch
+        self.metrics = metrics
+        self.connect_args = connect_args
+        self.batches = 0
+        self.operations = 0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._error = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    async def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, db=<connection>, **kwargs) on the writer and return its result."""
+        if self._thread is None:
+            self._start()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Under the lock, so nothing is queued after a dying writer drained the queue
+        with self._lock:
+            if self._error is not None or not self._thread.is_alive():
+                raise RuntimeError("the sqlite writer has stopped") from self._error
+            self._queue.put((fn, args, kwargs, contextvars.copy_context(), loop, future))
+        return await future
+
+    def _run(self):
+        batch = []
+        try:
+            db = pool.connect(self.database, **self.connect_args)
+            db.isolation_level = None
+            if self.metrics is not None:
+                db = TimedConnection(db, self.metrics)
+            operation_db = _OperationConnection(db)
+
+            while True:
+                batch = [self._queue.get()]
+                if batch[0] is None:
+                    break
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(item)
+
+                results = self._run_batch(db, operation_db, batch)
+                for (_, _, _, _, loop, future), (result, error) in zip(batch, results):
+                    _call_soon(loop, _resolve, future, result, error)
+                batch = []
+
+            db.close()
+        except Exception as e:
+            logger.exception("the sqlite writer stopped")
+            self._fail(batch, e)
+
+    def _fail(self, batch, error):
+        """Fail the operations in `batch`, every queued one and every later submit() with `error`."""
+        with self._lock:
+            self._error = error
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    batch.append(item)
+        for _, _, _, _, loop, future in batch:
+            _call_soon(loop, _resolve, future, None, error)
+
+    def _run_batch(self, db, operation_db, batch):
+        results = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for fn, args, kwargs, context, _, _ in batch:
+                db.execute("SAVEPOINT operation")
+                try:
+                    results.append((context.run(fn, *args, db=operation_db, **kwargs), None))
+                except Exception as e:
+                    db.execute("ROLLBACK TO operation")
+                    results.append((None, e))
+                db.execute("RELEASE operation")
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            return [(None, e)] * len(batch)
+
+        self.batches += 1
+        self.operations += len(batch)
+        return results
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "operations": self.operations,
+            "mean_batch": self.operations / self.batches if self.batches else 0.0,
+        }
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+def _call_soon(loop, callback, *args):
+    # The loop of a request may be gone by now, e.g. at shutdown
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        pass
+
+
+def _resolve(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)